@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+def measure_startup(cmd, runs=5, timeout=60):
+    """ Launch cmd with --startup-benchmark=<file> `runs` times.
+    Returns a list of dicts: launch_to_window (ms, wall clock from Popen to the window being shown)
+    plus the in-process timings the app wrote (ms since its own start). """
+    results = []
+    for _ in range(runs):
+        fd, result_path = tempfile.mkstemp(suffix=".txt", prefix="shenma_startup_")
+        os.close(fd)
+        try:
+            t_launch = time.time()
+            subprocess.run(cmd + [f"--startup-benchmark={result_path}"], timeout=timeout,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            timings = {}
+            with open(result_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    name, value = line.split()
+                    timings[name] = float(value)
+            if "window_shown_wall" not in timings:
+                continue
+            timings["launch_to_window"] = (timings.pop("window_shown_wall") - t_launch) * 1000
+            results.append(timings)
+        except (subprocess.TimeoutExpired, OSError, ValueError) as e:
+            print(f"本次测量失败: {e}")
+        finally:
+            try:
+                os.remove(result_path)
+            except OSError:
+                pass
+    return results
+
+def summarize(results, key="launch_to_window"):
+    values = [r[key] for r in results if key in r]
+    if not values:
+        return None
+    return {"median": statistics.median(values), "min": min(values), "max": max(values), "runs": len(values)}
+
+def startup(args):
+    cmd = args.cmd if args.cmd else [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")]
+    print(f"测量冷启动: {' '.join(cmd)} ({args.runs} 次)")
+    results = measure_startup(cmd, args.runs)
+    if not results:
+        print("没有成功的测量结果")
+        return
+    for i, r in enumerate(results, 1):
+        print(f"  #{i}: " + ", ".join(f"{k}={v:.0f}ms" for k, v in r.items()))
+    for key in ["launch_to_window", "window_shown", "backend_ready", "ffmpeg_checked"]:
+        s = summarize(results, key)
+        if s:
+            print(f"{key:>18}: 中位数 {s['median']:.0f} ms (最小 {s['min']:.0f}, 最大 {s['max']:.0f})")
+
+def run_ffmpeg_timed(args):
+    from utils import get_ffmpeg_path
+    t0 = time.perf_counter()
+    result = subprocess.run([get_ffmpeg_path(), "-hide_banner", "-y"] + args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "ffmpeg failed")
+    return time.perf_counter() - t0, result.stderr
+
+def stab(args):
+    """ Full-resolution vs proxy motion analysis: analysis time, and how close the proxy-stabilized
+    output is to the full-resolution one (SSIM, both applied at full resolution) """
+    import filtergraph
+    import stabilize
+    from utils import probe_media
+
+    info = probe_media(args.source)
+    if not info:
+        print(f"无法读取: {args.source}")
+        return
+    scale = stabilize.proxy_scale(info["width"], info["height"], args.short_side)
+    if not scale:
+        print(f"源分辨率 {info['width']}x{info['height']} 不大于代理尺寸 {args.short_side}，无需代理分析")
+        return
+
+    with tempfile.TemporaryDirectory(prefix="shenma_stab_") as tmp:
+        full_trf = os.path.join(tmp, "full.trf")
+        proxy_trf = os.path.join(tmp, "proxy.trf")
+        scaled_trf = os.path.join(tmp, "proxy_scaled.trf")
+
+        def detect(trf, proxy_scale):
+            vf = filtergraph.to_vf(filtergraph.stabilize_detect_filters(trf, proxy_scale=proxy_scale))
+            return run_ffmpeg_timed(["-i", args.source] + vf + ["-an", "-f", "null", "-"])[0]
+
+        def transform(trf, output):
+            vf = filtergraph.to_vf(filtergraph.encode_filters(stabilization=args.smoothing, trf_path=trf))
+            run_ffmpeg_timed(["-i", args.source] + vf + ["-an", "-c:v", "libx264", "-crf", "0", "-preset", "ultrafast", output])
+
+        print(f"源: {args.source} ({info['width']}x{info['height']})，代理缩放 {scale:.3f}")
+        t_full = detect(full_trf, 0)
+        t_proxy = detect(proxy_trf, scale)
+        t0 = time.perf_counter()
+        stabilize.scale_trf(proxy_trf, scaled_trf, 1 / scale)
+        t_proxy += time.perf_counter() - t0
+
+        full_out = os.path.join(tmp, "full.mkv")
+        proxy_out = os.path.join(tmp, "proxy.mkv")
+        transform(full_trf, full_out)
+        transform(scaled_trf, proxy_out)
+        _, log = run_ffmpeg_timed(["-i", proxy_out, "-i", full_out, "-lavfi", "ssim", "-f", "null", "-"])
+        match = re.search(r"All:([\d.]+)", log)
+
+        print(f"  全分辨率分析: {t_full:.2f} s")
+        print(f"  代理分析:     {t_proxy:.2f} s （{t_full / t_proxy:.1f}x）")
+        print(f"  增稳结果与全分辨率的 SSIM: {match.group(1) if match else '未知'}（1 为完全一致）")
+
+def main():
+    parser = argparse.ArgumentParser(description="神马视频转换 性能基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("startup", help="冷启动时间（启动到窗口显示）")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("cmd", nargs="*", help="要测量的命令，默认 python main.py；可传入打包后的 exe")
+    p.set_defaults(func=startup)
+
+    p = sub.add_parser("stab", help="增稳分析：全分辨率与低分辨率代理的耗时与效果对比")
+    p.add_argument("source", help="测试视频（建议 1080p 以上的抖动素材）")
+    p.add_argument("--short-side", type=int, default=720, help="代理画面短边像素")
+    p.add_argument("--smoothing", type=int, default=10, help="增稳等级")
+    p.set_defaults(func=stab)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,120 @@ import os
 import subprocess
 import sys
 import time
+import json
 import shutil
+import argparse
 
-def build():
-    # 0. Clean previous build artifacts
-    print("清理旧的构建文件...")
-    for folder in ['build', 'dist']:
-        if os.path.exists(folder):
+APP_NAME = "神马转码器"
+
+# Qt modules the app never imports. PyInstaller's hooks pull some of them in through
+# PySide6 plugins, excluding them shrinks the bundle and what --onefile has to unpack on every launch.
+EXCLUDED_MODULES = [
+    "PySide6.QtNetwork", "PySide6.QtQml", "PySide6.QtQuick", "PySide6.QtQuickWidgets",
+    "PySide6.QtWebEngineCore", "PySide6.QtWebEngineWidgets", "PySide6.QtWebChannel",
+    "PySide6.QtPdf", "PySide6.QtPdfWidgets", "PySide6.QtMultimedia", "PySide6.QtMultimediaWidgets",
+    "PySide6.QtSql", "PySide6.QtTest", "PySide6.QtOpenGL", "PySide6.QtOpenGLWidgets",
+    "PySide6.QtCharts", "PySide6.QtDataVisualization", "PySide6.Qt3DCore", "PySide6.QtBluetooth",
+    "PySide6.QtPositioning", "PySide6.QtSensors", "PySide6.QtSerialPort", "PySide6.QtSvg",
+    "tkinter", "unittest", "pydoc",
+]
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
             try:
-                # Don't delete dist completely, just the target exe if needed, 
-                # but removing build is safer for clean builds.
-                # Here we just rely on PyInstaller's --clean
-                pass
-            except Exception:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
                 pass
+    return total
+
+def pyinstaller_cmd(profile):
+    # --noconsole (or --windowed) 隐藏控制台
+    # --onefile 打包成单文件（每次启动都要解压到临时 _MEIPASS 目录）
+    # --onedir 打包成目录（无需解压，启动更快）
+    # --add-binary "src;dest" 添加二进制文件
+    # --clean 清理缓存
+    cmd = [
+        sys.executable, "-m", "PyInstaller",
+        "--noconfirm",
+        f"--{profile}",
+        "--windowed",
+        "--clean",
+        "--name", APP_NAME,
+        "--add-binary", "ffmpeg.exe;.",
+    ]
+    for module in EXCLUDED_MODULES:
+        cmd += ["--exclude-module", module]
+
+    # Check for icon
+    if os.path.exists("icon.ico"):
+        cmd.append("--icon=icon.ico")
+        # Add icon as data file for runtime use (window icon)
+        cmd.append("--add-data=icon.ico;.")
+    cmd.append("main.py")
+    return cmd
+
+def build_profile(profile):
+    """ Run PyInstaller for one profile, returns (exe_path, bundle_path) or None on failure """
+    print(f"开始打包 ({profile})...")
+    try:
+        subprocess.check_call(pyinstaller_cmd(profile))
+    except subprocess.CalledProcessError as e:
+        print(f"打包过程中出错: {e}")
+        return None
+
+    # Rename to avoid icon cache issues
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    if profile == "onefile":
+        original_path = os.path.join("dist", f"{APP_NAME}.exe")
+        new_path = os.path.join("dist", f"{APP_NAME}_{timestamp}.exe")
+        bundle_path = new_path
+    else:
+        # onedir: dist/<name>/<name>.exe, rename the folder and the exe inside it
+        bundle_path = os.path.join("dist", f"{APP_NAME}_{timestamp}")
+        if os.path.exists(bundle_path):
+            shutil.rmtree(bundle_path)
+        os.rename(os.path.join("dist", APP_NAME), bundle_path)
+        original_path = os.path.join(bundle_path, f"{APP_NAME}.exe")
+        new_path = os.path.join(bundle_path, f"{APP_NAME}_{timestamp}.exe")
+
+    if os.path.exists(original_path):
+        if os.path.exists(new_path):
+            os.remove(new_path)
+        os.rename(original_path, new_path)
+    return new_path, bundle_path
+
+def report_profile(profile, exe_path, bundle_path, runs):
+    from benchmark import measure_startup, summarize
+    size = os.path.getsize(bundle_path) if os.path.isfile(bundle_path) else dir_size(bundle_path)
+    print(f"测量启动时间 ({profile}, {runs} 次)...")
+    startup = summarize(measure_startup([os.path.abspath(exe_path)], runs)) if runs > 0 else None
+    return {
+        "profile": profile,
+        "exe": exe_path,
+        "bundle_size_mb": round(size / (1024 * 1024), 1),
+        "launch_to_window_ms": round(startup["median"]) if startup else None,
+        "launch_to_window_min_ms": round(startup["min"]) if startup else None,
+    }
+
+def build():
+    parser = argparse.ArgumentParser(description=f"{APP_NAME} 打包脚本")
+    parser.add_argument("--profile", choices=["onefile", "onedir", "both"], default="onefile",
+                        help="onefile: 单文件 EXE（默认）；onedir: 目录版，启动无需解压；both: 两者都打包并对比")
+    parser.add_argument("--runs", type=int, default=3, help="每个打包结果的启动测量次数，0 表示不测量")
+    parser.add_argument("--no-pause", action="store_true", help="结束时不等待回车（用于脚本调用）")
+    args = parser.parse_args()
+
+    def finish():
+        if not args.no_pause:
+            input("按回车键退出...")
 
     # 1. Check for ffmpeg.exe
     if not os.path.exists("ffmpeg.exe"):
         print("错误: 当前目录下未找到 ffmpeg.exe")
         print("请将 ffmpeg.exe 复制到项目根目录 (与 main.py 同级) 后重试。")
-        input("按回车键退出...")
+        finish()
         return
 
     # 2. Check/Install Dependencies (PyInstaller, Pillow)
@@ -37,56 +131,35 @@ def build():
                 print(f"安装 {package} 失败: {e}")
                 return
 
-    # 3. Run PyInstaller
-    print("开始打包...")
-    # --noconsole (or --windowed) 隐藏控制台
-    # --onefile 打包成单文件
-    # --add-binary "src;dest" 添加二进制文件
-    # --clean 清理缓存
-    
-    cmd = [
-        sys.executable, "-m", "PyInstaller",
-        "--noconfirm",
-        "--onefile",
-        "--windowed",
-        "--clean",
-        "--name", "神马转码器",
-        "--add-binary", "ffmpeg.exe;.",
-        "main.py"
-    ]
-
-    # Check for icon
-    if os.path.exists("icon.ico"):
-        cmd.insert(-1, "--icon=icon.ico")
-        # Add icon as data file for runtime use (window icon)
-        cmd.insert(-1, "--add-data=icon.ico;.")
-    else:
+    if not os.path.exists("icon.ico"):
         print("提示: 未找到 icon.ico，将使用默认图标。")
         print("若需自定义图标，请将 .ico 文件重命名为 icon.ico 并放在项目根目录。")
-    
-    try:
-        subprocess.check_call(cmd)
-        
-        # Rename to avoid icon cache issues
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        target_name = f"神马转码器_{timestamp}.exe"
-        original_path = os.path.join("dist", "神马转码器.exe")
-        new_path = os.path.join("dist", target_name)
-        
-        if os.path.exists(original_path):
-            if os.path.exists(new_path):
-                os.remove(new_path)
-            os.rename(original_path, new_path)
-            
-        print("\n" + "="*30)
-        print("打包成功！")
-        print(f"可执行文件位于: {new_path}")
-        print("注意：文件名已添加时间戳以避免图标缓存问题。")
-        print("="*30)
-    except subprocess.CalledProcessError as e:
-        print(f"打包过程中出错: {e}")
 
-    input("按回车键退出...")
+    # 3. Run PyInstaller per profile, then measure bundle size and launch-to-window time
+    profiles = ["onefile", "onedir"] if args.profile == "both" else [args.profile]
+    reports = []
+    for profile in profiles:
+        result = build_profile(profile)
+        if result:
+            reports.append(report_profile(profile, result[0], result[1], args.runs))
+
+    if not reports:
+        finish()
+        return
+
+    print("\n" + "="*30)
+    print("打包成功！")
+    for r in reports:
+        startup = f"{r['launch_to_window_ms']} ms" if r["launch_to_window_ms"] is not None else "未测量"
+        print(f"[{r['profile']}] {r['exe']}")
+        print(f"    体积: {r['bundle_size_mb']} MB    启动到窗口显示(中位数): {startup}")
+    print("注意：文件名已添加时间戳以避免图标缓存问题。")
+    print("="*30)
+
+    with open(os.path.join("dist", "build_report.json"), 'w', encoding='utf-8') as f:
+        json.dump(reports, f, ensure_ascii=False, indent=2)
+
+    finish()
 
 if __name__ == "__main__":
     build()
@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import threading
+from utils import get_data_dir, get_ffmpeg_path, norm_path
+
+# Black-bar detection. cropdetect runs once per source on a few short segments spread over the video
+# (each input seeks on its own, so only SAMPLES * SAMPLE_SECONDS are decoded) and keeps the bounding box
+# of the picture over all of them. Results are cached per file (size + mtime) in the data dir, so the
+# variants of a source and later batches don't detect again.
+
+CACHE_FILE = "crop_cache.json"
+SAMPLES = 6
+SAMPLE_SECONDS = 1.0
+LIMIT = 24 # Luma at or below this counts as black (0-255)
+MIN_SAVING = 0.02 # Crops removing less of the frame aren't worth it
+MIN_KEEP = 0.4 # A box smaller than this share of the frame is more likely dark footage than bars
+MAX_ENTRIES = 5000
+
+_cache = None # norm_path -> {"size", "mtime", "crop": [w, h, x, y] or None}
+_cache_lock = threading.Lock()
+
+def load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(os.path.join(get_data_dir(), CACHE_FILE), 'r', encoding='utf-8') as f:
+                _cache = json.load(f).get("crops", {})
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+def cached_crop(path):
+    """ (detected, crop): crop is (w, h, x, y) or None when the source has no bars to remove.
+    detected is False when the file hasn't been analysed (or changed since). """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False, None
+    with _cache_lock:
+        entry = load_cache().get(norm_path(path))
+    if not entry or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+        return False, None
+    return True, tuple(entry["crop"]) if entry["crop"] else None
+
+def store_crop(path, crop):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    with _cache_lock:
+        cache = load_cache()
+        key = norm_path(path)
+        cache.pop(key, None) # Re-insert at the end, the oldest entries are dropped first
+        cache[key] = {"size": st.st_size, "mtime": st.st_mtime, "crop": list(crop) if crop else None}
+        while len(cache) > MAX_ENTRIES:
+            del cache[next(iter(cache))]
+        try:
+            with open(os.path.join(get_data_dir(), CACHE_FILE), 'w', encoding='utf-8') as f:
+                json.dump({"crops": cache}, f)
+        except OSError as e:
+            print(f"Error saving crop cache: {e}")
+
+def sample_times(duration, samples=SAMPLES):
+    """ Start of each sampled segment, centred in equal slices of the video.
+    [0] for a short (or unknown length) video, detect_cmd then reads it from the start as one segment. """
+    if duration <= samples * SAMPLE_SECONDS * 2:
+        return [0]
+    return [duration * (i + 0.5) / samples - SAMPLE_SECONDS / 2 for i in range(samples)]
+
+def segment_args(t, count, duration):
+    """ Input options of one sampled segment: SAMPLE_SECONDS at t, the whole file when it is short,
+    the first SAMPLES * SAMPLE_SECONDS when its length is unknown """
+    if count > 1:
+        return ["-ss", f"{t:.3f}", "-t", f"{SAMPLE_SECONDS:g}"]
+    if duration > 0:
+        return []
+    return ["-t", f"{SAMPLE_SECONDS * SAMPLES:g}"]
+
+def sampled_seconds(duration):
+    """ Media seconds detect_cmd decodes """
+    times = sample_times(duration)
+    if len(times) > 1:
+        return len(times) * SAMPLE_SECONDS
+    return duration if duration > 0 else SAMPLES * SAMPLE_SECONDS
+
+def detect_cmd(path, duration):
+    """ Decode the samples as stored (no autorotate, the crop comes before any rotation) and run
+    cropdetect over them as one stream; its last line is the box over every frame seen """
+    times = sample_times(duration)
+    cmd = [get_ffmpeg_path(), "-hide_banner"]
+    for t in times:
+        cmd += ["-noautorotate"] + segment_args(t, len(times), duration) + ["-i", path]
+    inputs = "".join(f"[{i}:v:0]" for i in range(len(times)))
+    graph = f"{inputs}concat=n={len(times)}:v=1:a=0,cropdetect=limit={LIMIT}:round=2"
+    return cmd + ["-filter_complex", graph, "-an", "-f", "null", "-"]
+
+def parse_crop(lines, width, height):
+    """ Crop (w, h, x, y) from cropdetect's output, None when there are no bars worth removing """
+    crop = None
+    for line in lines:
+        match = re.search(r"crop=(-?\d+):(-?\d+):(-?\d+):(-?\d+)", line)
+        if match:
+            crop = tuple(int(v) for v in match.groups())
+    if not crop or not width or not height:
+        return None
+    w, h, x, y = crop
+    if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > width or y + h > height:
+        return None # All black samples give an inverted box
+    kept = w * h / (width * height)
+    if kept > 1 - MIN_SAVING or kept < MIN_KEEP:
+        return None
+    return crop
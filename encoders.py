@@ -0,0 +1,142 @@
+import os
+
+REFERENCE_PIXELS = 1920 * 1080 # expected_speed figures are for 1080p
+# Output height caps per quality tier, applied when "按档位限制分辨率" is on (never upscales)
+TIER_MAX_HEIGHT = {"balanced": 1080, "compact": 720}
+
+class EncoderProfile:
+    """ One video encoder: quality tier mapping, rate-control arguments and expected throughput.
+    tiers: quality -> (crf, preset), crf 0 means lossless. Qualities missing from tiers aren't supported.
+    speeds: quality -> expected encode speed at 1080p (media seconds per wall second, ~8 cores). """
+    key = ""
+    label = ""
+    encoder = ""
+    suffix = "" # Appended to output names, empty for the default encoder
+    two_pass = True # Target size mode runs -pass 1/2, otherwise single-pass average bitrate
+    target_preset = "medium"
+    tiers = {}
+    speeds = {}
+
+    def supports(self, quality):
+        return quality == "target" or quality in self.tiers
+
+    def tier(self, quality):
+        """ (crf, preset) for a quality tier """
+        if quality == "target":
+            return None, self.target_preset
+        return self.tiers[quality]
+
+    def rate_args(self, crf, preset):
+        return ["-crf", str(crf), "-preset", str(preset)]
+
+    def target_args(self, bitrate_kbps, preset):
+        return ["-b:v", f"{bitrate_kbps}k", "-preset", str(preset)]
+
+    def pass_args(self, pass_no, passlog):
+        """ Arguments for pass 1/2. The command runs with cwd = dirname(passlog). """
+        return ["-pass", str(pass_no), "-passlogfile", passlog]
+
+    def container_args(self, fmt):
+        return []
+
+    def expected_speed(self, quality, width=0, height=0):
+        """ Expected media seconds encoded per wall second, scaled from 1080p by pixel count """
+        speed = self.speeds.get(quality, 1.0)
+        if quality == "target" and self.two_pass:
+            speed /= 2 # Analysis pass + encode pass
+        if width and height:
+            speed *= REFERENCE_PIXELS / (width * height)
+        return speed
+
+class X264Profile(EncoderProfile):
+    key = "x264"
+    label = "H.264 (x264)"
+    encoder = "libx264"
+    tiers = {
+        "lossless": (0, "ultrafast"),
+        "hd": (18, "fast"),
+        "balanced": (23, "medium"),
+        "compact": (28, "slow"),
+    }
+    speeds = {"lossless": 4.0, "hd": 1.5, "balanced": 1.0, "compact": 0.5, "target": 1.0}
+
+class X265Profile(EncoderProfile):
+    key = "x265"
+    label = "H.265 (x265)"
+    encoder = "libx265"
+    suffix = "x265"
+    tiers = {
+        "lossless": (0, "ultrafast"),
+        "hd": (20, "fast"),
+        "balanced": (25, "medium"),
+        "compact": (30, "slow"),
+    }
+    speeds = {"lossless": 0.8, "hd": 0.5, "balanced": 0.3, "compact": 0.12, "target": 0.3}
+
+    def rate_args(self, crf, preset):
+        if crf == 0:
+            return ["-preset", preset, "-x265-params", "lossless=1"]
+        return ["-crf", str(crf), "-preset", preset]
+
+    def pass_args(self, pass_no, passlog):
+        # libx265 ignores -pass, it takes the stats file through x265-params. That list is
+        # ':'-separated, so use a relative name (cwd is the passlog dir) to keep drive letters out.
+        return ["-x265-params", f"pass={pass_no}:stats={os.path.basename(passlog)}.x265.log"]
+
+    def container_args(self, fmt):
+        # hvc1 tag so QuickTime / Windows players recognize HEVC in mp4
+        return ["-tag:v", "hvc1"] if fmt == "mp4" else []
+
+class SvtAv1Profile(EncoderProfile):
+    key = "av1"
+    label = "AV1 (SVT-AV1)"
+    encoder = "libsvtav1"
+    suffix = "AV1"
+    two_pass = False # Multi-pass isn't exposed through ffmpeg's libsvtav1, target mode uses VBR
+    target_preset = "8"
+    # No lossless mode; presets 0-13, higher is faster. Scales well across many cores.
+    tiers = {
+        "hd": (24, "8"),
+        "balanced": (30, "10"),
+        "compact": (38, "7"),
+    }
+    speeds = {"hd": 0.6, "balanced": 1.2, "compact": 0.3, "target": 0.6}
+
+    def target_args(self, bitrate_kbps, preset):
+        return ["-b:v", f"{bitrate_kbps}k", "-preset", preset, "-svtav1-params", "rc=1"]
+
+class Vp9Profile(EncoderProfile):
+    key = "vp9"
+    label = "VP9 (libvpx)"
+    encoder = "libvpx-vp9"
+    suffix = "VP9"
+    target_preset = "4"
+    # preset here is -cpu-used (0-8, higher is faster)
+    tiers = {
+        "lossless": (0, "5"),
+        "hd": (24, "4"),
+        "balanced": (32, "4"),
+        "compact": (40, "2"),
+    }
+    speeds = {"lossless": 0.3, "hd": 0.35, "balanced": 0.4, "compact": 0.15, "target": 0.35}
+
+    def common_args(self, cpu_used):
+        # row-mt lets libvpx use more than a couple of threads
+        return ["-deadline", "good", "-cpu-used", str(cpu_used), "-row-mt", "1"]
+
+    def rate_args(self, crf, preset):
+        if crf == 0:
+            return ["-lossless", "1"] + self.common_args(preset)
+        return ["-crf", str(crf), "-b:v", "0"] + self.common_args(preset)
+
+    def target_args(self, bitrate_kbps, preset):
+        return ["-b:v", f"{bitrate_kbps}k"] + self.common_args(preset)
+
+PROFILES = [X264Profile(), X265Profile(), SvtAv1Profile(), Vp9Profile()]
+DEFAULT_PROFILE = "x264"
+
+def get_profile(key):
+    for profile in PROFILES:
+        if profile.key == key:
+            return profile
+    return get_profile(DEFAULT_PROFILE)
@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import threading
+import subprocess
+from utils import get_ffmpeg_path, get_data_dir
+from filtergraph import ROTATION_FILTERS
+
+CACHE_FILE = "ffmpeg_caps.json"
+
+# Implementations per operation, fastest first. The first one the binary provides is used.
+# Video encoders aren't listed here, each encoders.py profile is tied to one encoder.
+OPERATIONS = {
+    "audio:aac": ["libfdk_aac", "aac"], # fdk is faster than the native encoder at the same quality
+}
+
+# Command line options the task builder relies on when the binary has them (with a fallback otherwise)
+DISPLAY_ROTATION_OPTION = "display_rotation" # FFmpeg 6.1+
+
+# Filters an option needs
+STABILIZE_FILTERS = ["vidstabdetect", "vidstabtransform"]
+CROP_FILTERS = ["concat", "cropdetect", "crop"]
+
+class FFmpegCapabilities:
+    """ What a given ffmpeg binary can do: version, encoders, filters, command line options """
+    def __init__(self, version="", encoders=(), filters=(), options=()):
+        self.version = version
+        self.encoders = set(encoders)
+        self.filters = set(filters)
+        self.options = set(options)
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_filter(self, name):
+        return name in self.filters
+
+    def has_option(self, name):
+        return name in self.options
+
+    def choose(self, operation):
+        """ Fastest available implementation for an operation, None if the binary has none """
+        for name in OPERATIONS.get(operation, []):
+            if name in self.encoders or name in self.filters:
+                return name
+        return None
+
+    def missing_for(self, task):
+        """ Components task needs that this binary lacks (empty list = runnable) """
+        missing = [name for name in [task.video_encoder, task.audio_encoder] if not self.has_encoder(name)]
+        if task.stabilization > 0:
+            missing += [f for f in STABILIZE_FILTERS if not self.has_filter(f)]
+        if task.auto_crop:
+            missing += [f for f in CROP_FILTERS if not self.has_filter(f)]
+        if task.rotation:
+            # Folded with the source's rotation metadata the op can be any of them
+            for name in sorted({f.split("=")[0] for filters in ROTATION_FILTERS.values() for f in filters}):
+                if not self.has_filter(name):
+                    missing.append(name)
+        return missing
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "encoders": sorted(self.encoders),
+            "filters": sorted(self.filters),
+            "options": sorted(self.options),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("version", ""), data.get("encoders", []), data.get("filters", []), data.get("options", []))
+
+def run_ffmpeg(ffmpeg, *args):
+    result = subprocess.run(
+        [ffmpeg, "-hide_banner", *args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8',
+        errors='replace',
+        creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+    )
+    return result.stdout
+
+def probe_capabilities(ffmpeg):
+    """ Run the -version/-encoders/-filters/-h long listings and parse them """
+    version = ""
+    match = re.search(r"ffmpeg version (\S+)", run_ffmpeg(ffmpeg, "-version"))
+    if match:
+        version = match.group(1)
+
+    # " V....D libx264              libx264 H.264 / AVC ..."
+    encoders = re.findall(r"^\s[VAS][\w.]{5}\s+(\S+)", run_ffmpeg(ffmpeg, "-encoders"), re.M)
+    # " ... vidstabdetect     V->V       Extract relative transformations ..."
+    filters = re.findall(r"^\s[T.][S.][C.]\s+(\S+)\s+\S*->\S*", run_ffmpeg(ffmpeg, "-filters"), re.M)
+    # "-display_rotation[:<stream_spec>] <angle>  set pure counter-clockwise rotation ..."
+    options = re.findall(r"^-(\w+)", run_ffmpeg(ffmpeg, "-h", "long"), re.M)
+    return FFmpegCapabilities(version, encoders, filters, options)
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+_caps = {} # resolved binary path -> FFmpegCapabilities, for this session
+_caps_lock = threading.Lock()
+
+def get_capabilities(ffmpeg=None):
+    """ Capabilities of the ffmpeg binary (default: get_ffmpeg_path()), None if it can't be found.
+    Probed once per binary: results are stored in the data dir keyed by the binary's sha256,
+    and the hash itself is only recomputed when the file's size or mtime changes. """
+    ffmpeg = ffmpeg or get_ffmpeg_path()
+    resolved = ffmpeg if os.path.isfile(ffmpeg) else shutil.which(ffmpeg)
+    if not resolved:
+        return None
+
+    with _caps_lock:
+        if resolved in _caps:
+            return _caps[resolved]
+
+        cache_path = os.path.join(get_data_dir(), CACHE_FILE)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        binaries = cache.setdefault("binaries", {}) # path -> {size, mtime, hash}
+        by_hash = cache.setdefault("capabilities", {}) # hash -> capabilities dict
+
+        try:
+            st = os.stat(resolved)
+            known = binaries.get(resolved)
+            changed = False
+            if known and known["size"] == st.st_size and known["mtime"] == st.st_mtime:
+                digest = known["hash"]
+            else:
+                digest = file_hash(resolved)
+                binaries[resolved] = {"size": st.st_size, "mtime": st.st_mtime, "hash": digest}
+                changed = True
+
+            if digest in by_hash and "options" in by_hash[digest]: # Older caches didn't list the options
+                caps = FFmpegCapabilities.from_dict(by_hash[digest])
+            else:
+                caps = probe_capabilities(resolved)
+                by_hash[digest] = caps.to_dict()
+                changed = True
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Error probing ffmpeg capabilities: {e}")
+            return None
+
+        if changed:
+            try:
+                with open(cache_path, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, indent=1)
+            except OSError as e:
+                print(f"Error saving ffmpeg capabilities: {e}")
+
+        _caps[resolved] = caps
+        return caps
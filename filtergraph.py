@@ -0,0 +1,116 @@
+# Builds the -vf chains for a task from its options, without running ffmpeg.
+# Order is chosen for speed and correctness:
+#   1. crop black bars, then downscale to the tier's height cap (cheap, every later filter and the
+#      encoder then touch fewer pixels)
+#   2. vidstabtransform (expensive, needs the same frames the analysis pass saw)
+#   3. rotation as a single op (180° is hflip,vflip instead of two full-frame transposes)
+# The stabilization analysis pass gets the same pre-filters as the encode, so its transforms line up.
+# Source rotation metadata (phone footage): ffmpeg's autorotate is always off, so the frames are never
+# turned twice. Rotation 0 ("auto") keeps the source's display matrix and leaves the pixels alone; a manual
+# rotation is relative to how the source plays and is folded with the metadata into one op, and the
+# display matrix is dropped so players don't apply it on top (-display_rotation 0 on the input, or on
+# binaries older than FFmpeg 6.1 a rotate=0 override of the output stream's tag).
+from stabilize import PROXY_DETECT_OPTIONS
+
+# rotation id (gui RotationCellWidget / global radio group) -> filters
+ROTATION_FILTERS = {
+    0: [],
+    1: ["transpose=2"], # Left 90 (counter-clockwise)
+    2: ["transpose=1"], # Right 90 (clockwise)
+    3: ["hflip", "vflip"], # 180, two cheap in-place flips
+}
+# rotation id -> clockwise degrees, and back
+ROTATION_DEGREES = {0: 0, 1: 270, 2: 90, 3: 180}
+DEGREES_ROTATION = {degrees: rotation for rotation, degrees in ROTATION_DEGREES.items()}
+
+def escape_path(path):
+    """ Filter option value for a path: forward slashes, ':' escaped (C\\:/...), single-quoted """
+    return "'" + path.replace('\\', '/').replace(':', '\\:') + "'"
+
+def output_turn(rotation=0, source_rotation=0):
+    """ Clockwise degrees between the decoded (stored) frames and the output as it plays """
+    return (source_rotation + ROTATION_DEGREES.get(rotation, 0)) % 360
+
+def rotation_op(rotation=0, source_rotation=0):
+    """ Rotation id of the one filter op the encode applies: none in auto mode (the metadata is kept),
+    otherwise the source's rotation and the manual one combined """
+    if not rotation:
+        return 0
+    return DEGREES_ROTATION[output_turn(rotation, source_rotation)]
+
+def rotation_input_args(rotation=0, source_rotation=0, display_rotation=True):
+    """ Input options (before -i) so the filters get the frames as stored: keep the display matrix
+    in auto mode, replace it with none when the rotation is done on the pixels.
+    display_rotation: the binary has the -display_rotation input option, otherwise see rotation_output_args """
+    if not source_rotation:
+        return []
+    if not rotation or not display_rotation:
+        return ["-noautorotate"]
+    return ["-display_rotation", "0"]
+
+def rotation_output_args(rotation=0, source_rotation=0, display_rotation=True):
+    """ Output options for binaries without -display_rotation: they copy the source's display matrix
+    to the output unless its rotate tag is overridden """
+    if source_rotation and rotation and not display_rotation:
+        return ["-metadata:s:v:0", "rotate=0"]
+    return []
+
+def swaps_axes(turn):
+    return turn % 180 == 90
+
+def scale_filters(max_height, turn=0):
+    """ Downscale so the output height is at most max_height (0 = keep), never upscale.
+    Runs on the stored frames, so when the output plays turned 90° its height is the stored width.
+    The other side follows the display aspect (dar) rounded to even, and the pixels are square:
+    -2 would keep the stored aspect and leave a slightly non-square SAR after a crop. """
+    if not max_height:
+        return []
+    if swaps_axes(turn):
+        return [f"scale='min(iw,{max_height})':'trunc(ow/dar/2+0.5)*2'", "setsar=1"]
+    return [f"scale='trunc(oh*dar/2+0.5)*2':'min(ih,{max_height})'", "setsar=1"]
+
+def crop_filters(crop):
+    """ crop: (w, h, x, y) in stored-frame coordinates (cropdetect.py), None = keep the whole frame """
+    if not crop:
+        return []
+    return ["crop={}:{}:{}:{}".format(*crop)]
+
+def even(value):
+    """ Nearest even integer, halves rounded up like the scale expressions """
+    return max(2, int(value / 2 + 0.5) * 2)
+
+def filtered_size(width, height, crop=None, max_height=0, turn=0):
+    """ (width, height) of the frames after the pre-filters, as stored (before any rotation); square pixels assumed """
+    if crop:
+        width, height = crop[0], crop[1]
+    if max_height and width and height:
+        if swaps_axes(turn) and width > max_height:
+            width, height = max_height, even(height * max_height / width)
+        elif not swaps_axes(turn) and height > max_height:
+            width, height = even(width * max_height / height), max_height
+    return width, height
+
+def pre_filters(max_height=0, rotation=0, source_rotation=0, crop=None):
+    """ Filters applied before stabilization, shared by the analysis and encode passes """
+    return crop_filters(crop) + scale_filters(max_height, output_turn(rotation, source_rotation))
+
+def stabilize_detect_filters(trf_path, max_height=0, rotation=0, proxy_scale=0, source_rotation=0, crop=None):
+    """ proxy_scale > 0: analyse frames downscaled by that factor (the .trf then needs stabilize.scale_trf) """
+    filters = pre_filters(max_height, rotation, source_rotation, crop)
+    if proxy_scale:
+        filters.append(f"scale=trunc(iw*{proxy_scale:.6f}/2)*2:trunc(ih*{proxy_scale:.6f}/2)*2")
+        filters.append(f"vidstabdetect={PROXY_DETECT_OPTIONS}:result={escape_path(trf_path)}")
+    else:
+        filters.append(f"vidstabdetect=result={escape_path(trf_path)}")
+    return filters
+
+def encode_filters(rotation=0, stabilization=0, trf_path="", max_height=0, source_rotation=0, crop=None):
+    filters = pre_filters(max_height, rotation, source_rotation, crop)
+    if stabilization > 0:
+        filters.append(f"vidstabtransform=input={escape_path(trf_path)}:smoothing={stabilization}")
+    filters += ROTATION_FILTERS[rotation_op(rotation, source_rotation)]
+    return filters
+
+def to_vf(filters):
+    """ ["-vf", "a,b"] or [] when there is nothing to do """
+    return ["-vf", ",".join(filters)] if filters else []
@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import get_data_dir, get_device_id, probe_media
+import cropdetect
+import filtergraph
+
+# Starting point for video bits per pixel per frame, until real encodes have been measured
+DEFAULT_BPP = {
+    "lossless": 2.5,
+    "hd": 0.20,
+    "balanced": 0.10,
+    "compact": 0.05,
+}
+AUDIO_KBPS = 128
+SAFETY_MARGIN = 1.05 # Keep 5% headroom on top of the projection
+STATS_FILE = "size_stats.json"
+EMA_WEIGHT = 0.3 # Weight of a new measurement in the running average
+
+def format_size(num_bytes):
+    gb = num_bytes / (1024 ** 3)
+    if gb >= 1:
+        return f"{gb:.2f} GB"
+    return f"{num_bytes / (1024 ** 2):.1f} MB"
+
+def volume_dir(path):
+    """ Nearest existing directory for path, used for st_dev / disk_usage lookups """
+    d = path if os.path.isdir(path) else os.path.dirname(path)
+    while d and not os.path.exists(d):
+        parent = os.path.dirname(d)
+        if parent == d:
+            break
+        d = parent
+    return d or "."
+
+def bpp_key(task):
+    """ Learned stats are per tier for x264 and per encoder + tier for the others.
+    Other encoders start from the x264 figures, which overestimates and so stays on the safe side. """
+    encoder = getattr(task, "encoder", "x264")
+    return task.quality if encoder == "x264" else f"{encoder}:{task.quality}"
+
+def kept_duration(task, duration):
+    start = float(task.trim_start) if task.trim_start else 0
+    end_minus = float(task.trim_end) if task.trim_end else 0
+    return max(duration - start - end_minus, 0)
+
+def output_pixels(task, info):
+    """ Encoded frame size: the source's, less black bars and downscaled to the tier's height cap """
+    crop = cropdetect.cached_crop(task.source_path)[1] if getattr(task, "auto_crop", False) else None
+    turn = filtergraph.output_turn(task.rotation, info.get("rotation", 0))
+    width, height = filtergraph.filtered_size(info["width"], info["height"], crop, getattr(task, "max_height", 0), turn)
+    return width * height
+
+class SizeForecaster:
+    """ Predicts output sizes from probe data and the quality tier, learning bits-per-pixel
+    per tier from finished encodes (persisted between sessions) """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats_path = os.path.join(get_data_dir(), STATS_FILE)
+        self.bpp = dict(DEFAULT_BPP)
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                self.bpp.update(json.load(f).get("bpp", {}))
+        except (OSError, ValueError):
+            pass
+
+    def estimate(self, task, info=None):
+        """ Expected output size in bytes (0 when the source can't be probed) """
+        if task.target_size_mb > 0:
+            return int(task.target_size_mb * 1024 * 1024)
+        info = info or probe_media(task.source_path)
+        if not info or not info["duration"]:
+            return 0
+        duration = kept_duration(task, info["duration"])
+        pixels_per_sec = output_pixels(task, info) * (info["fps"] or 30)
+        if pixels_per_sec:
+            video_bits = self.bpp.get(bpp_key(task), self.bpp.get(task.quality, DEFAULT_BPP["balanced"])) * pixels_per_sec * duration
+        else:
+            # No video stream info, fall back to the source bitrate
+            video_bits = info["bitrate"] * 1000 * duration
+        audio_bits = AUDIO_KBPS * 1000 * duration if info["has_audio"] else 0
+        return int((video_bits + audio_bits) / 8)
+
+    def record(self, task, output_path):
+        """ Learn from a finished encode """
+        if task.target_size_mb > 0 or task.quality not in DEFAULT_BPP:
+            return
+        info = probe_media(task.source_path)
+        try:
+            size = os.path.getsize(output_path)
+        except OSError:
+            return
+        if not info or not info["duration"] or not info["width"]:
+            return
+        duration = kept_duration(task, info["duration"])
+        pixels = output_pixels(task, info) * (info["fps"] or 30) * duration
+        if pixels <= 0:
+            return
+        audio_bits = AUDIO_KBPS * 1000 * duration if info["has_audio"] else 0
+        measured = max(size * 8 - audio_bits, 0) / pixels
+        with self.lock:
+            key = bpp_key(task)
+            old = self.bpp.get(key, DEFAULT_BPP[task.quality])
+            self.bpp[key] = old * (1 - EMA_WEIGHT) + measured * EMA_WEIGHT
+            try:
+                with open(self.stats_path, 'w', encoding='utf-8') as f:
+                    json.dump({"bpp": self.bpp}, f, indent=2)
+            except OSError as e:
+                print(f"Error saving size stats: {e}")
+
+    def forecast(self, tasks):
+        """ Set task.estimated_size for every task and sum the projection per destination volume.
+        Returns {device_id: {"path", "needed", "free", "tasks"}} """
+        sources = {t.source_path for t in tasks}
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            infos = dict(zip(sources, pool.map(probe_media, sources)))
+
+        volumes = {}
+        for task in tasks:
+            task.estimated_size = self.estimate(task, infos.get(task.source_path))
+            out_dir = volume_dir(task.output_path)
+            device = get_device_id(out_dir)
+            vol = volumes.get(device)
+            if vol is None:
+                try:
+                    free = shutil.disk_usage(out_dir).free
+                except OSError:
+                    free = 0
+                vol = volumes[device] = {"path": out_dir, "needed": 0, "free": free, "tasks": 0}
+            vol["needed"] += task.estimated_size
+            vol["tasks"] += 1
+        return volumes
+
+    @staticmethod
+    def fits(volume):
+        return volume["needed"] * SAFETY_MARGIN <= volume["free"]
@@ -4,9 +4,11 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QLabel, QPushButton, QListWidget, QTableWidget, QTableWidgetItem, 
                                QAbstractItemView, QHeaderView, QFileDialog, QGroupBox, QRadioButton, 
                                QCheckBox, QButtonGroup, QSlider, QLineEdit, QProgressBar, QMessageBox,
-                               QFrame, QScrollArea, QGridLayout, QStyle, QDialog, QDialogButtonBox)
+                               QFrame, QScrollArea, QGridLayout, QStyle, QDialog, QDialogButtonBox, QComboBox, QPlainTextEdit)
 from PySide6.QtCore import Qt, QMimeData, QSize, Signal, Slot, QEvent, QPoint
 from PySide6.QtGui import QDragEnterEvent, QDropEvent, QIcon, QAction, QMouseEvent
+from encoders import PROFILES, DEFAULT_PROFILE, TIER_MAX_HEIGHT
+from utils import VIDEO_EXTENSIONS
 
 class FormatCellWidget(QWidget):
     formatChanged = Signal()
@@ -90,7 +92,7 @@ class StabilizeCellWidget(QWidget):
         layout.addWidget(self.label)
         
         self.slider.valueChanged.connect(lambda v: self.label.setText(str(v)))
-        self.slider.sliderReleased.connect(self.stabilizeChanged) # Only update on release to avoid spam
+        self.slider.valueChanged.connect(self.stabilizeChanged) # Also keyboard and wheel changes, the row's config is read at start
 
     def set_data(self, value):
         self.slider.blockSignals(True)
@@ -111,34 +113,38 @@ class QualityCellWidget(QWidget):
         self.chk_hd = QCheckBox("高清")
         self.chk_balanced = QCheckBox("平衡")
         self.chk_compact = QCheckBox("小体积")
+        self.chk_target = QCheckBox("定大小")
         
-        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact]:
+        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact, self.chk_target]:
             chk.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
         
         layout.addWidget(self.chk_lossless)
         layout.addWidget(self.chk_hd)
         layout.addWidget(self.chk_balanced)
         layout.addWidget(self.chk_compact)
+        layout.addWidget(self.chk_target)
         
         self.chk_lossless.stateChanged.connect(self.qualityChanged)
         self.chk_hd.stateChanged.connect(self.qualityChanged)
         self.chk_balanced.stateChanged.connect(self.qualityChanged)
         self.chk_compact.stateChanged.connect(self.qualityChanged)
+        self.chk_target.stateChanged.connect(self.qualityChanged)
 
     def set_data(self, qualities):
-        self.blockSignals(True) # Block self signal? No, individual widgets.
-        # Actually easier to block signals of children
-        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact]:
+        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact, self.chk_target]:
             chk.blockSignals(True)
             
         self.chk_lossless.setChecked("lossless" in qualities)
         self.chk_hd.setChecked("hd" in qualities)
         self.chk_balanced.setChecked("balanced" in qualities)
         self.chk_compact.setChecked("compact" in qualities)
+        self.chk_target.setChecked("target" in qualities)
         
-        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact]:
+        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact, self.chk_target]:
             chk.blockSignals(False)
 
+ROTATION_AUTO_TIP = "按源文件的旋转标记播放（只保留标记，不重新处理画面）；左旋/右旋/翻转以播放时的方向为准"
+
 class RotationCellWidget(QWidget):
     rotationChanged = Signal()
 
@@ -150,7 +156,8 @@ class RotationCellWidget(QWidget):
         
         self.group = QButtonGroup(self)
         
-        self.radio_none = QRadioButton("Φ 保持")
+        self.radio_none = QRadioButton("Φ 自动")
+        self.radio_none.setToolTip(ROTATION_AUTO_TIP)
         self.radio_left = QRadioButton("↶ 90°")
         self.radio_right = QRadioButton("↷ 90°")
         self.radio_180 = QRadioButton("⥯ 180°")
@@ -182,6 +189,7 @@ class RotationCellWidget(QWidget):
 
 class FileTableWidget(QTableWidget):
     fileDropped = Signal(list)
+    folderDropped = Signal(list) # Dropped directories, imported recursively
     requestAddFile = Signal()
     rightDoubleClicked = Signal(int, int)
     quickOpenRequested = Signal(int) # row
@@ -200,6 +208,7 @@ class FileTableWidget(QTableWidget):
         self.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Interactive)
         self.verticalHeader().setVisible(False) # Hide default row numbers
         self.setContextMenuPolicy(Qt.CustomContextMenu) # Enable Custom Context Menu
+        self.setIconSize(QSize(48, 27)) # Thumbnail next to the file name
     
     def mousePressEvent(self, event):
         # Check for Alt + Left Click
@@ -254,26 +263,20 @@ class FileTableWidget(QTableWidget):
     def dropEvent(self, event: QDropEvent):
         urls = event.mimeData().urls()
         file_paths = []
-        valid_exts = {'.mp4', '.mkv', '.avi', '.mov', '.flv'}
+        folder_paths = []
         
         for url in urls:
             path = url.toLocalFile()
             if os.path.isfile(path):
-                if os.path.splitext(path)[1].lower() in valid_exts:
+                if path.lower().endswith(VIDEO_EXTENSIONS):
                     file_paths.append(path)
             elif os.path.isdir(path):
-                # Only first level
-                try:
-                    for entry in os.listdir(path):
-                        full_path = os.path.join(path, entry)
-                        if os.path.isfile(full_path):
-                            if os.path.splitext(full_path)[1].lower() in valid_exts:
-                                file_paths.append(full_path)
-                except Exception as e:
-                    print(f"Error reading dir: {e}")
+                folder_paths.append(path)
         
         if file_paths:
             self.fileDropped.emit(file_paths)
+        if folder_paths:
+            self.folderDropped.emit(folder_paths)
 
 class TaskTableWidget(QTableWidget):
     rightDoubleClicked = Signal(int, int) # row, col
@@ -298,6 +301,94 @@ class TaskTableWidget(QTableWidget):
         else:
             super().mouseDoubleClickEvent(event)
 
+QUALITY_NAMES = {"lossless": "无损", "hd": "高清", "balanced": "平衡", "compact": "小体积", "target": "定大小"}
+ROTATION_NAMES = {0: "自动方向", 1: "左旋90°", 2: "右旋90°", 3: "翻转180°"}
+
+def describe_config(config):
+    """ One-line summary of a file config (formats, qualities, rotation, trim, stabilization) """
+    parts = ["/".join(f.upper() for f in config.get("formats", [])) or "无格式",
+             "/".join(QUALITY_NAMES.get(q, q) for q in config.get("qualities", [])) or "无质量",
+             ROTATION_NAMES.get(config.get("rotation", 0), "")]
+    if config.get("trim_start", "0") not in ("", "0") or config.get("trim_end", "0") not in ("", "0"):
+        parts.append(f"剪切 {config.get('trim_start') or 0}/{config.get('trim_end') or 0} 秒")
+    if config.get("stabilization"):
+        parts.append(f"增稳 {config['stabilization']}")
+    return "，".join(parts)
+
+class WatchFolderDialog(QDialog):
+    """ Edit the watch folders. Added folders take the current global settings as their preset,
+    current_config() supplies it. """
+    def __init__(self, parent, folders, enabled, current_config):
+        super().__init__(parent)
+        self.setWindowTitle("监控文件夹")
+        self.resize(640, 320)
+        self.folders = [dict(entry) for entry in folders]
+        self.current_config = current_config
+
+        layout = QVBoxLayout(self)
+        info = QLabel("放入监控文件夹的新视频在写入完成后自动按该文件夹的预设转码。\n"
+                      "添加文件夹时以当前全局配置（格式/质量/旋转/剪切/增稳）作为预设，已有文件不处理。")
+        info.setStyleSheet("color: gray;")
+        layout.addWidget(info)
+
+        self.list_folders = QListWidget()
+        layout.addWidget(self.list_folders)
+
+        btn_layout = QHBoxLayout()
+        self.btn_add = QPushButton("添加文件夹")
+        self.btn_remove = QPushButton("移除选中")
+        self.chk_enabled = QCheckBox("启用监控")
+        self.chk_enabled.setChecked(enabled)
+        btn_layout.addWidget(self.btn_add)
+        btn_layout.addWidget(self.btn_remove)
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.chk_enabled)
+        layout.addLayout(btn_layout)
+
+        btn_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btn_box.accepted.connect(self.accept)
+        btn_box.rejected.connect(self.reject)
+        layout.addWidget(btn_box)
+
+        self.btn_add.clicked.connect(self.add_folder)
+        self.btn_remove.clicked.connect(self.remove_folder)
+        self.refresh()
+
+    def refresh(self):
+        self.list_folders.clear()
+        for entry in self.folders:
+            self.list_folders.addItem(f"{entry['path']}    [{describe_config(entry['config'])}]")
+
+    def add_folder(self):
+        d = QFileDialog.getExistingDirectory(self, "选择监控文件夹")
+        if not d or any(os.path.normcase(os.path.normpath(e["path"])) == os.path.normcase(os.path.normpath(d)) for e in self.folders):
+            return
+        self.folders.append({"path": d, "config": self.current_config()})
+        self.refresh()
+
+    def remove_folder(self):
+        row = self.list_folders.currentRow()
+        if row >= 0:
+            del self.folders[row]
+            self.refresh()
+
+class LogViewerDialog(QDialog):
+    """ Read-only view of a task's ffmpeg log """
+    def __init__(self, parent, title, text):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(800, 500)
+        layout = QVBoxLayout(self)
+        self.text_log = QPlainTextEdit()
+        self.text_log.setReadOnly(True)
+        self.text_log.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text_log.setPlainText(text)
+        self.text_log.moveCursor(self.text_log.textCursor().MoveOperation.End) # Errors are at the end
+        layout.addWidget(self.text_log)
+        btn_box = QDialogButtonBox(QDialogButtonBox.Close)
+        btn_box.rejected.connect(self.reject)
+        layout.addWidget(btn_box)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -331,13 +422,19 @@ class MainWindow(QMainWindow):
         # Buttons Row
         btn_layout = QHBoxLayout()
         self.btn_add_file = QPushButton("添加文件")
+        self.btn_add_folder = QPushButton("添加文件夹")
+        self.btn_add_folder.setToolTip("递归导入文件夹及其子文件夹中的所有视频，也可直接拖入文件夹")
         self.btn_del_sel = QPushButton("删除选中")
         self.btn_clear_all = QPushButton("清空列表")
         
         btn_layout.addWidget(self.btn_add_file)
+        btn_layout.addWidget(self.btn_add_folder)
         btn_layout.addWidget(self.btn_del_sel)
         btn_layout.addWidget(self.btn_clear_all)
         btn_layout.addStretch()
+        self.label_import = QLabel("")
+        self.label_import.setStyleSheet("color: gray;")
+        btn_layout.addWidget(self.label_import)
         
         layout.addLayout(btn_layout)
 
@@ -377,8 +474,9 @@ class MainWindow(QMainWindow):
         self.chk_hd = QCheckBox("高清 (HD)")
         self.chk_balanced = QCheckBox("平衡 (Balanced)")
         self.chk_compact = QCheckBox("小体积 (Compact)")
+        self.chk_target = QCheckBox("目标大小 (Target)")
         
-        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact]:
+        for chk in [self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact, self.chk_target]:
             chk.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
 
         self.chk_balanced.setChecked(True) # Default
@@ -386,13 +484,46 @@ class MainWindow(QMainWindow):
         quality_layout.addWidget(self.chk_hd)
         quality_layout.addWidget(self.chk_balanced)
         quality_layout.addWidget(self.chk_compact)
+
+        # Target size (two-pass, bitrate derived from duration)
+        target_layout = QHBoxLayout()
+        target_layout.addWidget(self.chk_target)
+        self.edit_target_size = QLineEdit("100")
+        self.edit_target_size.setFixedWidth(50)
+        self.edit_target_size.setToolTip("输出文件目标大小，按视频时长计算码率并两遍编码")
+        target_layout.addWidget(self.edit_target_size)
+        target_layout.addWidget(QLabel("MB"))
+        quality_layout.addLayout(target_layout)
+
+        # Video encoder, the quality tiers above map to its own crf/preset
+        encoder_layout = QHBoxLayout()
+        encoder_layout.addWidget(QLabel("编码器:"))
+        self.combo_encoder = QComboBox()
+        for profile in PROFILES:
+            self.combo_encoder.addItem(profile.label, profile.key)
+        self.combo_encoder.setCurrentIndex(self.combo_encoder.findData(DEFAULT_PROFILE))
+        self.combo_encoder.setToolTip("H.265/AV1/VP9 同画质下体积更小，但编码更慢；输出文件名会附带编码器后缀")
+        encoder_layout.addWidget(self.combo_encoder)
+        quality_layout.addLayout(encoder_layout)
+
+        # Fewer pixels to encode: black bars cropped, tiers capped in height
+        pixels_layout = QHBoxLayout()
+        self.chk_auto_crop = QCheckBox("裁剪黑边")
+        self.chk_auto_crop.setToolTip("转码前抽样检测源视频的黑边（每个文件检测一次并缓存）并裁掉，编码更快、体积更小")
+        self.chk_tier_caps = QCheckBox("按档位限制分辨率")
+        self.chk_tier_caps.setToolTip(f"平衡档最高 {TIER_MAX_HEIGHT['balanced']}p，小体积档最高 {TIER_MAX_HEIGHT['compact']}p，"
+                                      "较高分辨率的源会先缩小再编码（不会放大）")
+        pixels_layout.addWidget(self.chk_auto_crop)
+        pixels_layout.addWidget(self.chk_tier_caps)
+        quality_layout.addLayout(pixels_layout)
         quality_group.setLayout(quality_layout)
         settings_layout.addWidget(quality_group)
 
         # (3) Rotation
         rotate_group = QGroupBox("视频旋转")
         rotate_layout = QVBoxLayout()
-        self.radio_rot_none = QRadioButton("保持 Φ 0°")
+        self.radio_rot_none = QRadioButton("自动 Φ 按标记")
+        self.radio_rot_none.setToolTip(ROTATION_AUTO_TIP)
         self.radio_rot_left = QRadioButton("左旋 ↶ 90°")
         self.radio_rot_right = QRadioButton("右旋 ↷ 90°")
         self.radio_rot_180 = QRadioButton("翻转 ⥯ 180°")
@@ -444,6 +575,10 @@ class MainWindow(QMainWindow):
         stab_val_layout.addWidget(self.stab_edit)
         
         stab_layout.addLayout(stab_val_layout)
+
+        self.chk_stab_proxy = QCheckBox("低分辨率分析")
+        self.chk_stab_proxy.setToolTip("运动分析在缩小到 720p 的画面上进行，再换算到原分辨率应用，高分辨率源分析更快")
+        stab_layout.addWidget(self.chk_stab_proxy)
         stab_group.setLayout(stab_layout)
         settings_layout.addWidget(stab_group)
         
@@ -482,6 +617,35 @@ class MainWindow(QMainWindow):
         
         global_bottom_layout.addLayout(dir_layout, 2)
 
+        # Scratch Dir (encode on local disk, then move to the output dir)
+        scratch_layout = QVBoxLayout()
+        self.chk_scratch = QCheckBox("本地暂存目录 (输出到网络共享时加速)")
+        self.chk_scratch.setToolTip("先在本地高速磁盘完成编码，再以大块顺序复制移动到输出目录")
+
+        self.scratch_path_display = QLineEdit()
+        self.scratch_path_display.setReadOnly(True)
+        self.scratch_path_display.setPlaceholderText("请选择本地暂存目录...")
+        self.scratch_path_display.setEnabled(False)
+
+        self.btn_browse_scratch = QPushButton("浏览")
+        self.btn_browse_scratch.setEnabled(False)
+
+        self.transfer_edit = QLineEdit("2")
+        self.transfer_edit.setFixedWidth(30)
+        self.transfer_edit.setToolTip("同时传输数 (1-8)")
+        self.transfer_edit.setEnabled(False)
+
+        scratch_path_layout = QHBoxLayout()
+        scratch_path_layout.addWidget(self.scratch_path_display)
+        scratch_path_layout.addWidget(self.btn_browse_scratch)
+        scratch_path_layout.addWidget(QLabel("传输数:"))
+        scratch_path_layout.addWidget(self.transfer_edit)
+
+        scratch_layout.addWidget(self.chk_scratch)
+        scratch_layout.addLayout(scratch_path_layout)
+
+        global_bottom_layout.addLayout(scratch_layout, 2)
+
         # Thread Count
         thread_layout = QVBoxLayout()
         thread_layout.addWidget(QLabel("同时任务数 (1-15):"))
@@ -496,6 +660,21 @@ class MainWindow(QMainWindow):
         thread_ctrl_layout.addWidget(self.thread_slider)
         thread_ctrl_layout.addWidget(self.thread_edit)
         thread_layout.addLayout(thread_ctrl_layout)
+
+        # Per-disk cap for I/O-heavy (lossless/ultrafast) tasks
+        reader_layout = QHBoxLayout()
+        reader_layout.addWidget(QLabel("同盘高I/O任务上限:"))
+        self.reader_edit = QLineEdit("2")
+        self.reader_edit.setFixedWidth(40)
+        self.reader_edit.setToolTip("源文件位于同一磁盘时，同时运行的高读取量任务（无损/ultrafast 或实测读取较高）上限")
+        reader_layout.addWidget(self.reader_edit)
+        reader_layout.addStretch()
+        thread_layout.addLayout(reader_layout)
+
+        # Output verification: a quick probe always runs, the full decode is optional
+        self.chk_verify_decode = QCheckBox("完整解码校验")
+        self.chk_verify_decode.setToolTip("完成后以低优先级完整解码一遍输出文件，检查是否损坏或被截断（较慢）；\n默认只核对输出时长和音视频流")
+        thread_layout.addWidget(self.chk_verify_decode)
         
         global_bottom_layout.addLayout(thread_layout, 1)
         
@@ -509,7 +688,17 @@ class MainWindow(QMainWindow):
         
         # Tool bar for task list
         tool_layout = QHBoxLayout()
+        self.label_forecast = QLabel("")
+        self.label_forecast.setStyleSheet("color: gray;")
+        tool_layout.addWidget(self.label_forecast)
+        self.label_eta = QLabel("")
+        self.label_eta.setStyleSheet("color: gray;")
+        tool_layout.addWidget(self.label_eta)
         tool_layout.addStretch()
+
+        self.btn_export_report = QPushButton("导出报告")
+        self.btn_export_report.setToolTip("导出各任务的大小、耗时、速度与资源占用（JSON/CSV/HTML）")
+        tool_layout.addWidget(self.btn_export_report)
         
         self.btn_scroll_follow = QPushButton("↓↓")
         self.btn_scroll_follow.setToolTip("自动跟随最新任务")
@@ -571,6 +760,8 @@ class MainWindow(QMainWindow):
         # Action Buttons
         layout = QHBoxLayout()
         self.btn_help = QPushButton("使用说明")
+        self.btn_watch = QPushButton("监控文件夹")
+        self.btn_watch.setToolTip("自动转码放入指定文件夹的新视频")
         self.btn_cancel_all = QPushButton("取消所有任务")
         self.btn_clear_tasks = QPushButton("清空任务列表") # New
         self.task_table.verticalHeader().setVisible(False)
@@ -586,6 +777,7 @@ class MainWindow(QMainWindow):
         
         layout.addStretch()
         layout.addWidget(self.btn_help)
+        layout.addWidget(self.btn_watch)
         layout.addWidget(self.btn_clear_tasks)
         layout.addWidget(self.btn_cancel_all)
         layout.addWidget(self.btn_pause)
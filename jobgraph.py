@@ -0,0 +1,306 @@
+import time
+from PySide6.QtCore import QObject, Signal, Slot, QRunnable, QThreadPool
+
+# Resource classes, each with its own pool and concurrency limit
+CPU = "cpu" # Multithreaded encodes
+IO = "io" # Remux and moves, bound by the disks
+SINGLE = "single" # Mostly single-threaded passes (vidstabdetect), packed next to the encodes
+LOW = "low" # Low-priority checks (output verification), running on cores the encodes leave idle
+
+# Task priority lanes, lower runs first. Within a lane tasks start in submit order.
+URGENT = 0
+NORMAL = 1
+BACKGROUND = 2
+
+# Stage states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+class Stage:
+    """ One typed step of a task: probe, analyze, encode, remux, verify or move.
+    run: callable returning True on success, executed on the pool of the stage's resource class.
+    deps: stages (of this or another task) that must be DONE first.
+    can_start: optional admission check, evaluated in the GUI thread right before starting.
+    key: stages sharing a key never run at the same time (e.g. one analysis per shared .trf).
+    on_start / on_finish(success): optional hooks, called in the GUI thread.
+    cancel / pause / resume: act on whatever the running stage is doing (its ffmpeg process).
+    fallback: optional, called in the GUI thread when a dependency in another task failed; returns the
+    stages taking this one's place (e.g. an encode instead of copying that task's output), or None to fail. """
+    def __init__(self, kind, resource, run, deps=(), can_start=None, key=None,
+                 on_start=None, on_finish=None, cancel=None, pause=None, resume=None, fallback=None):
+        self.task_id = None
+        self.kind = kind
+        self.resource = resource
+        self.run = run
+        self.deps = list(deps)
+        self.can_start = can_start
+        self.key = key
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.cancel = cancel
+        self.pause = pause
+        self.resume = resume
+        self.fallback = fallback
+        self.state = PENDING
+        self.error = ""
+        self.started = 0 # Wall clock start/end of run (time.time()), for reports
+        self.finished = 0
+        self.preempted = False # Suspended (through pause) to give its slot to urgent work
+
+class StageRunner(QRunnable):
+    def __init__(self, graph, stage):
+        super().__init__()
+        self.graph = graph
+        self.stage = stage
+
+    def run(self):
+        success = False
+        self.stage.started = time.time()
+        try:
+            success = bool(self.stage.run())
+        except Exception as e:
+            self.stage.error = str(e)
+            print(f"Error in {self.stage.kind} stage: {e}")
+        finally:
+            self.stage.finished = time.time()
+            self.graph.stageFinished.emit(self.stage.task_id, self.stage.kind, success)
+
+class JobGraph(QObject):
+    """ Runs tasks as small DAGs of stages. Ready stages start by priority lane, then submit order, as long
+    as their resource class has a free slot; a failed stage ends its task and fails stages that depend on it.
+    An urgent stage finding its resource full preempts: the lowest-priority running stage there is
+    suspended and its slot handed over, and it resumes once a slot is free and no urgent stage waits.
+    Pause and cancel act on the whole graph. Lives in the GUI thread, stages run on the pools.
+    The owner calls dispatch() after changes (stageDone, resume, new tasks), so its admission
+    checks see fresh state. """
+    stageFinished = Signal(str, str, bool) # task_id, kind, success (emitted from pool threads)
+    stageDone = Signal(str, str, bool) # Same, re-emitted in the GUI thread once the graph is updated
+    taskDone = Signal(str, str, str) # task_id, DONE/FAILED/CANCELLED, error message if not reported by the stage
+    taskPreempted = Signal(str, bool) # task_id, True when suspended for urgent work / False when resumed
+
+    def __init__(self, limits):
+        super().__init__()
+        self.pools = {}
+        self.limits = {}
+        self.running = {} # resource -> number of running stages
+        self.preempted = [] # Stages suspended for urgent work, resumed first-in first-out
+        for resource, n in limits.items():
+            self.pools[resource] = QThreadPool()
+            self.running[resource] = 0
+            self.set_limit(resource, n)
+        self.tasks = {} # task_id -> [Stage], in submit order
+        self.priorities = {} # task_id -> lane
+        self.active_keys = set()
+        self.is_paused = False
+        self.stageFinished.connect(self.on_stage_finished)
+
+    def set_limit(self, resource, n):
+        self.limits[resource] = max(1, n)
+        self.fit_pool(resource)
+
+    def fit_pool(self, resource):
+        # A preempted stage keeps its pool thread while suspended, the urgent one needs another
+        suspended = sum(1 for s in self.preempted if s.resource == resource)
+        self.pools[resource].setMaxThreadCount(self.limits[resource] + suspended)
+
+    def add_task(self, task_id, stages, priority=NORMAL):
+        for stage in stages:
+            stage.task_id = task_id
+        self.tasks[task_id] = stages
+        self.set_priority(task_id, priority)
+
+    def set_priority(self, task_id, priority):
+        """ Move a task to another lane. Tasks it depends on (the encode a remux or link variant waits
+        for) are raised with it, never lowered. The owner calls dispatch() afterwards. """
+        if task_id not in self.tasks:
+            return
+        self.priorities[task_id] = priority
+        for stage in self.tasks[task_id]:
+            for dep in stage.deps:
+                if dep.task_id != task_id and self.priorities.get(dep.task_id, priority) > priority:
+                    self.set_priority(dep.task_id, priority)
+
+    def stages(self, task_id):
+        return self.tasks.get(task_id, [])
+
+    def replace_stages(self, task_id, old, new):
+        """ Swap consecutive pending stages of a task for new ones. Stages of the task depending on one of
+        old depend on the last new stage; a stage other tasks depend on (the last one) can't be replaced. """
+        stages = self.tasks[task_id]
+        first = stages.index(old[0])
+        for stage in new:
+            stage.task_id = task_id
+        stages[first:first + len(old)] = new
+        for stage in stages:
+            if stage not in new:
+                stage.deps = [new[-1] if d in old else d for d in stage.deps]
+        self.set_priority(task_id, self.priorities[task_id]) # New cross-task deps are raised with it
+
+    def apply_fallbacks(self):
+        """ Replace pending stages whose dependency in another task failed, where they have a fallback """
+        for task_id, stages in list(self.tasks.items()):
+            for stage in list(stages):
+                if stage.state != PENDING or not stage.fallback \
+                        or not any(d.state in (FAILED, CANCELLED) for d in stage.deps):
+                    continue
+                replacement = stage.fallback()
+                if replacement:
+                    self.replace_stages(task_id, [stage], replacement)
+
+    def has_pending(self):
+        return any(s.state == PENDING for stages in self.tasks.values() for s in stages)
+
+    @Slot()
+    def dispatch(self):
+        if self.is_paused:
+            return
+        self.resume_preempted()
+        self.apply_fallbacks()
+        # sorted() is stable: submit order within a lane
+        for task_id in sorted(self.tasks, key=self.priorities.get):
+            stages = self.tasks.get(task_id)
+            if stages is None:
+                continue # Ended by a failed dependency earlier in this pass
+            for stage in stages:
+                if stage.state != PENDING:
+                    continue
+                failed = [d for d in stage.deps if d.state in (FAILED, CANCELLED)]
+                if failed:
+                    # Only cross-task deps get here, a failed stage already ends its own task
+                    self.finish_task(task_id, FAILED, f"依赖的任务未完成（{failed[0].kind}）")
+                    break
+                if any(d.state != DONE for d in stage.deps):
+                    continue
+                full = self.running[stage.resource] >= self.limits[stage.resource]
+                if full and self.priorities[task_id] != URGENT:
+                    continue
+                if stage.key and stage.key in self.active_keys:
+                    continue
+                if stage.can_start and not stage.can_start():
+                    continue
+                if full and not self.preempt(stage.resource):
+                    continue
+                self.start_stage(stage)
+
+    def is_ready(self, stage):
+        """ True when stage would start given a free slot: dependencies done, key free and admitted """
+        return stage.state == PENDING and all(d.state == DONE for d in stage.deps) \
+            and not (stage.key and stage.key in self.active_keys) \
+            and (not stage.can_start or stage.can_start())
+
+    def urgent_waiting(self, resource):
+        """ True while an urgent stage is ready to run on resource. One its admission check holds (free space,
+        readers per device) doesn't count: keeping a stage suspended for it could wait on that very stage. """
+        return any(s.resource == resource and self.is_ready(s)
+                   for task_id, stages in self.tasks.items() if self.priorities[task_id] == URGENT for s in stages)
+
+    def preempt(self, resource):
+        """ Suspend the lowest-priority running stage on resource (the latest started in that lane)
+        and free its slot. False when only urgent or unpausable stages are running there. """
+        candidates = [s for task_id, stages in self.tasks.items() if self.priorities[task_id] != URGENT for s in stages
+                      if s.resource == resource and s.state == RUNNING and not s.preempted and s.pause]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda s: (self.priorities[s.task_id], s.started))
+        victim.pause()
+        victim.preempted = True
+        self.running[resource] -= 1
+        self.preempted.append(victim)
+        self.fit_pool(resource)
+        self.taskPreempted.emit(victim.task_id, True)
+        return True
+
+    def resume_preempted(self):
+        """ Give slots back to preempted stages once no urgent stage is waiting for them """
+        for stage in list(self.preempted):
+            if self.running[stage.resource] >= self.limits[stage.resource] or self.urgent_waiting(stage.resource):
+                continue
+            self.release_preempted(stage)
+            self.running[stage.resource] += 1
+            stage.resume()
+            self.taskPreempted.emit(stage.task_id, False)
+
+    def release_preempted(self, stage):
+        """ Forget a preempted stage; its slot was already given up, callers decide about the count """
+        self.preempted.remove(stage)
+        stage.preempted = False
+        self.fit_pool(stage.resource)
+
+    def start_stage(self, stage):
+        stage.state = RUNNING
+        self.running[stage.resource] += 1
+        if stage.key:
+            self.active_keys.add(stage.key)
+        if stage.on_start:
+            stage.on_start()
+        self.pools[stage.resource].start(StageRunner(self, stage))
+
+    @Slot(str, str, bool)
+    def on_stage_finished(self, task_id, kind, success):
+        stage = next((s for s in self.tasks.get(task_id, []) if s.kind == kind), None)
+        if stage is None:
+            return # Task was cancelled while this stage was running
+        suspended = stage.preempted or (self.is_paused and stage.pause is not None)
+        if stage.preempted:
+            self.release_preempted(stage)
+        else:
+            self.running[stage.resource] -= 1
+        if suspended and stage.resume:
+            # Finished its run outside ffmpeg while suspended (preempted, or the whole graph paused, which
+            # resume_all won't undo for a stage no longer running): clear the pause it would carry into
+            # its next stage, whose ffmpeg would otherwise start suspended and never resume
+            stage.resume()
+        self.active_keys.discard(stage.key)
+        stage.state = DONE if success else FAILED
+        if stage.on_finish:
+            stage.on_finish(success)
+
+        if not success:
+            self.finish_task(task_id, FAILED, stage.error)
+        elif all(s.state == DONE for s in self.tasks[task_id]):
+            self.finish_task(task_id, DONE)
+        self.stageDone.emit(task_id, kind, success)
+
+    def finish_task(self, task_id, state, message=""):
+        """ End a task: pending stages are cancelled, the task leaves the graph (stage objects stay
+        referenced by dependents, so their state still fails them) """
+        stages = self.tasks.pop(task_id, None)
+        if stages is None:
+            return
+        for stage in stages:
+            if stage.state == PENDING:
+                stage.state = CANCELLED
+            elif stage.state == RUNNING:
+                # Its runner reports back after the task left the graph, so free the slot here
+                stage.state = CANCELLED
+                if stage.preempted:
+                    self.release_preempted(stage) # Its slot was already given up
+                else:
+                    self.running[stage.resource] -= 1
+                self.active_keys.discard(stage.key)
+                if stage.cancel:
+                    stage.cancel()
+        self.priorities.pop(task_id, None)
+        self.taskDone.emit(task_id, state, message)
+
+    def cancel_all(self):
+        self.is_paused = False
+        for task_id in list(self.tasks):
+            self.finish_task(task_id, CANCELLED)
+
+    def pause_all(self):
+        self.is_paused = True
+        for stages in self.tasks.values():
+            for stage in stages:
+                if stage.state == RUNNING and stage.pause and not stage.preempted:
+                    stage.pause()
+
+    def resume_all(self):
+        self.is_paused = False
+        for stages in self.tasks.values():
+            for stage in stages:
+                if stage.state == RUNNING and stage.resume and not stage.preempted:
+                    stage.resume()
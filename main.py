@@ -1,35 +1,84 @@
+import time
+STARTUP_T0 = time.perf_counter() # Taken before the Qt imports, for startup timing
 import sys
 import os
-import uuid
-import subprocess
+import threading
+import html
+from collections import ChainMap
 from PySide6.QtWidgets import (QApplication, QTableWidgetItem, QHeaderView, QMessageBox, 
                                QFileDialog, QMenu, QDialog, QVBoxLayout, QHBoxLayout, 
                                QLabel, QStyle, QDialogButtonBox)
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import Qt, Slot, QPoint
-from gui import MainWindow, FormatCellWidget, QualityCellWidget, RotationCellWidget, TrimCellWidget, StabilizeCellWidget
-from worker import Scheduler, TranscodeTask, WorkerSignals, TaskStatus
-from utils import get_ffmpeg_path, get_base_path
+from PySide6.QtGui import QIcon, QPixmap
+from PySide6.QtCore import Qt, Slot, QPoint, QTimer, Signal, QUrl
+from gui import MainWindow, FormatCellWidget, QualityCellWidget, RotationCellWidget, TrimCellWidget, StabilizeCellWidget, WatchFolderDialog, LogViewerDialog
+from utils import get_base_path, norm_path, probe_media
+# worker (psutil) and forecast are imported in init_backend, after the window is on screen
+
+# Columns showing each key of a file config
+CONFIG_COLUMNS = {"formats": 5, "qualities": 6, "rotation": 7, "trim_start": 8, "trim_end": 8, "stabilization": 9}
+GLOBAL_SYNC_DELAY_MS = 200 # Global edits (typing, slider drags) reach the rows once they pause this long
+ETA_REFRESH_MS = 1000 # Batch ETA refresh interval while tasks report progress
+THUMB_DELAY_MS = 150 # Thumbnails are requested once scrolling pauses this long
+
+WATCH_QUEUE_PER_THREAD = 2 # Watch folder tasks queued or running, per concurrent task slot
+
+STARTUP_TRACE = "--startup-trace" in sys.argv or os.environ.get("SHENMA_STARTUP_TRACE") == "1"
+
+def startup_mark(timings, name):
+    """ Record ms since process start (STARTUP_T0) under name """
+    timings[name] = (time.perf_counter() - STARTUP_T0) * 1000
+    if STARTUP_TRACE:
+        print(f"[startup] {name}: {timings[name]:.1f} ms")
 
 class ShenmaConverter(MainWindow):
+    ffmpegChecked = Signal(bool) # found, emitted from the background check thread
+    folderBatch = Signal(object, list) # scan stop event, paths; batches from a folder import thread
+    folderScanFinished = Signal(object, int) # scan stop event, number of files found
+
     def __init__(self):
         super().__init__()
+        self.startup_timings = {}
+        self.window_shown_wall = 0
+        startup_mark(self.startup_timings, "imports")
         
         # Data
-        self.file_list = [] # List of dicts: {path, size, name, status, config}
+        self.file_list = [] # List of dicts: {path, size, name, status, config}, in table row order
+        # Rows share this dict: each row's config is ChainMap(row overrides, global_config),
+        # so a row only stores the settings edited on the row itself
+        self.global_config = self.get_current_global_config()
+        self.global_sync_timer = QTimer(self)
+        self.global_sync_timer.setSingleShot(True)
+        self.global_sync_timer.setInterval(GLOBAL_SYNC_DELAY_MS)
+        self.global_sync_timer.timeout.connect(self.apply_global_config)
+        self.file_keys = {} # norm_path -> file_data of every file in file_list, for dedup and lookups
+        self.scan_stop = threading.Event() # Set to abandon running folder imports
+        self.scans_running = 0
+        self.scan_found = 0
+        self.scan_added = 0
         self.tasks = {} # task_id -> task_obj
+        self.task_rows = {} # task_id -> row in the task table (append only until it's cleared)
+        self.eta_timer = QTimer(self)
+        self.eta_timer.setSingleShot(True)
+        self.eta_timer.setInterval(ETA_REFRESH_MS)
+        self.eta_timer.timeout.connect(self.update_eta)
         
-        # Scheduler
-        self.scheduler = Scheduler()
+        # Scheduler (created by init_backend once the window is shown)
+        self.scheduler = None
+        self.forecaster = None
+        self.ffmpeg_caps = None # FFmpegCapabilities, probed in the background after startup
+        self.watcher = None # FolderWatcher while watch folders are enabled
+        self.watch_folders = [] # [{"path", "config"}], loaded by init_backend
+        self.thumb_loader = None # ThumbnailLoader, created by init_backend
+        self.thumb_timer = QTimer(self)
+        self.thumb_timer.setSingleShot(True)
+        self.thumb_timer.setInterval(THUMB_DELAY_MS)
+        self.thumb_timer.timeout.connect(self.request_visible_thumbnails)
         
         # Connect UI Signals
         self.connect_signals()
         
         # Initial header mode for empty table
         self.file_table.applyResizeModeEmpty()
-        
-        # Check FFmpeg
-        self.check_ffmpeg()
 
         # Set Window Icon
         icon_path = os.path.join(get_base_path(), "icon.ico")
@@ -39,10 +88,15 @@ class ShenmaConverter(MainWindow):
     def connect_signals(self):
         # File Zone
         self.btn_add_file.clicked.connect(self.add_files_dialog)
+        self.btn_add_folder.clicked.connect(self.add_folder_dialog)
         self.btn_del_sel.clicked.connect(self.delete_selected_files)
         self.btn_clear_all.clicked.connect(self.clear_all_files)
         self.file_table.fileDropped.connect(self.add_files)
+        self.file_table.folderDropped.connect(self.import_folders)
+        self.folderBatch.connect(self.on_folder_batch)
+        self.folderScanFinished.connect(self.on_folder_scan_finished)
         self.file_table.requestAddFile.connect(self.add_files_dialog)
+        self.file_table.verticalScrollBar().valueChanged.connect(self.schedule_thumbnails)
         self.file_table.cellDoubleClicked.connect(self.on_file_double_click)
         self.file_table.rightDoubleClicked.connect(self.on_file_right_double_click)
         self.file_table.quickOpenRequested.connect(self.open_file_folder)
@@ -53,34 +107,32 @@ class ShenmaConverter(MainWindow):
         # Global Config
         self.btn_browse_out.clicked.connect(self.browse_output_dir)
         self.radio_out_custom.toggled.connect(self.toggle_output_browse)
+        self.chk_scratch.toggled.connect(self.toggle_scratch_browse)
+        self.btn_browse_scratch.clicked.connect(self.browse_scratch_dir)
         
-        # Global Sync Signals
-        self.chk_mp4.stateChanged.connect(self.sync_global_formats)
-        self.chk_mkv.stateChanged.connect(self.sync_global_formats)
-        
-        self.chk_lossless.stateChanged.connect(self.sync_global_qualities)
-        self.chk_hd.stateChanged.connect(self.sync_global_qualities)
-        self.chk_balanced.stateChanged.connect(self.sync_global_qualities)
-        self.chk_compact.stateChanged.connect(self.sync_global_qualities)
-        
-        self.rot_group_btn.idClicked.connect(self.sync_global_rotation)
-        
-        self.edit_trim_start.textChanged.connect(self.sync_global_trim)
-        self.edit_trim_end.textChanged.connect(self.sync_global_trim)
-        
-        self.stab_slider.valueChanged.connect(self.sync_global_stabilization)
+        # Global Sync Signals (debounced, see apply_global_config)
+        for chk in [self.chk_mp4, self.chk_mkv, self.chk_lossless, self.chk_hd, self.chk_balanced, self.chk_compact, self.chk_target]:
+            chk.stateChanged.connect(self.schedule_global_sync)
+        self.rot_group_btn.idClicked.connect(self.schedule_global_sync)
+        self.edit_trim_start.textChanged.connect(self.schedule_global_sync)
+        self.edit_trim_end.textChanged.connect(self.schedule_global_sync)
+        self.stab_slider.valueChanged.connect(self.schedule_global_sync)
         
         # Thread slider sync
         self.thread_slider.valueChanged.connect(lambda v: self.thread_edit.setText(str(v)))
         self.thread_edit.textChanged.connect(lambda t: self.thread_slider.setValue(int(t) if t.isdigit() else 1))
         self.thread_slider.valueChanged.connect(self.update_scheduler_threads)
+        self.reader_edit.textChanged.connect(self.update_scheduler_readers)
+        self.ffmpegChecked.connect(self.on_ffmpeg_checked)
 
         # Action Zone
         self.btn_start.clicked.connect(self.start_conversion)
         self.btn_cancel_all.clicked.connect(self.cancel_all_tasks)
         self.btn_pause.clicked.connect(self.toggle_pause)
         self.btn_clear_tasks.clicked.connect(self.clear_task_list)
+        self.btn_export_report.clicked.connect(self.export_report)
         self.btn_help.clicked.connect(self.show_help_dialog)
+        self.btn_watch.clicked.connect(self.show_watch_dialog)
         
         self.task_table.cellDoubleClicked.connect(self.on_task_double_click)
         self.task_table.rightDoubleClicked.connect(self.on_task_right_double_click)
@@ -105,16 +157,52 @@ class ShenmaConverter(MainWindow):
         <p>github: <a href='https://github.com/xuzhihans'>https://github.com/xuzhihans</a></p>
         <p>微信号：xzxz721</p>
         """
+        if self.startup_timings:
+            content += "<hr><p style='color: gray;'>启动耗时 (ms)：" + "，".join(
+                f"{name} {ms:.0f}" for name, ms in self.startup_timings.items()) + "</p>"
         QMessageBox.about(self, title, content)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        if "window_shown" not in self.startup_timings:
+            startup_mark(self.startup_timings, "window_shown")
+            self.window_shown_wall = time.time()
+            # Let the first paint happen, then load the rest
+            QTimer.singleShot(0, self.init_backend)
+
+    def init_backend(self):
+        """ Heavy imports and scheduler setup, deferred until the window is on screen """
+        if self.scheduler is not None:
+            return
+        from worker import Scheduler
+        from forecast import SizeForecaster
+        self.scheduler = Scheduler(self.thread_slider.value())
+        self.update_scheduler_readers()
+        self.forecaster = SizeForecaster()
+        self.init_watch()
+        from thumbnails import ThumbnailLoader
+        self.thumb_loader = ThumbnailLoader()
+        self.thumb_loader.ready.connect(self.on_thumbnail_ready)
+        self.schedule_thumbnails()
+        startup_mark(self.startup_timings, "backend_ready")
+
+        # FFmpeg capability probe runs off the GUI thread, the result comes back through ffmpegChecked
+        threading.Thread(target=self.check_ffmpeg, daemon=True).start()
+
     def check_ffmpeg(self):
-        # Check if ffmpeg is in path or current dir
-        # We can try running 'ffmpeg -version'
-        try:
-            import subprocess
-            subprocess.run([get_ffmpeg_path(), "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-        except FileNotFoundError:
+        # Probe encoders/filters once per ffmpeg binary (cached on disk by its hash)
+        from ffmpeg_caps import get_capabilities
+        caps = get_capabilities()
+        if caps:
+            self.ffmpeg_caps = caps
+        self.ffmpegChecked.emit(caps is not None)
+
+    @Slot(bool)
+    def on_ffmpeg_checked(self, found):
+        startup_mark(self.startup_timings, "ffmpeg_checked")
+        if not found:
             QMessageBox.warning(self, "缺少组件", "未找到 FFmpeg 可执行文件。\n请确保 ffmpeg.exe 位于程序目录下。")
+        self.feed_watch_queue() # Watch folder files wait for the capability probe
 
     # --- File Management ---
 
@@ -123,19 +211,56 @@ class ShenmaConverter(MainWindow):
         if files:
             self.add_files(files)
 
+    def add_folder_dialog(self):
+        d = QFileDialog.getExistingDirectory(self, "选择要导入的文件夹")
+        if d:
+            self.import_folders([d])
+
+    def import_folders(self, folders):
+        """ Recursive import on a background thread, files stream in through folderBatch """
+        from scanner import scan_tree
+        stop = self.scan_stop
+        self.scans_running += 1
+        self.label_import.setText(f"正在扫描文件夹... 已添加 {self.scan_added} 个")
+
+        def run():
+            found = scan_tree(folders, lambda paths: self.folderBatch.emit(stop, paths), should_stop=stop.is_set)
+            self.folderScanFinished.emit(stop, found)
+        threading.Thread(target=run, daemon=True).start()
+
+    @Slot(object, list)
+    def on_folder_batch(self, stop, paths):
+        if stop.is_set():
+            return # List was cleared since this scan started
+        self.scan_added += self.add_files(paths)
+        self.label_import.setText(f"正在扫描文件夹... 已添加 {self.scan_added} 个")
+
+    @Slot(object, int)
+    def on_folder_scan_finished(self, stop, found):
+        if stop is not self.scan_stop:
+            return
+        self.scans_running -= 1
+        self.scan_found += found
+        if self.scans_running == 0:
+            self.label_import.setText(f"文件夹导入完成：找到 {self.scan_found} 个视频，新增 {self.scan_added} 个")
+            self.scan_found = 0
+            self.scan_added = 0
+
     def add_files(self, paths):
-        existing_paths = {f['path'] for f in self.file_list}
+        """ Append new files to the list, skipping ones already in it. Returns the number added. """
         added_count = 0
-        default_config = self.get_current_global_config()
+        self.flush_global_config()
+        self.file_table.setUpdatesEnabled(False)
         
         for path in paths:
-            if path in existing_paths:
+            key = norm_path(path)
+            if key in self.file_keys:
                 continue
             
-            if not os.path.exists(path):
+            try:
+                size_mb = os.path.getsize(path) / (1024 * 1024)
+            except OSError:
                 continue
-
-            size_mb = os.path.getsize(path) / (1024 * 1024)
             size_str = f"{size_mb:.2f} MB"
             if size_mb > 1024:
                 size_str = f"{size_mb/1024:.2f} GB"
@@ -145,9 +270,10 @@ class ShenmaConverter(MainWindow):
                 "name": os.path.basename(path),
                 "size": size_str,
                 "status": "待转码",
-                "config": default_config.copy()
+                "config": ChainMap({}, self.global_config)
             }
             self.file_list.append(file_data)
+            self.file_keys[key] = file_data
             added_count += 1
             
             # Add to Table
@@ -155,12 +281,11 @@ class ShenmaConverter(MainWindow):
             self.file_table.insertRow(row)
             self.update_table_row(row, file_data)
         
-        if added_count == 0 and paths:
-            # Maybe hint duplicates?
-            pass
-        
-        if self.file_table.rowCount() > 0:
+        self.file_table.setUpdatesEnabled(True)
+        if added_count and self.file_table.rowCount() > 0:
             self.file_table.applyResizeModeWithContent()
+            self.schedule_thumbnails()
+        return added_count
 
     def update_table_row(self, row, data):
         def create_readonly_item(text):
@@ -174,47 +299,111 @@ class ShenmaConverter(MainWindow):
         self.file_table.setItem(row, 3, create_readonly_item(data['size']))
         self.file_table.setItem(row, 4, create_readonly_item(data['status']))
         
-        # Format Widget
+        # Editable cells: Format (5), Quality (6), Rotation (7), Trim (8), Stabilize (9)
+        # Each widget is bound to its row's data, so edits don't have to look up where the row is now
         widget = self.file_table.cellWidget(row, 5)
         if not widget:
             widget = FormatCellWidget()
-            widget.formatChanged.connect(lambda w=widget: self.on_table_format_changed(w))
+            widget.formatChanged.connect(lambda w=widget, d=data: self.on_table_format_changed(w, d))
             self.file_table.setCellWidget(row, 5, widget)
         
-        is_mp4 = "mp4" in data['config']['formats']
-        is_mkv = "mkv" in data['config']['formats']
-        widget.set_data(is_mp4, is_mkv)
-        
-        # Quality Widget (Col 6)
         widget_q = self.file_table.cellWidget(row, 6)
         if not widget_q:
             widget_q = QualityCellWidget()
-            widget_q.qualityChanged.connect(lambda w=widget_q: self.on_table_quality_changed(w))
+            widget_q.qualityChanged.connect(lambda w=widget_q, d=data: self.on_table_quality_changed(w, d))
             self.file_table.setCellWidget(row, 6, widget_q)
-        widget_q.set_data(data['config']['qualities'])
 
-        # Rotation Widget (Col 7)
         widget_r = self.file_table.cellWidget(row, 7)
         if not widget_r:
             widget_r = RotationCellWidget()
-            widget_r.rotationChanged.connect(lambda w=widget_r: self.on_table_rotation_changed(w))
+            widget_r.rotationChanged.connect(lambda w=widget_r, d=data: self.on_table_rotation_changed(w, d))
             self.file_table.setCellWidget(row, 7, widget_r)
-        widget_r.set_data(data['config']['rotation'])
         
         widget_t = self.file_table.cellWidget(row, 8)
         if not widget_t:
             widget_t = TrimCellWidget()
-            widget_t.trimChanged.connect(lambda w=widget_t: self.on_table_trim_changed(w))
+            widget_t.trimChanged.connect(lambda w=widget_t, d=data: self.on_table_trim_changed(w, d))
             self.file_table.setCellWidget(row, 8, widget_t)
-        widget_t.set_data(data['config']['trim_start'], data['config']['trim_end'])
         
         widget_s = self.file_table.cellWidget(row, 9)
         if not widget_s:
             widget_s = StabilizeCellWidget()
-            widget_s.stabilizeChanged.connect(lambda w=widget_s: self.on_table_stabilize_changed(w))
+            widget_s.stabilizeChanged.connect(lambda w=widget_s, d=data: self.on_table_stabilize_changed(w, d))
             self.file_table.setCellWidget(row, 9, widget_s)
-        widget_s.set_data(data['config']['stabilization'])
+
+        for col in sorted(set(CONFIG_COLUMNS.values())):
+            self.refresh_config_cell(row, col, data['config'])
+
+    def refresh_config_cell(self, row, col, config):
+        """ Show config in one of the row's editable cells """
+        widget = self.file_table.cellWidget(row, col)
+        if not widget:
+            return
+        if col == 5:
+            widget.set_data("mp4" in config['formats'], "mkv" in config['formats'])
+        elif col == 6:
+            widget.set_data(config['qualities'])
+        elif col == 7:
+            widget.set_data(config['rotation'])
+        elif col == 8:
+            widget.set_data(config['trim_start'], config['trim_end'])
+        elif col == 9:
+            widget.set_data(config['stabilization'])
     
+    # --- Thumbnails ---
+
+    def schedule_thumbnails(self, *args):
+        self.thumb_timer.start()
+
+    def visible_file_rows(self):
+        """ range of the file table rows currently on screen """
+        first = self.file_table.rowAt(0)
+        if first < 0:
+            return range(0)
+        last = self.file_table.rowAt(self.file_table.viewport().height() - 1)
+        if last < 0:
+            last = self.file_table.rowCount() - 1
+        return range(first, last + 1)
+
+    def request_visible_thumbnails(self):
+        """ Show the thumbnails already made for rows on screen and request the missing ones """
+        if self.thumb_loader is None:
+            return
+        wanted = []
+        for row in self.visible_file_rows():
+            file_data = self.file_list[row]
+            if 'thumb' not in file_data:
+                wanted.append(file_data['path'])
+            elif file_data['thumb'] and self.file_table.item(row, 1).icon().isNull():
+                self.show_thumbnail(row, file_data)
+        self.thumb_loader.request(wanted)
+
+    @Slot(str, str, int)
+    def on_thumbnail_ready(self, path, strip, frames):
+        file_data = self.file_keys.get(norm_path(path))
+        if file_data is None:
+            return # Removed from the list meanwhile
+        file_data['thumb'] = strip # "" marks a file ffmpeg couldn't decode, it isn't retried
+        file_data['thumb_frames'] = frames
+        if strip:
+            for row in self.visible_file_rows():
+                if self.file_list[row] is file_data:
+                    self.show_thumbnail(row, file_data)
+                    break
+
+    def show_thumbnail(self, row, file_data):
+        """ First frame of the strip as the name's icon, the whole strip in its tooltip """
+        pixmap = QPixmap(file_data['thumb'])
+        if pixmap.isNull():
+            return
+        item = self.file_table.item(row, 1)
+        frame = pixmap.copy(0, 0, pixmap.width() // max(file_data['thumb_frames'], 1), pixmap.height())
+        item.setIcon(QIcon(frame))
+        # The strip generator probed the file, this is a cache hit
+        info = probe_media(file_data["path"])
+        rotation = f'<br>旋转标记：顺时针 {info["rotation"]}°（“自动”按此方向播放）' if info and info["rotation"] else ""
+        item.setToolTip(f'{html.escape(file_data["path"])}{rotation}<br><img src="{QUrl.fromLocalFile(file_data["thumb"]).toString()}">')
+
     def on_file_double_click(self, row, col):
         if row < 0 or row >= len(self.file_list): return
         # Don't play if clicking on editable widgets (columns > 4)
@@ -249,72 +438,70 @@ class ShenmaConverter(MainWindow):
         folder = os.path.dirname(path)
         if os.path.exists(folder):
             try:
+                import subprocess
                 # Use explorer /select, path to select the file
                 subprocess.run(['explorer', '/select,', os.path.normpath(path)])
             except Exception as e:
                 QMessageBox.warning(self, "错误", f"无法打开目录: {e}")
 
-    def on_table_format_changed(self, widget):
-        index = self.file_table.indexAt(widget.pos())
-        row = index.row()
-        if row < 0: return
-
-        # Update Data
+    def on_table_format_changed(self, widget, file_data):
         formats = []
         if widget.chk_mp4.isChecked(): formats.append("mp4")
         if widget.chk_mkv.isChecked(): formats.append("mkv")
         
-        self.file_list[row]['config']['formats'] = formats
-
-    def on_table_quality_changed(self, widget):
-        index = self.file_table.indexAt(widget.pos())
-        row = index.row()
-        if row < 0: return
+        file_data['config']['formats'] = formats
 
+    def on_table_quality_changed(self, widget, file_data):
         qualities = []
         if widget.chk_lossless.isChecked(): qualities.append("lossless")
         if widget.chk_hd.isChecked(): qualities.append("hd")
         if widget.chk_balanced.isChecked(): qualities.append("balanced")
         if widget.chk_compact.isChecked(): qualities.append("compact")
+        if widget.chk_target.isChecked(): qualities.append("target")
         
-        self.file_list[row]['config']['qualities'] = qualities
+        file_data['config']['qualities'] = qualities
 
-    def on_table_rotation_changed(self, widget):
-        index = self.file_table.indexAt(widget.pos())
-        row = index.row()
-        if row < 0: return
-
-        rotation = widget.group.checkedId()
-        self.file_list[row]['config']['rotation'] = rotation
+    def on_table_rotation_changed(self, widget, file_data):
+        file_data['config']['rotation'] = widget.group.checkedId()
     
-    def on_table_trim_changed(self, widget):
-        index = self.file_table.indexAt(widget.pos())
-        row = index.row()
-        if row < 0:
-            return
-        self.file_list[row]['config']['trim_start'] = widget.edit_start.text()
-        self.file_list[row]['config']['trim_end'] = widget.edit_end.text()
+    def on_table_trim_changed(self, widget, file_data):
+        file_data['config']['trim_start'] = widget.edit_start.text()
+        file_data['config']['trim_end'] = widget.edit_end.text()
     
-    def on_table_stabilize_changed(self, widget):
-        index = self.file_table.indexAt(widget.pos())
-        row = index.row()
-        if row < 0:
-            return
-        self.file_list[row]['config']['stabilization'] = widget.slider.value()
+    def on_table_stabilize_changed(self, widget, file_data):
+        file_data['config']['stabilization'] = widget.slider.value()
+
+    def selected_file_ranges(self):
+        """ Selected rows of the file table as sorted, non-overlapping (first, last) ranges """
+        ranges = []
+        for r in sorted((r.topRow(), r.bottomRow()) for r in self.file_table.selectedRanges()):
+            if ranges and r[0] <= ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], r[1]))
+            else:
+                ranges.append(r)
+        return ranges
 
     def delete_selected_files(self):
-        rows = sorted(set(index.row() for index in self.file_table.selectedIndexes()), reverse=True)
-        for row in rows:
-            self.file_table.removeRow(row)
-            del self.file_list[row]
-        # Re-index
-        for i in range(self.file_table.rowCount()):
-            self.file_table.setItem(i, 0, QTableWidgetItem(str(i + 1)))
+        # One removeRows and one slice delete per selected range, instead of one per row
+        ranges = self.selected_file_ranges()
+        if not ranges:
+            return
+        self.file_table.setUpdatesEnabled(False)
+        for first, last in reversed(ranges):
+            self.file_table.model().removeRows(first, last - first + 1)
+            for file_data in self.file_list[first:last + 1]:
+                self.file_keys.pop(norm_path(file_data['path']), None)
+            del self.file_list[first:last + 1]
+        # Re-number the rows that moved up
+        for i in range(ranges[0][0], self.file_table.rowCount()):
+            self.file_table.item(i, 0).setText(str(i + 1))
+        self.file_table.setUpdatesEnabled(True)
         
         if self.file_table.rowCount() == 0:
             self.file_table.applyResizeModeEmpty()
         else:
             self.file_table.applyResizeModeWithContent()
+            self.schedule_thumbnails()
 
     def clear_all_files(self):
         if not self.file_list: return
@@ -350,6 +537,14 @@ class ShenmaConverter(MainWindow):
         if dialog.exec() == QDialog.Accepted:
             self.file_table.setRowCount(0)
             self.file_list.clear()
+            self.file_keys.clear()
+            # Abandon folder imports still running
+            self.scan_stop.set()
+            self.scan_stop = threading.Event()
+            self.scans_running = 0
+            self.scan_found = 0
+            self.scan_added = 0
+            self.label_import.setText("")
             self.file_table.applyResizeModeEmpty()
 
     # --- Configuration Logic ---
@@ -365,6 +560,7 @@ class ShenmaConverter(MainWindow):
         if self.chk_hd.isChecked(): qualities.append("hd")
         if self.chk_balanced.isChecked(): qualities.append("balanced")
         if self.chk_compact.isChecked(): qualities.append("compact")
+        if self.chk_target.isChecked(): qualities.append("target")
         
         rotation = self.rot_group_btn.checkedId()
         trim_start = self.edit_trim_start.text()
@@ -380,45 +576,35 @@ class ShenmaConverter(MainWindow):
             "stabilization": stabilization
         }
 
-    def sync_global_formats(self):
-        formats = []
-        if self.chk_mp4.isChecked(): formats.append("mp4")
-        if self.chk_mkv.isChecked(): formats.append("mkv")
-        
-        for i, file_data in enumerate(self.file_list):
-            file_data['config']['formats'] = formats
-            self.update_table_row(i, file_data)
-
-    def sync_global_qualities(self):
-        qualities = []
-        if self.chk_lossless.isChecked(): qualities.append("lossless")
-        if self.chk_hd.isChecked(): qualities.append("hd")
-        if self.chk_balanced.isChecked(): qualities.append("balanced")
-        if self.chk_compact.isChecked(): qualities.append("compact")
-        
-        for i, file_data in enumerate(self.file_list):
-            file_data['config']['qualities'] = qualities
-            self.update_table_row(i, file_data)
+    def schedule_global_sync(self, *args):
+        # Signal arguments are dropped, QTimer.start(int) would take them as the interval
+        self.global_sync_timer.start()
 
-    def sync_global_rotation(self):
-        rotation = self.rot_group_btn.checkedId()
-        for i, file_data in enumerate(self.file_list):
-            file_data['config']['rotation'] = rotation
-            self.update_table_row(i, file_data)
+    def flush_global_config(self):
+        """ Apply a pending debounced global edit right away (before reading row configs) """
+        if self.global_sync_timer.isActive():
+            self.apply_global_config()
 
-    def sync_global_trim(self):
-        trim_start = self.edit_trim_start.text()
-        trim_end = self.edit_trim_end.text()
-        for i, file_data in enumerate(self.file_list):
-            file_data['config']['trim_start'] = trim_start
-            file_data['config']['trim_end'] = trim_end
-            self.update_table_row(i, file_data)
+    def apply_global_config(self):
+        """ Global settings act as a batch edit: changed keys drop the rows' own overrides, then only
+        the columns of those keys are redrawn. Unchanged settings don't touch the table at all. """
+        self.global_sync_timer.stop()
+        config = self.get_current_global_config()
+        changed = [key for key, value in config.items() if self.global_config.get(key) != value]
+        if not changed:
+            return
+        self.global_config.update(config) # In place, every row's ChainMap sees it
+        for file_data in self.file_list:
+            overrides = file_data['config'].maps[0]
+            for key in changed:
+                overrides.pop(key, None)
 
-    def sync_global_stabilization(self):
-        stabilization = self.stab_slider.value()
-        for i, file_data in enumerate(self.file_list):
-            file_data['config']['stabilization'] = stabilization
-            self.update_table_row(i, file_data)
+        columns = sorted({CONFIG_COLUMNS[key] for key in changed})
+        self.file_table.setUpdatesEnabled(False)
+        for row, file_data in enumerate(self.file_list):
+            for col in columns:
+                self.refresh_config_cell(row, col, file_data['config'])
+        self.file_table.setUpdatesEnabled(True)
 
     # --- Global Config ---
     
@@ -431,12 +617,32 @@ class ShenmaConverter(MainWindow):
         if d:
             self.out_path_display.setText(d)
 
+    def toggle_scratch_browse(self, checked):
+        self.btn_browse_scratch.setEnabled(checked)
+        self.scratch_path_display.setEnabled(checked)
+        self.transfer_edit.setEnabled(checked)
+
+    def browse_scratch_dir(self):
+        d = QFileDialog.getExistingDirectory(self, "选择本地暂存目录")
+        if d:
+            self.scratch_path_display.setText(d)
+
     def update_scheduler_threads(self):
-        self.scheduler.set_max_threads(self.thread_slider.value())
+        if self.scheduler:
+            self.scheduler.set_max_threads(self.thread_slider.value())
+            self.feed_watch_queue()
+
+    def update_scheduler_readers(self):
+        t = self.reader_edit.text()
+        if self.scheduler and t.isdigit():
+            self.scheduler.set_max_readers_per_device(int(t))
 
     # --- Task Execution ---
 
     def start_conversion(self):
+        self.init_backend()
+        self.flush_global_config()
+
         # Validation
         if not self.file_list:
             QMessageBox.warning(self, "提示", "请先添加视频文件")
@@ -450,79 +656,130 @@ class ShenmaConverter(MainWindow):
             if not custom_dir or not os.path.isdir(custom_dir):
                  QMessageBox.warning(self, "提示", "请选择有效的自定义输出目录")
                  return
+
+        # Scratch dir (optional local staging)
+        scratch_dir = ""
+        if self.chk_scratch.isChecked():
+            scratch_dir = self.scratch_path_display.text()
+            if not scratch_dir or not os.path.isdir(scratch_dir):
+                QMessageBox.warning(self, "提示", "请选择有效的本地暂存目录")
+                return
+            self.update_scheduler_transfers()
+
+        # Target size (only validated when some row uses it)
+        target_size_mb = 0
+        if any("target" in file_data['config']['qualities'] for file_data in self.file_list):
+            target_size_mb = self.get_target_size()
+            if target_size_mb <= 0:
+                QMessageBox.warning(self, "提示", "请输入有效的目标大小 (MB)")
+                return
                  
         # Generate Tasks
+        from encoders import get_profile
+        profile = get_profile(self.combo_encoder.currentData())
         new_tasks = []
+        unsupported = 0
         
-        for row, file_data in enumerate(self.file_list):
+        for file_data in self.file_list:
             src_path = file_data['path']
-            src_dir = os.path.dirname(src_path)
-            src_name = os.path.splitext(file_data['name'])[0]
-            out_base_dir = custom_dir if output_dir_mode == "custom" else src_dir
-            widget_f = self.file_table.cellWidget(row, 5)
-            widget_q = self.file_table.cellWidget(row, 6)
-            widget_r = self.file_table.cellWidget(row, 7)
-            widget_t = self.file_table.cellWidget(row, 8)
-            widget_s = self.file_table.cellWidget(row, 9)
-            formats = []
-            qualities = []
-            if widget_f and getattr(widget_f, "chk_mp4", None) and widget_f.chk_mp4.isChecked(): formats.append("mp4")
-            if widget_f and getattr(widget_f, "chk_mkv", None) and widget_f.chk_mkv.isChecked(): formats.append("mkv")
-            if widget_q and getattr(widget_q, "chk_lossless", None) and widget_q.chk_lossless.isChecked(): qualities.append("lossless")
-            if widget_q and getattr(widget_q, "chk_hd", None) and widget_q.chk_hd.isChecked(): qualities.append("hd")
-            if widget_q and getattr(widget_q, "chk_balanced", None) and widget_q.chk_balanced.isChecked(): qualities.append("balanced")
-            if widget_q and getattr(widget_q, "chk_compact", None) and widget_q.chk_compact.isChecked(): qualities.append("compact")
-            if not formats or not qualities:
-                continue
-            rotation = widget_r.group.checkedId() if widget_r and getattr(widget_r, "group", None) else 0
-            trim_start = widget_t.edit_start.text() if widget_t and getattr(widget_t, "edit_start", None) else "0"
-            trim_end = widget_t.edit_end.text() if widget_t and getattr(widget_t, "edit_end", None) else "0"
-            stabilization = widget_s.slider.value() if widget_s and getattr(widget_s, "slider", None) else 0
-            for fmt in formats:
-                for quality in qualities:
-                    # Map quality to params
-                    preset = "medium"
-                    crf = 23
-                    quality_suffix = "Balanced"
-                    
-                    if quality == "lossless":
-                        crf = 0
-                        preset = "ultrafast"
-                        quality_suffix = "Lossless"
-                    elif quality == "hd":
-                        crf = 18
-                        preset = "fast"
-                        quality_suffix = "HD"
-                    elif quality == "compact":
-                        crf = 28
-                        preset = "slow"
-                        quality_suffix = "Compact"
-                        
-                    # Filename: name_quality.fmt
-                    out_name = f"{src_name}_{quality_suffix}.{fmt}"
-                    out_path = os.path.join(out_base_dir, out_name)
-                    
-                    task_id = str(uuid.uuid4())
-                    
-                    task = TranscodeTask(
-                        task_id, src_path, out_path, fmt, quality,
-                        rotation, trim_start, trim_end,
-                        stabilization, preset, crf
-                    )
-                    new_tasks.append(task)
+            out_base_dir = custom_dir if output_dir_mode == "custom" else os.path.dirname(src_path)
+            # The row's cell widgets write their edits into its config, no need to read them back
+            tasks, skipped = self.build_tasks(src_path, dict(file_data['config']), out_base_dir, scratch_dir, target_size_mb, profile)
+            new_tasks += tasks
+            unsupported += skipped
 
+        if unsupported:
+            QMessageBox.warning(self, "提示", f"{profile.label} 不支持所选的部分质量档位（如无损），已跳过 {unsupported} 个任务")
         if not new_tasks:
             QMessageBox.warning(self, "提示", "未生成有效任务，请检查格式和质量选择")
             return
 
+        # Validate against what this ffmpeg build can do
+        new_tasks = self.validate_tasks(new_tasks)
+        if not new_tasks:
+            return
+
+        # Pre-flight: projected output size per destination volume vs free space
+        if not self.check_free_space(new_tasks):
+            return
+
+        self.schedule_tasks(new_tasks)
+
+    def get_target_size(self):
+        try:
+            return float(self.edit_target_size.text())
+        except ValueError:
+            return 0
+
+    def update_scheduler_transfers(self):
+        t = self.transfer_edit.text()
+        self.scheduler.set_max_transfers(min(max(int(t), 1), 8) if t.isdigit() else 2)
+
+    def build_tasks(self, src_path, config, out_base_dir, scratch_dir, target_size_mb, profile):
+        """ TranscodeTasks for one source file and its config, one per format x quality.
+        Returns (tasks, number of qualities the encoder profile doesn't support) """
+        import uuid
+        from worker import TranscodeTask
+        from encoders import TIER_MAX_HEIGHT
+        src_name = os.path.splitext(os.path.basename(src_path))[0]
+        tasks = []
+        unsupported = 0
+        for fmt in config["formats"]:
+            for quality in config["qualities"]:
+                if not profile.supports(quality):
+                    unsupported += 1
+                    continue
+                # Map quality to the encoder's params (target: crf unused, bitrate derived from the duration)
+                crf, preset = profile.tier(quality)
+                quality_suffix = "Balanced"
+                
+                if quality == "lossless":
+                    quality_suffix = "Lossless"
+                elif quality == "hd":
+                    quality_suffix = "HD"
+                elif quality == "compact":
+                    quality_suffix = "Compact"
+                elif quality == "target":
+                    quality_suffix = f"{target_size_mb:g}MB"
+                if profile.suffix:
+                    quality_suffix += f"_{profile.suffix}"
+                    
+                # Filename: name_quality[_encoder].fmt
+                out_name = f"{src_name}_{quality_suffix}.{fmt}"
+                out_path = os.path.join(out_base_dir, out_name)
+                
+                task_id = str(uuid.uuid4())
+                
+                task = TranscodeTask(
+                    task_id, src_path, out_path, fmt, quality,
+                    config["rotation"], config["trim_start"], config["trim_end"],
+                    config["stabilization"], preset, crf,
+                    target_size_mb=target_size_mb if quality == "target" else 0,
+                    scratch_dir=scratch_dir,
+                    video_encoder=profile.encoder,
+                    encoder=profile.key,
+                    stab_proxy=self.chk_stab_proxy.isChecked(),
+                    verify_decode=self.chk_verify_decode.isChecked(),
+                    auto_crop=self.chk_auto_crop.isChecked(),
+                    max_height=TIER_MAX_HEIGHT.get(quality, 0) if self.chk_tier_caps.isChecked() else 0
+                )
+                tasks.append(task)
+        return tasks, unsupported
+
+    def schedule_tasks(self, new_tasks, lock_inputs=True):
+        """ lock_inputs: an interactive start, the file list and start button stay locked until the batch ends.
+        Watch folder tasks run alongside whatever the user is editing and leave them alone. """
+        from worker import WorkerSignals
         # UI Update
-        self.btn_start.setEnabled(False)
-        self.btn_start.setText("转码中...")
+        if lock_inputs:
+            self.btn_start.setEnabled(False)
+            self.btn_start.setText("转码中...")
+            self.file_group.setEnabled(False) # Lock file inputs
         self.btn_cancel_all.setEnabled(True)
         self.btn_pause.setVisible(True)
-        self.btn_pause.setEnabled(True)
-        self.btn_pause.setText("暂停任务")
-        self.file_group.setEnabled(False) # Lock file inputs
+        if not self.scheduler.is_paused:
+            self.btn_pause.setEnabled(True)
+            self.btn_pause.setText("暂停任务")
         
         # Add to Task Table and Schedule
         for task in new_tasks:
@@ -534,11 +791,168 @@ class ShenmaConverter(MainWindow):
             signals.status_changed.connect(self.on_task_status)
             signals.finished.connect(self.on_task_finished)
             signals.error.connect(self.on_task_error)
+            signals.preempted.connect(self.on_task_preempted)
             
             self.tasks[task.task_id] = task
             self.scheduler.start_task(task, signals)
+        if self.watcher:
+            # Outputs may land in a watched folder, don't convert them again
+            self.watcher.ignore([task.output_path for task in new_tasks])
+        self.update_eta()
+
+    # --- Watch Folders ---
+
+    def init_watch(self):
+        from watch import load_settings
+        self.watch_folders, enabled = load_settings()
+        self.set_watching(enabled)
+
+    def show_watch_dialog(self):
+        from watch import save_settings, skip_existing
+        self.init_backend()
+        dialog = WatchFolderDialog(self, self.watch_folders, self.watcher is not None, self.get_current_global_config)
+        if dialog.exec() != QDialog.Accepted:
+            return
+        known = {norm_path(entry["path"]) for entry in self.watch_folders}
+        for entry in dialog.folders:
+            if norm_path(entry["path"]) not in known:
+                skip_existing(entry["path"])
+        self.watch_folders = dialog.folders
+        enabled = dialog.chk_enabled.isChecked() and bool(self.watch_folders)
+        save_settings(self.watch_folders, enabled)
+        self.set_watching(enabled)
+
+    def set_watching(self, enabled):
+        """ (Re)start the watcher on self.watch_folders; files it already found stay queued """
+        from watch import FolderWatcher
+        ready = []
+        if self.watcher:
+            ready = list(self.watcher.ready)
+            self.watcher.stop()
+            self.watcher = None
+        if enabled and self.watch_folders:
+            self.watcher = FolderWatcher(self.watch_folders)
+            watched = {norm_path(entry["path"]) for entry in self.watch_folders}
+            self.watcher.ready.extend(item for item in ready if norm_path(os.path.dirname(item[0])) in watched)
+            self.watcher.filesReady.connect(self.feed_watch_queue)
+            self.watcher.start()
+            self.btn_watch.setText(f"监控中 ({len(self.watch_folders)})")
+        else:
+            self.btn_watch.setText("监控文件夹")
+
+    @Slot()
+    def feed_watch_queue(self):
+        """ Turn stable files from the watch folders into tasks with their folder's preset and the current
+        output settings. Only tops the scheduler up to WATCH_QUEUE_PER_THREAD tasks per slot, the rest
+        wait in the watcher, so a folder full of recordings doesn't flood the task list. """
+        if not self.watcher or not self.watcher.ready or not self.scheduler or not self.ffmpeg_caps:
+            return
+        from encoders import get_profile
+        profile = get_profile(self.combo_encoder.currentData())
+        custom_dir = self.out_path_display.text() if self.radio_out_custom.isChecked() else ""
+        if custom_dir and not os.path.isdir(custom_dir):
+            custom_dir = ""
+        scratch_dir = self.scratch_path_display.text() if self.chk_scratch.isChecked() else ""
+        if scratch_dir and not os.path.isdir(scratch_dir):
+            scratch_dir = ""
+        if scratch_dir:
+            self.update_scheduler_transfers()
+        target_size_mb = self.get_target_size()
+        depth = WATCH_QUEUE_PER_THREAD * self.thread_slider.value()
+
+        new_tasks = []
+        while self.watcher.ready and len(self.scheduler.active_workers) + len(new_tasks) < depth:
+            path, config = self.watcher.ready.popleft()
+            if not os.path.exists(path):
+                continue
+            if target_size_mb <= 0:
+                config = dict(config, qualities=[q for q in config["qualities"] if q != "target"])
+            tasks, _ = self.build_tasks(path, config, custom_dir or os.path.dirname(path), scratch_dir, target_size_mb, profile)
+            for task in tasks:
+                # No dialogs here, this runs unattended
+                task.audio_encoder = self.ffmpeg_caps.choose("audio:aac") or task.audio_encoder
+                missing = self.ffmpeg_caps.missing_for(task)
+                if missing:
+                    self.statusBar().showMessage(f"监控文件夹：跳过 {os.path.basename(task.output_path)}，缺少 {'、'.join(missing)}", 10000)
+                else:
+                    new_tasks.append(task)
+        if new_tasks:
+            self.forecaster.forecast(new_tasks) # Sets estimated_size for the scheduler's space checks
+            self.schedule_tasks(new_tasks, lock_inputs=False)
+
+    def update_eta(self):
+        """ Batch time left from the progress model, refreshed as tasks progress and finish """
+        from progress import format_eta
+        self.eta_timer.stop()
+        seconds = self.scheduler.estimate_remaining() if self.scheduler else 0
+        if seconds <= 0:
+            self.label_eta.setText("")
+        else:
+            self.label_eta.setText(f"预计剩余 {format_eta(seconds)}")
+
+    def validate_tasks(self, tasks):
+        """ Pick the audio encoder from the capability registry and drop tasks the ffmpeg build can't run
+        (the video encoder is fixed by the chosen profile) """
+        from ffmpeg_caps import get_capabilities
+        caps = self.ffmpeg_caps or get_capabilities()
+        if caps is None:
+            QMessageBox.warning(self, "缺少组件", "未找到 FFmpeg 可执行文件。\n请确保 ffmpeg.exe 位于程序目录下。")
+            return []
+        self.ffmpeg_caps = caps
+
+        valid = []
+        invalid = []
+        for task in tasks:
+            task.audio_encoder = caps.choose("audio:aac") or task.audio_encoder
+            missing = caps.missing_for(task)
+            if missing:
+                invalid.append(f"{os.path.basename(task.output_path)}: 缺少 {', '.join(missing)}")
+            else:
+                valid.append(task)
+
+        if invalid:
+            shown = invalid[:10] + ([f"... 共 {len(invalid)} 个"] if len(invalid) > 10 else [])
+            if not valid:
+                QMessageBox.warning(self, "FFmpeg 组件不足", f"当前 FFmpeg ({caps.version}) 无法执行以下任务：\n\n" + "\n".join(shown))
+                return []
+            reply = QMessageBox.question(
+                self, "FFmpeg 组件不足",
+                f"当前 FFmpeg ({caps.version}) 无法执行以下任务：\n\n" + "\n".join(shown) + "\n\n跳过这些任务并继续其余任务？",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return []
+        return valid
+
+    def check_free_space(self, tasks):
+        from forecast import SizeForecaster, format_size
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            volumes = self.forecaster.forecast(tasks)
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        lines = []
+        short = []
+        for vol in volumes.values():
+            line = f"{vol['path']}: 预计输出 {format_size(vol['needed'])} / 可用 {format_size(vol['free'])}"
+            lines.append(line)
+            if not SizeForecaster.fits(vol):
+                short.append(line)
+        self.label_forecast.setText("；".join(lines))
+
+        if short:
+            reply = QMessageBox.question(
+                self, "磁盘空间不足",
+                "以下输出卷的预计占用超过剩余空间：\n\n" + "\n".join(short) +
+                "\n\n继续转换时，放不下的任务将被暂缓，直到空间足够或判定失败。是否继续？",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            return reply == QMessageBox.Yes
+        return True
 
     def add_task_to_table(self, task):
+        from worker import TaskStatus
         row = self.task_table.rowCount()
         self.task_table.insertRow(row)
         
@@ -547,7 +961,8 @@ class ShenmaConverter(MainWindow):
         item_id.setData(Qt.UserRole, task.task_id)
         
         self.task_table.setItem(row, 0, item_id)
-        self.task_table.setItem(row, 1, QTableWidgetItem(os.path.basename(task.output_path)))
+        self.task_rows[task.task_id] = row
+        self.task_table.setItem(row, 1, QTableWidgetItem(self.task_display_name(task)))
         self.task_table.setItem(row, 2, QTableWidgetItem(task.source_path))
         self.task_table.setItem(row, 3, QTableWidgetItem(task.output_path))
         self.task_table.setItem(row, 4, QTableWidgetItem("0%"))
@@ -556,18 +971,26 @@ class ShenmaConverter(MainWindow):
         if self.btn_scroll_follow.isChecked():
             self.task_table.scrollToBottom()
 
+    def task_display_name(self, task):
+        """ Output file name, prefixed with the priority lane unless it is the normal one """
+        from worker import PRIORITY_NAMES
+        from jobgraph import NORMAL
+        name = os.path.basename(task.output_path)
+        return name if task.priority == NORMAL else f"[{PRIORITY_NAMES[task.priority]}] {name}"
+
     def get_row_by_task_id(self, task_id):
-        for r in range(self.task_table.rowCount()):
-            item = self.task_table.item(r, 0)
-            if item and item.data(Qt.UserRole) == task_id:
-                return r
-        return -1
+        return self.task_rows.get(task_id, -1)
 
     @Slot(str, int)
     def on_task_progress(self, task_id, percent):
+        from progress import format_eta
         row = self.get_row_by_task_id(task_id)
         if row >= 0:
-            self.task_table.setItem(row, 4, QTableWidgetItem(f"{percent}%"))
+            seconds = self.scheduler.task_eta(task_id) if self.scheduler and percent < 100 else 0
+            text = f"{percent}%（剩余 {format_eta(seconds)}）" if seconds > 0 else f"{percent}%"
+            self.task_table.setItem(row, 4, QTableWidgetItem(text))
+        if not self.eta_timer.isActive():
+            self.eta_timer.start() # Batch ETA at most once per interval, not on every progress line
 
     @Slot(str, str)
     def on_task_status(self, task_id, status):
@@ -581,20 +1004,35 @@ class ShenmaConverter(MainWindow):
 
     @Slot(str)
     def on_task_finished(self, task_id):
+        from worker import TaskStatus
+        if task_id in self.tasks:
+            task = self.tasks[task_id]
+            self.forecaster.record(task, task.output_path)
         self.on_task_status(task_id, TaskStatus.COMPLETED)
         self.on_task_progress(task_id, 100)
+        self.feed_watch_queue()
+        row = self.get_row_by_task_id(task_id)
+        if row >= 0 and task_id in self.tasks:
+            self.task_table.item(row, 5).setToolTip(self.tasks[task_id].verify_result)
+        self.update_eta()
         self.check_all_finished()
 
     @Slot(str, str)
     def on_task_error(self, task_id, error_msg):
+        from worker import TaskStatus
+        if task_id in self.tasks:
+            self.tasks[task_id].error_msg = error_msg
         self.on_task_status(task_id, TaskStatus.FAILED)
+        self.feed_watch_queue()
         # Maybe show tooltip?
         row = self.get_row_by_task_id(task_id)
         if row >= 0:
             self.task_table.item(row, 5).setToolTip(error_msg)
+        self.update_eta()
         self.check_all_finished()
 
     def check_all_finished(self):
+        from worker import TaskStatus
         # Check if any running
         # If scheduler pool is empty?
         # Simple check:
@@ -606,7 +1044,7 @@ class ShenmaConverter(MainWindow):
         
         all_done = True
         for task in self.tasks.values():
-            if task.status in [TaskStatus.WAITING, TaskStatus.RUNNING]:
+            if task.status in [TaskStatus.WAITING, TaskStatus.ANALYZING, TaskStatus.RUNNING, TaskStatus.MOVING, TaskStatus.VERIFYING]:
                 all_done = False
                 break
         
@@ -617,7 +1055,25 @@ class ShenmaConverter(MainWindow):
             self.btn_pause.setVisible(False)
             self.file_group.setEnabled(True)
 
+    def export_report(self):
+        from report import export_report
+        if not self.tasks:
+            QMessageBox.warning(self, "提示", "任务列表为空，没有可导出的报告")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出报告", f"转码报告_{time.strftime('%Y%m%d_%H%M%S')}.html",
+                                              "HTML (*.html);;CSV (*.csv);;JSON (*.json)")
+        if not path:
+            return
+        try:
+            count = export_report(path, list(self.tasks.values()))
+        except OSError as e:
+            QMessageBox.warning(self, "错误", f"无法写入报告: {e}")
+            return
+        QMessageBox.information(self, "完成", f"已导出 {count} 个任务的报告")
+
     def toggle_pause(self):
+        if not self.scheduler:
+            return
         if self.scheduler.is_paused:
             self.scheduler.resume_all()
             self.btn_pause.setText("暂停任务")
@@ -626,6 +1082,7 @@ class ShenmaConverter(MainWindow):
             self.btn_pause.setText("继续任务")
 
     def clear_task_list(self):
+        from worker import TaskStatus
         def show_popup(text, is_warning=True):
             dialog = QDialog(self)
             dialog.setWindowTitle("提示")
@@ -661,21 +1118,23 @@ class ShenmaConverter(MainWindow):
             return dialog.exec()
 
         # Check if any running or paused
-        if any(t.status == TaskStatus.RUNNING for t in self.tasks.values()):
+        if any(t.status in [TaskStatus.ANALYZING, TaskStatus.RUNNING, TaskStatus.MOVING, TaskStatus.VERIFYING] for t in self.tasks.values()):
             show_popup("有任务正在进行中，无法清空列表。\n请先取消或等待完成。")
             return
         
         # Double check with scheduler active workers
-        if self.scheduler.active_workers:
+        if self.scheduler and self.scheduler.active_workers:
             show_popup("后台仍有活动任务，无法清空。")
             return
 
         # Custom Dialog for Clear Confirmation
         if show_popup("确认清空任务列表吗？", is_warning=False) == QDialog.Accepted:
             self.tasks.clear()
+            self.task_rows.clear()
             self.task_table.setRowCount(0)
 
     def on_task_double_click(self, row, col):
+        from worker import TaskStatus
         item = self.task_table.item(row, 0)
         if not item: return
         task_id = item.data(Qt.UserRole)
@@ -703,6 +1162,7 @@ class ShenmaConverter(MainWindow):
             if os.path.exists(folder):
                 # Select file in explorer
                 try:
+                    import subprocess
                     subprocess.run(['explorer', '/select,', os.path.normpath(task.output_path)])
                 except Exception as e:
                     QMessageBox.warning(self, "错误", f"无法打开目录: {e}")
@@ -716,22 +1176,85 @@ class ShenmaConverter(MainWindow):
         
         menu = QMenu(self)
         action_open_folder = menu.addAction("打开文件所在位置")
+        action_view_log = menu.addAction("查看日志")
+
+        # Priority lane, only while the task is still queued or running
+        from worker import PRIORITY_NAMES
+        task = self.tasks.get(self.task_table.item(row, 0).data(Qt.UserRole))
+        active = bool(task and self.scheduler and task.task_id in self.scheduler.active_workers)
+        priority_menu = menu.addMenu("优先级")
+        priority_menu.setEnabled(active)
+        priority_actions = {}
+        for priority, name in PRIORITY_NAMES.items():
+            act = priority_menu.addAction(name)
+            act.setCheckable(True)
+            act.setChecked(bool(task) and task.priority == priority)
+            priority_actions[act] = priority
         
         action = menu.exec(self.task_table.mapToGlobal(pos))
         
         if action == action_open_folder:
             self.open_task_folder(row)
+        elif action == action_view_log:
+            self.show_task_log(row)
+        elif action in priority_actions and active:
+            self.set_task_priority(task, priority_actions[action])
+
+    def set_task_priority(self, task, priority):
+        """ Move a task to another lane; urgent tasks suspend lower-priority encodes if no slot is free """
+        self.scheduler.set_priority(task.task_id, priority)
+        row = self.get_row_by_task_id(task.task_id)
+        if row >= 0:
+            self.task_table.item(row, 1).setText(self.task_display_name(task))
+
+    @Slot(str, bool)
+    def on_task_preempted(self, task_id, suspended):
+        row = self.get_row_by_task_id(task_id)
+        if row >= 0 and task_id in self.tasks:
+            status = self.tasks[task_id].status
+            self.task_table.setItem(row, 5, QTableWidgetItem(f"{status}（已让出给紧急任务）" if suspended else status))
+
+    def show_task_log(self, row):
+        """ Load the task's log file only now, the worker never sends its output to the GUI """
+        from tasklog import read_log
+        item = self.task_table.item(row, 0)
+        if not item: return
+        task_id = item.data(Qt.UserRole)
+        worker = self.scheduler.active_workers.get(task_id) if self.scheduler else None
+        if worker:
+            worker.log.flush() # Still running, show what it printed so far
+        text = read_log(task_id) or "（暂无日志，任务尚未运行 FFmpeg 或日志已被清理）"
+        title = os.path.basename(self.tasks[task_id].output_path) if task_id in self.tasks else "日志"
+        LogViewerDialog(self, f"日志 - {title}", text).exec()
 
     def cancel_all_tasks(self):
-        self.scheduler.cancel_all()
+        from worker import TaskStatus
+        if self.scheduler:
+            self.scheduler.cancel_all()
         # Update UI
         for task in self.tasks.values():
-            if task.status in [TaskStatus.WAITING, TaskStatus.RUNNING]:
+            if task.status in [TaskStatus.WAITING, TaskStatus.ANALYZING, TaskStatus.RUNNING, TaskStatus.MOVING, TaskStatus.VERIFYING]:
                 task.status = TaskStatus.CANCELLED
                 self.on_task_status(task.task_id, TaskStatus.CANCELLED)
         
+        self.update_eta()
         self.check_all_finished()
 
+def run_startup_benchmark(window, result_path):
+    """ --startup-benchmark=<file>: write the timings once the backend is up, then quit.
+    Used by benchmark.py / build_exe.py, the wall-clock launch time lets them measure cold start
+    from outside the process (works for --windowed builds that have no stdout). """
+    def finish():
+        if window.scheduler is None:
+            QTimer.singleShot(10, finish)
+            return
+        with open(result_path, 'w', encoding='utf-8') as f:
+            f.write(f"window_shown_wall {window.window_shown_wall}\n")
+            for name, ms in window.startup_timings.items():
+                f.write(f"{name} {ms:.1f}\n")
+        QApplication.quit()
+    QTimer.singleShot(0, finish)
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     
@@ -740,4 +1263,8 @@ if __name__ == "__main__":
     
     window = ShenmaConverter()
     window.show()
+
+    for arg in sys.argv[1:]:
+        if arg.startswith("--startup-benchmark="):
+            run_startup_benchmark(window, arg.split("=", 1)[1])
     sys.exit(app.exec())
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import threading
+from utils import get_data_dir
+
+# Progress model: a task is a list of phases (stabilization analysis, two-pass analysis, encode, remux),
+# each weighted by its expected wall time = media seconds / expected speed. Speeds are learned from
+# finished phases per phase kind, encoder, tier and resolution class, and persisted between sessions.
+# Speeds are stored as "solo" figures (the machine working on that one task): a phase measured while
+# n encodes shared the cores counts n times faster, so the batch ETA is simply the remaining solo work.
+
+STATS_FILE = "speed_stats.json"
+EMA_WEIGHT = 0.3 # Weight of a new measurement in the running average
+MIN_SAMPLE_SECONDS = 2 # Shorter phases are mostly process startup, not worth learning from
+# Resolution classes, measured speeds are scaled to the class' pixel count
+RESOLUTIONS = [("360p", 640 * 360), ("480p", 854 * 480), ("720p", 1280 * 720), ("1080p", 1920 * 1080),
+               ("1440p", 2560 * 1440), ("2160p", 3840 * 2160)]
+
+def resolution_class(pixels):
+    """ (name, pixels) of the resolution class nearest to a frame size """
+    if pixels <= 0:
+        return "1080p", 1920 * 1080
+    return min(RESOLUTIONS, key=lambda r: abs(r[1] - pixels))
+
+class SpeedStats:
+    """ Learned solo speeds (media seconds per wall second), keyed "kind:...:resolution class" """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats_path = os.path.join(get_data_dir(), STATS_FILE)
+        self.speeds = {}
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                self.speeds.update(json.load(f).get("speeds", {}))
+        except (OSError, ValueError):
+            pass
+
+    def speed(self, key, pixels, default):
+        """ Expected speed at this frame size, default until the key has been measured """
+        name, class_pixels = resolution_class(pixels)
+        with self.lock:
+            learned = self.speeds.get(f"{key}:{name}")
+        if not learned:
+            return default
+        return learned * class_pixels / pixels if pixels else learned
+
+    def record(self, key, pixels, speed):
+        name, class_pixels = resolution_class(pixels)
+        normalized = speed * pixels / class_pixels if pixels else speed
+        with self.lock:
+            full_key = f"{key}:{name}"
+            old = self.speeds.get(full_key)
+            self.speeds[full_key] = normalized if old is None else old * (1 - EMA_WEIGHT) + normalized * EMA_WEIGHT
+            try:
+                with open(self.stats_path, 'w', encoding='utf-8') as f:
+                    json.dump({"speeds": self.speeds}, f, indent=2)
+            except OSError as e:
+                print(f"Error saving speed stats: {e}")
+
+class Phase:
+    """ One ffmpeg run of a task. shared: the phase competes with the other encodes for the cores
+    (multithreaded encodes), its measured speed is scaled by how many ran at once. """
+    def __init__(self, name, key, media_seconds, speed, shared=True):
+        self.name = name
+        self.key = key
+        self.media_seconds = media_seconds
+        self.speed = max(speed, 0.01)
+        self.shared = shared
+        self.done = 0 # Media seconds processed
+        self.finished = False
+
+    def cost(self):
+        """ Expected solo wall seconds for the whole phase """
+        return self.media_seconds / self.speed
+
+class TaskProgress:
+    """ Progress of one task over its phases. Updated from the worker thread, read from the GUI thread. """
+    def __init__(self, stats, phases, pixels, load=None):
+        self.stats = stats
+        self.phases = phases
+        self.pixels = pixels
+        self.load = load or (lambda: 1) # Number of encodes currently sharing the cores
+        self.current = None
+        self.started = 0
+        self.paused_at = 0
+        self.paused_total = 0
+        self.live_speed = 0 # ffmpeg's speed=...x of the running phase
+        self.load_sum = 0
+        self.load_samples = 0
+
+    def phase(self, name):
+        return next((p for p in self.phases if p.name == name), None)
+
+    def start(self, name):
+        """ Phase name starts running; earlier phases count as done (a shared analysis another
+        variant already ran never starts here) """
+        for p in self.phases:
+            if p.name == name:
+                break
+            p.finished = True
+        self.current = self.phase(name)
+        self.started = time.monotonic()
+        self.paused_at = 0
+        self.paused_total = 0
+        self.live_speed = 0
+        self.load_sum = 0
+        self.load_samples = 0
+
+    def update(self, media_time, live_speed=0):
+        phase = self.current
+        if phase is None:
+            return
+        phase.done = min(media_time, phase.media_seconds)
+        self.live_speed = live_speed
+        self.load_sum += max(1, self.load())
+        self.load_samples += 1
+
+    def finish(self, success):
+        """ End the current phase; a successful run teaches the speed stats """
+        phase = self.current
+        self.current = None
+        if phase is None or not success:
+            return
+        phase.finished = True
+        phase.done = phase.media_seconds
+        wall = time.monotonic() - self.started - self.paused_total
+        if wall < MIN_SAMPLE_SECONDS or phase.media_seconds <= 0:
+            return
+        speed = phase.media_seconds / wall
+        if phase.shared and self.load_samples:
+            speed *= self.load_sum / self.load_samples
+        self.stats.record(phase.key, self.pixels, speed)
+
+    def pause(self):
+        if not self.paused_at:
+            self.paused_at = time.monotonic()
+
+    def resume(self):
+        if self.paused_at:
+            self.paused_total += time.monotonic() - self.paused_at
+            self.paused_at = 0
+
+    def fraction(self, phase):
+        if phase.finished:
+            return 1
+        return phase.done / phase.media_seconds if phase.media_seconds > 0 else 0
+
+    def percent(self):
+        """ Whole-task progress, phases weighted by their expected cost """
+        total = sum(p.cost() for p in self.phases)
+        if total <= 0:
+            return 0
+        return int(100 * sum(p.cost() * self.fraction(p) for p in self.phases) / total)
+
+    def remaining(self):
+        """ Solo wall seconds of work left: {"shared": encodes, "single": single-thread analysis} """
+        left = {"shared": 0, "single": 0}
+        for p in self.phases:
+            left["shared" if p.shared else "single"] += p.cost() * (1 - self.fraction(p))
+        return left
+
+    def eta(self):
+        """ Wall seconds until this task is done at the current pace, 0 when unknown """
+        phase = self.current
+        if phase is None:
+            return 0
+        load = max(1, self.load())
+        seconds = 0
+        for p in self.phases:
+            if p.finished:
+                continue
+            if p is phase and self.live_speed > 0:
+                seconds += (p.media_seconds - p.done) / self.live_speed
+            else:
+                seconds += p.cost() * (1 - self.fraction(p)) * (load if p.shared else 1)
+        return seconds
+
+def format_eta(seconds):
+    if seconds < 60:
+        return "不到 1 分钟"
+    if seconds < 3600:
+        return f"约 {seconds / 60:.0f} 分钟"
+    return f"约 {int(seconds // 3600)} 小时 {int(seconds % 3600 // 60)} 分钟"
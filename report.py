@@ -0,0 +1,145 @@
+import os
+import csv
+import json
+import html
+import time
+
+# Batch report: one record per TranscodeTask with sizes, timings and resource use, exported as
+# JSON (with a batch summary), CSV (opens in Excel) or HTML. Used to compare quality tiers, encoders
+# and machines, and to size future batches.
+
+# (key, label) in report column order
+COLUMNS = [
+    ("source", "源文件"),
+    ("output", "输出文件"),
+    ("format", "格式"),
+    ("quality", "质量"),
+    ("encoder", "编码器"),
+    ("status", "状态"),
+    ("source_size", "源大小 (字节)"),
+    ("output_size", "输出大小 (字节)"),
+    ("compression_ratio", "压缩比"),
+    ("media_seconds", "媒体时长 (秒)"),
+    ("wall_seconds", "总耗时 (秒)"),
+    ("cpu_seconds", "CPU 时间 (秒)"),
+    ("avg_fps", "平均 fps"),
+    ("speed", "速度 (倍速)"),
+    ("peak_memory_mb", "峰值内存 (MB)"),
+    ("probe_seconds", "探测 (秒)"),
+    ("analyze_seconds", "增稳分析 (秒)"),
+    ("encode_seconds", "编码 (秒)"),
+    ("move_seconds", "移动 (秒)"),
+    ("verify_seconds", "校验 (秒)"),
+    ("verify_result", "校验结果"),
+    ("error", "错误信息"),
+]
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def task_record(task):
+    """ Report row of one task, numbers rounded for reading """
+    metrics = task.metrics
+    stages = metrics.get("stages", {})
+    # Remux variants copy streams instead of encoding, that stage is their encode time
+    encode_seconds = stages.get("encode", stages.get("remux", 0))
+    source_size = file_size(task.source_path)
+    output_size = file_size(task.output_path)
+    media_seconds = metrics.get("media_seconds", 0)
+    wall = metrics.get("finished", 0) - metrics.get("started", 0)
+    return {
+        "source": task.source_path,
+        "output": task.output_path,
+        "format": task.fmt,
+        "quality": task.quality,
+        "encoder": task.encoder,
+        "status": task.status,
+        "source_size": source_size,
+        "output_size": output_size,
+        "compression_ratio": round(source_size / output_size, 2) if output_size else 0,
+        "media_seconds": round(media_seconds, 2),
+        "wall_seconds": round(max(wall, 0), 2),
+        "cpu_seconds": round(metrics.get("cpu_seconds", 0), 2),
+        "avg_fps": round(metrics.get("frames", 0) / encode_seconds, 1) if encode_seconds else 0,
+        "speed": round(media_seconds / encode_seconds, 2) if encode_seconds else 0,
+        "peak_memory_mb": round(metrics.get("peak_memory", 0) / (1024 * 1024), 1),
+        "probe_seconds": round(metrics.get("probe_seconds", 0), 3),
+        "analyze_seconds": round(stages.get("analyze", 0), 2),
+        "encode_seconds": round(encode_seconds, 2),
+        "move_seconds": round(stages.get("move", 0), 2),
+        "verify_seconds": round(stages.get("verify", 0), 2),
+        "verify_result": task.verify_result,
+        "error": task.error_msg,
+    }
+
+def summarize(tasks, records):
+    """ Batch totals: task count per status, bytes in/out, wall time from first start to last finish """
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    starts = [t.metrics["started"] for t in tasks if t.metrics.get("started")]
+    ends = [t.metrics["finished"] for t in tasks if t.metrics.get("finished")]
+    source_bytes = sum(r["source_size"] for r in {r["source"]: r for r in records}.values()) # Each source once
+    output_bytes = sum(r["output_size"] for r in records)
+    return {
+        "tasks": len(records),
+        "statuses": statuses,
+        "source_bytes": source_bytes,
+        "output_bytes": output_bytes,
+        "wall_seconds": round(max(ends) - min(starts), 2) if starts and ends else 0,
+        "cpu_seconds": round(sum(r["cpu_seconds"] for r in records), 2),
+        "media_seconds": round(sum(r["media_seconds"] for r in records), 2),
+    }
+
+def write_json(path, summary, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"generated": time.strftime("%Y-%m-%d %H:%M:%S"), "summary": summary, "tasks": records},
+                  f, ensure_ascii=False, indent=2)
+
+def write_csv(path, records):
+    # utf-8-sig so Excel detects the encoding of the Chinese paths and statuses
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=[key for key, _ in COLUMNS])
+        writer.writeheader()
+        writer.writerows(records)
+
+def write_html(path, summary, records):
+    status_text = "，".join(f"{status} {count}" for status, count in summary["statuses"].items())
+    lines = [
+        "<!DOCTYPE html>",
+        "<html><head><meta charset=\"utf-8\"><title>转码报告</title>",
+        "<style>body{font-family:sans-serif;font-size:13px} table{border-collapse:collapse}"
+        " th,td{border:1px solid #ccc;padding:3px 6px;text-align:left} th{background:#f0f0f0}"
+        " td.num{text-align:right}</style></head><body>",
+        f"<h2>转码报告 {html.escape(time.strftime('%Y-%m-%d %H:%M:%S'))}</h2>",
+        f"<p>任务 {summary['tasks']} 个（{html.escape(status_text)}）；"
+        f"源文件 {summary['source_bytes'] / (1024 ** 2):.1f} MB，输出 {summary['output_bytes'] / (1024 ** 2):.1f} MB；"
+        f"总耗时 {summary['wall_seconds']:.1f} 秒，CPU 时间 {summary['cpu_seconds']:.1f} 秒</p>",
+        "<table><tr>" + "".join(f"<th>{html.escape(label)}</th>" for _, label in COLUMNS) + "</tr>",
+    ]
+    for record in records:
+        cells = []
+        for key, _ in COLUMNS:
+            value = record[key]
+            css = " class=\"num\"" if isinstance(value, (int, float)) else ""
+            cells.append(f"<td{css}>{html.escape(str(value))}</td>")
+        lines.append("<tr>" + "".join(cells) + "</tr>")
+    lines.append("</table></body></html>")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+
+def export_report(path, tasks):
+    """ Write the report for tasks, format chosen by the file extension (.json/.csv/.html) """
+    records = [task_record(task) for task in tasks]
+    summary = summarize(tasks, records)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        write_csv(path, records)
+    elif ext in (".html", ".htm"):
+        write_html(path, summary, records)
+    else:
+        write_json(path, summary, records)
+    return len(records)
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import VIDEO_EXTENSIONS
+
+# Recursive folder import. Directory listings are latency bound (especially on network shares),
+# so several directories are listed at once; files are reported in batches while the walk goes on.
+
+SCAN_WORKERS = 8
+BATCH_SIZE = 500
+SKIP_DIRS = {"$recycle.bin", "system volume information"}
+
+def scan_dir(path, extensions, min_size, max_size):
+    """ (matching files, subdirectories) of one directory. Directory symlinks aren't followed, so links can't loop. """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith(".") and entry.name.lower() not in SKIP_DIRS:
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(extensions) and entry.is_file():
+                        # On Windows the size comes with the directory listing, no extra stat
+                        size = entry.stat().st_size
+                        if size >= min_size and (not max_size or size <= max_size):
+                            files.append(entry.path)
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"Error scanning {path}: {e}")
+    files.sort()
+    return files, subdirs
+
+def scan_tree(roots, on_batch, extensions=VIDEO_EXTENSIONS, min_size=1, max_size=0, should_stop=None, batch_size=BATCH_SIZE):
+    """ Walk the roots with parallel scandir and call on_batch(paths) every batch_size matching files
+    (and once more for the rest). Empty files are skipped by default, max_size 0 means no limit.
+    should_stop() is polled between directories. Returns the number of files found. """
+    found = 0
+    batch = []
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        pending = {pool.submit(scan_dir, root, extensions, min_size, max_size) for root in roots}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if should_stop and should_stop():
+                for future in pending:
+                    future.cancel()
+                return found
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(pool.submit(scan_dir, subdir, extensions, min_size, max_size))
+                batch += files
+                found += len(files)
+            while len(batch) >= batch_size:
+                on_batch(batch[:batch_size])
+                batch = batch[batch_size:]
+    if batch:
+        on_batch(batch)
+    return found
@@ -0,0 +1,63 @@
+import re
+import struct
+
+PROXY_SHORT_SIDE = 720 # Short side of the analysis proxy
+# Finer motion search on the proxy, it's cheap at low resolution
+PROXY_DETECT_OPTIONS = "shakiness=5:accuracy=15:stepsize=4"
+
+# vid.stab binary .trf ("TRF1", serialize.c): header = accuracy, shakiness, stepsize (int32), contrast
+# threshold (double), then per frame: frame number, motion count (int32) and that many local motions.
+# Fields are written one by one, unpadded, in host byte order (little-endian on the platforms we ship).
+# Checked against files written by the bundled ffmpeg's vid.stab; scale_trf_binary refuses a file
+# that doesn't parse to its exact length rather than guess.
+TRF_HEADER = struct.Struct("<iiid")
+TRF_FRAME = struct.Struct("<ii")
+TRF_MOTION = struct.Struct("<5h2d") # v.x, v.y, field x, y, size, contrast, match
+
+def proxy_scale(width, height, short_side=PROXY_SHORT_SIDE):
+    """ Downscale factor for the analysis proxy, 0 when the source is already small enough.
+    Based on the short side, so it doesn't matter whether the probe reports coded or rotated dimensions. """
+    short = min(width, height)
+    if not short or short <= short_side:
+        return 0
+    return short_side / short
+
+def scale_value(value, factor):
+    return max(-32768, min(32767, int(round(value * factor))))
+
+def scale_trf_binary(data, factor):
+    """ Raises ValueError when data isn't a TRF1 file with the layout above """
+    if not data.startswith(b"TRF1"):
+        raise ValueError(f"unsupported .trf version {data[:4]!r}")
+    out = bytearray(data)
+    pos = 4 + TRF_HEADER.size # "TRF" + version byte
+    while pos + TRF_FRAME.size <= len(out):
+        _, count = TRF_FRAME.unpack_from(out, pos)
+        pos += TRF_FRAME.size
+        if count < 0 or pos + count * TRF_MOTION.size > len(out):
+            raise ValueError(f"unexpected .trf layout at byte {pos}")
+        for _ in range(count):
+            vx, vy, fx, fy, size, contrast, match = TRF_MOTION.unpack_from(out, pos)
+            TRF_MOTION.pack_into(out, pos, *(scale_value(v, factor) for v in (vx, vy, fx, fy, size)), contrast, match)
+            pos += TRF_MOTION.size
+    if pos != len(out):
+        raise ValueError(f"unexpected .trf layout, {len(out) - pos} trailing bytes")
+    return bytes(out)
+
+def scale_trf_text(text, factor):
+    # Older vid.stab: "Frame 2 (List 43 [(LM 0 0 81 81 48 0.83 0.029),...])"
+    def repl(m):
+        return "(LM " + " ".join(str(scale_value(int(v), factor)) for v in m.groups())
+    return re.sub(r"\(LM (-?\d+) (-?\d+) (-?\d+) (-?\d+) (-?\d+)", repl, text)
+
+def scale_trf(src, dst, factor):
+    """ Rescale the local motions in a .trf analysed on a proxy (factor = full size / proxy size),
+    so vidstabtransform can apply it to full-resolution frames """
+    with open(src, 'rb') as f:
+        data = f.read()
+    if data.startswith(b"TRF"):
+        data = scale_trf_binary(data, factor)
+    else:
+        data = scale_trf_text(data.decode('ascii', errors='replace'), factor).encode('ascii')
+    with open(dst, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,115 @@
+import os
+import gzip
+import threading
+from collections import deque
+from utils import get_data_dir
+
+# Per-task ffmpeg logs. The worker writes every output line into a gzip file under the data dir and keeps
+# the last lines in a small ring buffer for the failure message; the GUI only reads a log when asked to.
+# Files are capped in size and the oldest ones are pruned, so long batches don't fill the disk.
+
+LOG_DIR = "logs"
+TAIL_LINES = 200 # Lines kept in memory per task
+FAILURE_LINES = 8 # Lines attached to a failed task's error message
+MAX_LOG_BYTES = 8 * 1024 * 1024 # Uncompressed bytes written per task, the rest only passes through the ring buffer
+MAX_LOG_FILES = 200 # Newest task logs kept on disk
+
+def log_dir():
+    path = os.path.join(get_data_dir(), LOG_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def log_path(task_id):
+    return os.path.join(log_dir(), f"{task_id}.log.gz")
+
+def is_stats_line(line):
+    return line.startswith(("frame=", "size="))
+
+def prune_logs(keep=MAX_LOG_FILES):
+    """ Delete all but the newest task logs """
+    try:
+        entries = [e for e in os.scandir(log_dir()) if e.name.endswith(".log.gz")]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[keep:]:
+            os.remove(entry.path)
+    except OSError as e:
+        print(f"Error pruning task logs: {e}")
+
+def read_log(task_id):
+    """ Text of a task's log file, "" when there is none. A log still being written reads up to its last flush. """
+    lines = []
+    try:
+        with gzip.open(log_path(task_id), 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                lines.append(line)
+    except (OSError, EOFError):
+        pass # Missing, or the unfinished end of a running task's stream
+    return "".join(lines)
+
+class TaskLog:
+    """ ffmpeg output of one task: everything (up to MAX_LOG_BYTES) in its gzip file, the last
+    TAIL_LINES in memory. Consecutive progress stats lines collapse into one in the ring buffer,
+    so the lines before a failure aren't pushed out by them. """
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.tail = deque(maxlen=TAIL_LINES)
+        self.lock = threading.Lock()
+        self.file = None
+        self.written = 0
+        self.truncated = False
+
+    def begin(self, phase, cmd):
+        """ Open the file for one ffmpeg run (appended as another gzip member) """
+        with self.lock:
+            try:
+                self.file = gzip.open(log_path(self.task_id), 'at', encoding='utf-8')
+            except OSError as e:
+                print(f"Error opening task log: {e}")
+                self.file = None
+            self.write_file(f"=== {phase}: {' '.join(cmd)}\n")
+
+    def write(self, line):
+        with self.lock:
+            if self.tail and is_stats_line(line) and is_stats_line(self.tail[-1]):
+                self.tail[-1] = line
+            else:
+                self.tail.append(line)
+            self.write_file(line + "\n")
+
+    def write_file(self, text):
+        if self.file is None or self.truncated:
+            return
+        if self.written + len(text) > MAX_LOG_BYTES:
+            text = "... (日志过长，后续内容未保存)\n"
+            self.truncated = True
+        try:
+            self.file.write(text)
+            self.written += len(text)
+        except OSError as e:
+            print(f"Error writing task log: {e}")
+            self.file = None
+
+    def end(self, returncode):
+        with self.lock:
+            self.write_file(f"=== exit code {returncode}\n")
+            if self.file is not None:
+                try:
+                    self.file.close()
+                except OSError:
+                    pass
+                self.file = None
+
+    def flush(self):
+        """ Make what was written so far readable by read_log (called from the GUI thread) """
+        with self.lock:
+            if self.file is not None:
+                try:
+                    self.file.flush()
+                except OSError:
+                    pass
+
+    def last_lines(self, n=FAILURE_LINES):
+        """ The last n meaningful lines (progress stats left out) """
+        with self.lock:
+            lines = [line for line in self.tail if line and not is_stats_line(line)]
+        return lines[-n:]
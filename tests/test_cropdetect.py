@@ -0,0 +1,71 @@
+import pytest
+
+import cropdetect
+from cropdetect import sample_times, sampled_seconds, detect_cmd, parse_crop, SAMPLES, SAMPLE_SECONDS
+
+@pytest.fixture(autouse=True)
+def ffmpeg_path(monkeypatch):
+    monkeypatch.setattr(cropdetect, "get_ffmpeg_path", lambda: "ffmpeg")
+
+def input_args(cmd):
+    """ Options before each -i, one list per input """
+    inputs, current = [], []
+    args = iter(cmd[2:cmd.index("-filter_complex")])
+    for arg in args:
+        if arg == "-i":
+            next(args)
+            inputs.append(current)
+            current = []
+        else:
+            current.append(arg)
+    return inputs
+
+@pytest.mark.parametrize("duration", [0, 5, 12])
+def test_sample_times_short(duration):
+    assert sample_times(duration) == [0]
+
+def test_sample_times_spread():
+    times = sample_times(60)
+    assert len(times) == SAMPLES
+    assert times[0] == pytest.approx(5 - SAMPLE_SECONDS / 2)
+    assert times[-1] == pytest.approx(55 - SAMPLE_SECONDS / 2)
+    assert all(0 <= t and t + SAMPLE_SECONDS <= 60 for t in times)
+
+@pytest.mark.parametrize("duration, seconds", [(60, SAMPLES * SAMPLE_SECONDS), (10, 10), (0, SAMPLES * SAMPLE_SECONDS)])
+def test_sampled_seconds(duration, seconds):
+    assert sampled_seconds(duration) == seconds
+
+def test_detect_cmd_samples():
+    cmd = detect_cmd("in.mp4", 60)
+    inputs = input_args(cmd)
+    assert len(inputs) == SAMPLES
+    assert inputs[0] == ["-noautorotate", "-ss", "4.500", "-t", "1"]
+    assert f"concat=n={SAMPLES}:v=1:a=0,cropdetect=" in cmd[cmd.index("-filter_complex") + 1]
+
+def test_detect_cmd_short_file_read_whole():
+    # A 10 s file is analysed to the end, not just its first 6 s
+    assert input_args(detect_cmd("in.mp4", 10)) == [["-noautorotate"]]
+
+def test_detect_cmd_unknown_duration():
+    assert input_args(detect_cmd("in.mp4", 0)) == [["-noautorotate", "-t", "6"]]
+
+def cropdetect_lines(*crops):
+    return [f"[Parsed_cropdetect_1 @ 0x1] x1:0 x2:1919 y1:140 y2:939 w:{w} h:{h} x:{x} y:{y} pts:1 t:0.04 limit:0.094 crop={w}:{h}:{x}:{y}"
+            for w, h, x, y in crops]
+
+def test_parse_crop_last_line_wins():
+    lines = cropdetect_lines((1920, 1040, 0, 20), (1920, 800, 0, 140)) + ["frame=  150 fps=0.0 q=-0.0 Lsize=N/A"]
+    assert parse_crop(lines, 1920, 1080) == (1920, 800, 0, 140)
+
+@pytest.mark.parametrize("crop", [
+    (1920, 1072, 0, 4), # Saves under MIN_SAVING
+    (640, 360, 640, 360), # Keeps under MIN_KEEP, dark footage
+    (-1904, -1056, 1912, 1068), # All black samples
+    (1920, 800, 0, 300), # Outside the frame
+])
+def test_parse_crop_rejected(crop):
+    assert parse_crop(cropdetect_lines(crop), 1920, 1080) is None
+
+def test_parse_crop_no_output():
+    assert parse_crop(["Stream #0:0: Video: h264"], 1920, 1080) is None
+    assert parse_crop(cropdetect_lines((1920, 800, 0, 140)), 0, 0) is None
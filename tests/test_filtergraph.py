@@ -0,0 +1,109 @@
+import pytest
+
+import filtergraph
+from filtergraph import encode_filters, stabilize_detect_filters, rotation_op, rotation_input_args, rotation_output_args, filtered_size, to_vf
+
+TRF = "C:\\work\\clip_stab.trf"
+TRF_ESCAPED = "'C\\:/work/clip_stab.trf'"
+
+# (manual rotation id, source rotation in clockwise degrees) -> rotation id of the folded op
+@pytest.mark.parametrize("rotation, source_rotation, expected", [
+    (0, 0, 0), (0, 90, 0), (0, 180, 0), (0, 270, 0), # Auto: the display matrix is kept, no pixel op
+    (1, 0, 1), (2, 0, 2), (3, 0, 3),
+    (1, 90, 0), (2, 90, 3), (3, 90, 1),
+    (1, 180, 2), (2, 180, 1), (3, 180, 0),
+    (1, 270, 3), (2, 270, 0), (3, 270, 2),
+])
+def test_rotation_op(rotation, source_rotation, expected):
+    assert rotation_op(rotation, source_rotation) == expected
+
+@pytest.mark.parametrize("rotation, source_rotation, expected", [
+    (0, 0, []),
+    (2, 0, []),
+    (0, 90, ["-noautorotate"]),
+    (1, 90, ["-display_rotation", "0"]),
+    (3, 270, ["-display_rotation", "0"]),
+])
+def test_rotation_input_args(rotation, source_rotation, expected):
+    assert rotation_input_args(rotation, source_rotation) == expected
+
+@pytest.mark.parametrize("rotation, source_rotation, input_args, output_args", [
+    (0, 0, [], []),
+    (0, 90, ["-noautorotate"], []),
+    (2, 0, [], []),
+    (2, 90, ["-noautorotate"], ["-metadata:s:v:0", "rotate=0"]),
+])
+def test_rotation_args_without_display_rotation(rotation, source_rotation, input_args, output_args):
+    # Binaries older than FFmpeg 6.1: the matrix is cleared through the output's rotate tag
+    assert rotation_input_args(rotation, source_rotation, display_rotation=False) == input_args
+    assert rotation_output_args(rotation, source_rotation, display_rotation=False) == output_args
+    assert rotation_output_args(rotation, source_rotation) == []
+
+@pytest.mark.parametrize("rotation, expected", [
+    (0, []),
+    (1, ["transpose=2"]),
+    (2, ["transpose=1"]),
+    (3, ["hflip", "vflip"]),
+])
+def test_encode_rotation(rotation, expected):
+    assert encode_filters(rotation) == expected
+
+def test_encode_folds_source_rotation():
+    # Phone clip stored landscape, playing 90° clockwise: turning it right plays it upside down
+    assert encode_filters(2, source_rotation=90) == ["hflip", "vflip"]
+    assert encode_filters(1, source_rotation=90) == []
+    assert encode_filters(0, source_rotation=90) == []
+
+def test_encode_crop():
+    assert encode_filters(crop=(1280, 540, 0, 90)) == ["crop=1280:540:0:90"]
+
+def test_encode_scale():
+    assert encode_filters(max_height=720) == ["scale='trunc(oh*dar/2+0.5)*2':'min(ih,720)'", "setsar=1"]
+    # Plays turned 90°: the output height is the stored width
+    assert encode_filters(2, max_height=720) == ["scale='min(iw,720)':'trunc(ow/dar/2+0.5)*2'", "setsar=1", "transpose=1"]
+    assert encode_filters(0, max_height=720, source_rotation=270) == ["scale='min(iw,720)':'trunc(ow/dar/2+0.5)*2'", "setsar=1"]
+
+def test_encode_stabilization():
+    assert encode_filters(stabilization=15, trf_path=TRF) == [f"vidstabtransform=input={TRF_ESCAPED}:smoothing=15"]
+
+def test_encode_order():
+    # Crop and downscale first, then stabilization, rotation last
+    assert encode_filters(3, 10, TRF, 1080, crop=(1920, 800, 0, 140)) == [
+        "crop=1920:800:0:140",
+        "scale='trunc(oh*dar/2+0.5)*2':'min(ih,1080)'", "setsar=1",
+        f"vidstabtransform=input={TRF_ESCAPED}:smoothing=10",
+        "hflip",
+        "vflip",
+    ]
+
+def test_stabilize_detect():
+    assert stabilize_detect_filters(TRF) == [f"vidstabdetect=result={TRF_ESCAPED}"]
+
+def test_stabilize_detect_proxy():
+    assert stabilize_detect_filters(TRF, proxy_scale=0.5) == [
+        "scale=trunc(iw*0.500000/2)*2:trunc(ih*0.500000/2)*2",
+        f"vidstabdetect={filtergraph.PROXY_DETECT_OPTIONS}:result={TRF_ESCAPED}",
+    ]
+
+def test_stabilize_detect_matches_encode_pre_filters():
+    # The analysis sees the frames the encode transforms, the rotation comes after both
+    detect = stabilize_detect_filters(TRF, 720, 1, crop=(1280, 540, 0, 90))
+    encode = encode_filters(1, 5, TRF, 720, crop=(1280, 540, 0, 90))
+    assert detect[:3] == encode[:3] == ["crop=1280:540:0:90", "scale='min(iw,720)':'trunc(ow/dar/2+0.5)*2'", "setsar=1"]
+    assert encode[-1] == "transpose=2"
+
+@pytest.mark.parametrize("args, expected", [
+    ((1920, 1080), (1920, 1080)),
+    ((1920, 1080, None, 720), (1280, 720)),
+    ((1280, 720, None, 1080), (1280, 720)), # Never upscaled
+    ((1920, 1080, (1920, 800, 0, 140)), (1920, 800)),
+    ((1280, 720, (1280, 540, 0, 90), 480), (1138, 480)),
+    ((1920, 1080, None, 480, 90), (480, 270)),
+    ((1920, 1080, None, 720, 90), (720, 406)), # 405 rounds up to even, like the scale expression
+])
+def test_filtered_size(args, expected):
+    assert filtered_size(*args) == expected
+
+def test_to_vf():
+    assert to_vf([]) == []
+    assert to_vf(["hflip", "vflip"]) == ["-vf", "hflip,vflip"]
@@ -0,0 +1,118 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import forecast
+from forecast import SizeForecaster, DEFAULT_BPP, AUDIO_KBPS, SAFETY_MARGIN, bpp_key, kept_duration, volume_dir
+
+def make_task(quality="balanced", encoder="x264", **kw):
+    task = dict(source_path="in.mp4", output_path="out/in.mp4", quality=quality, encoder=encoder,
+                target_size_mb=0, trim_start="", trim_end="", rotation=0, auto_crop=False, max_height=0)
+    task.update(kw)
+    return SimpleNamespace(**task)
+
+def media_info(duration=100.0, width=1280, height=720, fps=25.0, has_audio=True, bitrate=0):
+    return {"duration": duration, "width": width, "height": height, "fps": fps,
+            "has_audio": has_audio, "bitrate": bitrate, "rotation": 0}
+
+@pytest.fixture
+def forecaster(monkeypatch, tmp_path):
+    """ A forecaster with its stats in a temporary data dir """
+    monkeypatch.setattr(forecast, "get_data_dir", lambda: str(tmp_path))
+    return SizeForecaster()
+
+def video_bytes(bpp, info, duration=None):
+    duration = info["duration"] if duration is None else duration
+    return bpp * info["width"] * info["height"] * info["fps"] * duration / 8
+
+def test_estimate_from_bpp(forecaster):
+    info = media_info()
+    expected = video_bytes(DEFAULT_BPP["balanced"], info) + AUDIO_KBPS * 1000 * 100 / 8
+    assert forecaster.estimate(make_task(), info) == int(expected)
+
+def test_estimate_without_audio(forecaster):
+    info = media_info(has_audio=False)
+    assert forecaster.estimate(make_task("hd"), info) == int(video_bytes(DEFAULT_BPP["hd"], info))
+
+def test_estimate_trimmed(forecaster):
+    info = media_info(has_audio=False)
+    task = make_task(trim_start="10", trim_end="30")
+    assert forecaster.estimate(task, info) == int(video_bytes(DEFAULT_BPP["balanced"], info, 60))
+
+def test_estimate_capped_height(forecaster):
+    info = media_info(width=1920, height=1080, has_audio=False)
+    scaled = dict(info, width=1280, height=720)
+    assert forecaster.estimate(make_task(max_height=720), info) == int(video_bytes(DEFAULT_BPP["balanced"], scaled))
+
+def test_estimate_target_size(forecaster):
+    assert forecaster.estimate(make_task(target_size_mb=50), media_info()) == 50 * 1024 * 1024
+
+def test_estimate_unknown_duration(forecaster):
+    assert forecaster.estimate(make_task(), media_info(duration=0)) == 0
+
+def test_estimate_falls_back_to_source_bitrate(forecaster):
+    info = media_info(width=0, height=0, has_audio=False, bitrate=2000)
+    assert forecaster.estimate(make_task(), info) == 2000 * 1000 * 100 // 8
+
+def test_bpp_key():
+    assert bpp_key(make_task("hd")) == "hd"
+    assert bpp_key(make_task("hd", encoder="x265")) == "x265:hd"
+
+def test_other_encoders_start_from_x264_figures(forecaster):
+    info = media_info()
+    assert forecaster.estimate(make_task("hd", encoder="x265"), info) == forecaster.estimate(make_task("hd"), info)
+
+def test_kept_duration():
+    assert kept_duration(make_task(trim_start="5.5", trim_end="4.5"), 60) == 50
+    assert kept_duration(make_task(trim_start="50", trim_end="20"), 60) == 0
+
+def test_record_running_average(forecaster, monkeypatch, tmp_path):
+    info = media_info(has_audio=False)
+    monkeypatch.setattr(forecast, "probe_media", lambda path: info)
+    output = tmp_path / "out.mp4"
+    measured = 0.2
+    output.write_bytes(b"\0" * int(video_bytes(measured, info)))
+    forecaster.record(make_task("balanced", encoder="x265"), str(output))
+    learned = DEFAULT_BPP["balanced"] * 0.7 + measured * 0.3
+    assert forecaster.bpp["x265:balanced"] == pytest.approx(learned)
+    assert forecaster.bpp["balanced"] == DEFAULT_BPP["balanced"] # x264 figure untouched
+    with open(tmp_path / forecast.STATS_FILE, encoding="utf-8") as f:
+        assert json.load(f)["bpp"]["x265:balanced"] == pytest.approx(learned)
+    assert SizeForecaster().bpp["x265:balanced"] == pytest.approx(learned)
+
+def test_record_skips_target_size(forecaster, monkeypatch, tmp_path):
+    monkeypatch.setattr(forecast, "probe_media", lambda path: media_info())
+    output = tmp_path / "out.mp4"
+    output.write_bytes(b"\0" * 1000)
+    forecaster.record(make_task(target_size_mb=50), str(output))
+    assert forecaster.bpp == DEFAULT_BPP
+
+def test_forecast_sums_per_volume(forecaster, monkeypatch, tmp_path):
+    monkeypatch.setattr(forecast, "probe_media", lambda path: media_info())
+    monkeypatch.setattr(forecast, "get_device_id", lambda path: "C:" if "c_drive" in path else "D:")
+    monkeypatch.setattr(forecast.shutil, "disk_usage", lambda path: SimpleNamespace(free=10 ** 9))
+    (tmp_path / "c_drive").mkdir()
+    (tmp_path / "d_drive").mkdir()
+    tasks = [make_task(output_path=str(tmp_path / "c_drive" / "a.mp4")),
+             make_task(output_path=str(tmp_path / "c_drive" / "b.mp4"), target_size_mb=10),
+             make_task(output_path=str(tmp_path / "d_drive" / "new" / "c.mp4"))]
+    volumes = forecaster.forecast(tasks)
+    assert set(volumes) == {"C:", "D:"}
+    assert volumes["C:"]["tasks"] == 2
+    assert volumes["C:"]["needed"] == tasks[0].estimated_size + 10 * 1024 * 1024
+    assert volumes["D:"]["path"] == str(tmp_path / "d_drive") # Output folder not created yet
+    assert volumes["D:"]["free"] == 10 ** 9
+
+def test_volume_dir(tmp_path):
+    assert volume_dir(str(tmp_path)) == str(tmp_path)
+    assert volume_dir(str(tmp_path / "a" / "b" / "out.mp4")) == str(tmp_path)
+
+@pytest.mark.parametrize("needed, free, fits", [
+    (100, 105, True), # Exactly the 5% margin
+    (100, 104, False),
+    (0, 0, True),
+])
+def test_fits_keeps_safety_margin(needed, free, fits):
+    assert SAFETY_MARGIN == 1.05
+    assert SizeForecaster.fits({"needed": needed, "free": free}) == fits
@@ -0,0 +1,160 @@
+import time
+import threading
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+from jobgraph import JobGraph, Stage, CPU, URGENT, NORMAL, BACKGROUND, DONE, FAILED
+
+@pytest.fixture(scope="module")
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+def wait_until(condition, timeout=5):
+    """ Run the event loop (stage results come back as queued signals) until condition() holds """
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+
+class FakeWork:
+    """ A stage's run function that blocks until released, with the pause/resume hooks a Worker has """
+    created = []
+
+    def __init__(self):
+        FakeWork.created.append(self)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.paused = False
+        self.pauses = 0
+
+    def run(self):
+        self.started.set()
+        return self.release.wait(5)
+
+    def pause(self):
+        self.paused = True
+        self.pauses += 1
+
+    def resume(self):
+        self.paused = False
+
+    def stage(self, can_start=None):
+        return Stage("encode", CPU, self.run, can_start=can_start, pause=self.pause, resume=self.resume)
+
+@pytest.fixture
+def graph(app):
+    graph = JobGraph({CPU: 1})
+    graph.stageDone.connect(graph.dispatch) # As the Scheduler does
+    done = []
+    graph.taskDone.connect(lambda task_id, state, message: done.append((task_id, state)))
+    graph.done = done
+    yield graph
+    graph.cancel_all()
+    # Let blocked runners report back before the graph goes away
+    for work in FakeWork.created:
+        work.release.set()
+    FakeWork.created.clear()
+    for pool in graph.pools.values():
+        pool.waitForDone()
+
+def add(graph, task_id, work, priority=NORMAL, can_start=None):
+    graph.add_task(task_id, [work.stage(can_start)], priority)
+    graph.dispatch()
+
+def test_urgent_preempts_lowest_priority(graph):
+    background, urgent = FakeWork(), FakeWork()
+    add(graph, "background", background, BACKGROUND)
+    assert background.started.wait(5)
+    add(graph, "urgent", urgent, URGENT)
+    assert urgent.started.wait(5) # Runs although the only slot is taken
+    assert background.paused
+
+    urgent.release.set()
+    wait_until(lambda: ("urgent", DONE) in graph.done)
+    assert not background.paused
+    background.release.set()
+    wait_until(lambda: ("background", DONE) in graph.done)
+
+def test_held_urgent_does_not_preempt(graph):
+    background, urgent = FakeWork(), FakeWork()
+    add(graph, "background", background, BACKGROUND)
+    assert background.started.wait(5)
+    # E.g. held for free space that the running task's output still has to leave
+    add(graph, "urgent", urgent, URGENT, can_start=lambda: False)
+    assert background.pauses == 0
+    assert not urgent.started.is_set()
+    background.release.set()
+    wait_until(lambda: ("background", DONE) in graph.done)
+
+def test_victim_resumes_when_next_urgent_is_held(graph):
+    background, first, second = FakeWork(), FakeWork(), FakeWork()
+    space = {"ok": True}
+    add(graph, "background", background, BACKGROUND)
+    assert background.started.wait(5)
+    add(graph, "first", first, URGENT)
+    assert first.started.wait(5)
+    assert background.paused
+
+    # The next urgent task is held by admission: the suspended task gets its slot back instead of
+    # waiting for a stage that may only be admitted once it has finished
+    space["ok"] = False
+    add(graph, "second", second, URGENT, can_start=lambda: space["ok"])
+    first.release.set()
+    wait_until(lambda: ("first", DONE) in graph.done)
+    assert not background.paused
+    assert not second.started.is_set()
+
+    background.release.set()
+    wait_until(lambda: ("background", DONE) in graph.done)
+    space["ok"] = True
+    graph.dispatch()
+    assert second.started.wait(5)
+    second.release.set()
+    wait_until(lambda: ("second", DONE) in graph.done)
+
+def test_fallback_replaces_stage_of_failed_dependency(graph):
+    original = Stage("encode", CPU, lambda: False)
+    graph.add_task("original", [original])
+    fallback = FakeWork()
+    link = Stage("link", CPU, lambda: True, deps=[original], fallback=lambda: [fallback.stage()])
+    verify = Stage("verify", CPU, lambda: True, deps=[link])
+    graph.add_task("copy", [link, verify])
+    graph.dispatch()
+    wait_until(lambda: ("original", FAILED) in graph.done)
+    # The copy encodes by itself instead of failing with the task it was to link to
+    assert fallback.started.wait(5)
+    assert [s.kind for s in graph.stages("copy")] == ["encode", "verify"]
+    assert verify.deps == [graph.stages("copy")[0]]
+    fallback.release.set()
+    wait_until(lambda: ("copy", DONE) in graph.done)
+
+def test_failed_dependency_without_fallback(graph):
+    original = Stage("encode", CPU, lambda: False)
+    graph.add_task("original", [original])
+    graph.add_task("copy", [Stage("remux", CPU, lambda: True, deps=[original])])
+    graph.dispatch()
+    wait_until(lambda: ("copy", FAILED) in graph.done)
+
+def test_stage_finishes_while_paused(graph):
+    work = FakeWork()
+    paused_at_start = []
+    def second():
+        paused_at_start.append(work.paused) # A Worker would start this ffmpeg suspended
+        return True
+    first = work.stage()
+    graph.add_task("task", [first, Stage("verify", CPU, second, deps=[first], pause=work.pause, resume=work.resume)])
+    graph.dispatch()
+    assert work.started.wait(5)
+    graph.pause_all()
+    assert work.paused
+
+    # The run ends anyway (its ffmpeg had just exited), the pause must not carry into the next stage
+    work.release.set()
+    wait_until(lambda: first.state == DONE)
+    assert not work.paused
+    graph.resume_all()
+    graph.dispatch()
+    wait_until(lambda: ("task", DONE) in graph.done)
+    assert paused_at_start == [False]
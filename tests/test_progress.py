@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+import progress
+from progress import resolution_class, SpeedStats, Phase, TaskProgress, format_eta
+
+P1080 = 1920 * 1080
+P720 = 1280 * 720
+
+@pytest.fixture
+def stats(monkeypatch, tmp_path):
+    """ Speed stats persisted in a temporary data dir """
+    monkeypatch.setattr(progress, "get_data_dir", lambda: str(tmp_path))
+    return SpeedStats()
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ A monotonic clock the test advances by hand """
+    now = [1000.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    def advance(seconds):
+        now[0] += seconds
+    return advance
+
+@pytest.mark.parametrize("pixels, name", [
+    (P1080, "1080p"),
+    (1920 * 800, "1080p"), # Letterboxed 1080p is still nearest to 1080p
+    (P720, "720p"),
+    (3840 * 2160, "2160p"),
+    (320 * 240, "360p"),
+    (0, "1080p"), # Unknown size
+])
+def test_resolution_class(pixels, name):
+    assert resolution_class(pixels)[0] == name
+
+def test_speed_default_until_measured(stats):
+    assert stats.speed("encode:x264:2", P1080, 3.0) == 3.0
+
+def test_speed_scaled_to_frame_size(stats):
+    stats.record("encode:x264:2", P1080, 4.0)
+    assert stats.speed("encode:x264:2", P1080, 1.0) == pytest.approx(4.0)
+    # 1920x800 belongs to the 1080p class but has fewer pixels, so it encodes faster
+    assert stats.speed("encode:x264:2", 1920 * 800, 1.0) == pytest.approx(4.0 * 1080 / 800)
+    assert stats.speed("encode:x264:2", P720, 1.0) == 1.0 # Other class, not measured yet
+
+def test_record_running_average(stats):
+    stats.record("encode:x264:2", P1080, 4.0)
+    stats.record("encode:x264:2", P1080, 2.0)
+    assert stats.speed("encode:x264:2", P1080, 1.0) == pytest.approx(4.0 * 0.7 + 2.0 * 0.3)
+
+def test_record_persisted(stats, tmp_path):
+    stats.record("encode:x264:2", P720, 5.0)
+    with open(tmp_path / progress.STATS_FILE, encoding="utf-8") as f:
+        assert json.load(f)["speeds"] == {"encode:x264:2:720p": 5.0}
+    assert SpeedStats().speed("encode:x264:2", P720, 1.0) == pytest.approx(5.0)
+
+def two_phases(load=None, stats=None):
+    """ 60 s of single-thread analysis at 6x (10 s) then 60 s of encode at 2x (30 s) """
+    phases = [Phase("stabilize", "stabilize", 60, 6.0, shared=False), Phase("encode", "encode:x264:2", 60, 2.0)]
+    return TaskProgress(stats, phases, P1080, load)
+
+def test_percent_weighted_by_cost():
+    progress_ = two_phases()
+    assert progress_.percent() == 0
+    progress_.start("stabilize")
+    progress_.update(30)
+    assert progress_.percent() == 12 # 5 of 40 expected seconds
+    progress_.start("encode")
+    progress_.update(30)
+    assert progress_.percent() == 62 # 10 + 15 of 40
+
+def test_start_skips_earlier_phases():
+    progress_ = two_phases()
+    progress_.start("encode") # Another variant already ran the shared analysis
+    assert progress_.phase("stabilize").finished
+    assert progress_.percent() == 25
+
+def test_remaining_split_by_sharing():
+    progress_ = two_phases()
+    progress_.start("stabilize")
+    progress_.update(30)
+    assert progress_.remaining() == {"shared": 30, "single": 5}
+
+def test_eta_scales_shared_work_by_load():
+    progress_ = two_phases(load=lambda: 3)
+    assert progress_.eta() == 0 # Not started
+    progress_.start("stabilize")
+    progress_.update(30)
+    # The analysis runs single-threaded, the encode shares the cores with two others
+    assert progress_.eta() == pytest.approx(5 + 30 * 3)
+
+def test_eta_uses_live_speed():
+    progress_ = two_phases()
+    progress_.start("encode")
+    progress_.update(30, live_speed=3.0)
+    assert progress_.eta() == pytest.approx(10)
+
+def test_finish_records_solo_speed(stats, clock):
+    progress_ = two_phases(load=lambda: 2, stats=stats)
+    progress_.start("encode")
+    clock(20)
+    progress_.update(40)
+    clock(20)
+    progress_.finish(True)
+    # 60 s in 40 s while sharing the cores with another encode: 1.5x, 3x solo
+    assert stats.speed("encode:x264:2", P1080, 1.0) == pytest.approx(3.0)
+    assert progress_.percent() == 100
+
+def test_finish_excludes_paused_time(stats, clock):
+    progress_ = two_phases(stats=stats)
+    progress_.start("encode")
+    clock(10)
+    progress_.pause()
+    clock(100)
+    progress_.resume()
+    clock(10)
+    progress_.finish(True)
+    assert stats.speed("encode:x264:2", P1080, 1.0) == pytest.approx(3.0)
+
+def test_finish_does_not_learn_failures_or_short_runs(stats, clock):
+    progress_ = two_phases(stats=stats)
+    progress_.start("encode")
+    clock(20)
+    progress_.finish(False)
+    progress_.start("encode")
+    clock(1) # Below MIN_SAMPLE_SECONDS
+    progress_.finish(True)
+    assert stats.speed("encode:x264:2", P1080, 1.0) == 1.0
+
+@pytest.mark.parametrize("seconds, text", [
+    (30, "不到 1 分钟"),
+    (600, "约 10 分钟"),
+    (3600 + 25 * 60, "约 1 小时 25 分钟"),
+])
+def test_format_eta(seconds, text):
+    assert format_eta(seconds) == text
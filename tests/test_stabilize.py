@@ -0,0 +1,78 @@
+import pytest
+
+from stabilize import proxy_scale, scale_trf_binary, scale_trf_text, TRF_HEADER, TRF_FRAME, TRF_MOTION
+
+# Start of a .trf written by ffmpeg 7.0's vidstabdetect: header (accuracy 15, shakiness 5, stepsize 6,
+# contrast 0.25), frame 1 without motions, frame 2 cut down to its first motion
+# (v 0,0, field 81,81 size 48, contrast 0.828, match 0.0043)
+REAL_TRF = bytes.fromhex(
+    "545246310f0000000500000006000000000000000000d03f"
+    "0100000000000000"
+    "0200000001000000"
+    "00000000510051003000d33718018882ea3f721cc7711cc7713f")
+
+def motions(data):
+    """ Local motions of a binary .trf, as unpacked tuples """
+    found = []
+    pos = 4 + TRF_HEADER.size
+    while pos < len(data):
+        _, count = TRF_FRAME.unpack_from(data, pos)
+        pos += TRF_FRAME.size
+        for _ in range(count):
+            found.append(TRF_MOTION.unpack_from(data, pos))
+            pos += TRF_MOTION.size
+    return found
+
+def make_trf(frames):
+    data = b"TRF1" + TRF_HEADER.pack(15, 5, 4, 0.25)
+    for number, frame_motions in enumerate(frames, 1):
+        data += TRF_FRAME.pack(number, len(frame_motions))
+        for motion in frame_motions:
+            data += TRF_MOTION.pack(*motion)
+    return data
+
+def test_real_trf_layout():
+    assert TRF_HEADER.unpack_from(REAL_TRF, 4) == (15, 5, 6, 0.25)
+    (motion,) = motions(REAL_TRF)
+    assert motion[:5] == (0, 0, 81, 81, 48)
+    assert motion[5] == pytest.approx(0.828, abs=0.001)
+
+def test_scale_real_trf():
+    scaled = scale_trf_binary(REAL_TRF, 1.5)
+    assert scaled[:4 + TRF_HEADER.size] == REAL_TRF[:4 + TRF_HEADER.size]
+    assert len(scaled) == len(REAL_TRF)
+    (before,), (after,) = motions(REAL_TRF), motions(scaled)
+    assert after[:5] == (0, 0, 122, 122, 72) # 121.5 rounds to even
+    assert after[5:] == before[5:] # Contrast and match aren't distances
+
+def test_scale_binary():
+    data = make_trf([[], [(3, -2, 100, 50, 32, 0.5, 0.1), (-7, 1, 300, 200, 32, 0.9, 0.2)]])
+    assert motions(scale_trf_binary(data, 2)) == [(6, -4, 200, 100, 64, 0.5, 0.1), (-14, 2, 600, 400, 64, 0.9, 0.2)]
+
+def test_scale_binary_clamps():
+    data = make_trf([[(30000, -30000, 1, 1, 1, 0.5, 0.5)]])
+    assert motions(scale_trf_binary(data, 2))[0][:2] == (32767, -32768)
+
+@pytest.mark.parametrize("data", [
+    REAL_TRF[:-1], # Truncated motion
+    REAL_TRF + b"\0", # Trailing bytes
+    b"TRF2" + REAL_TRF[4:], # Unknown version
+])
+def test_scale_binary_rejects_other_layouts(data):
+    with pytest.raises(ValueError):
+        scale_trf_binary(data, 2)
+
+def test_scale_text():
+    text = ("VID.STAB 1\n#      accuracy = 15\nFrame 1 (List 0 [])\n"
+            "Frame 2 (List 2 [(LM 0 -3 81 81 48 0.83 0.029),(LM 5 2 240 81 48 0.5 0.1)])\n")
+    assert scale_trf_text(text, 2) == ("VID.STAB 1\n#      accuracy = 15\nFrame 1 (List 0 [])\n"
+                                       "Frame 2 (List 2 [(LM 0 -6 162 162 96 0.83 0.029),(LM 10 4 480 162 96 0.5 0.1)])\n")
+
+@pytest.mark.parametrize("width, height, expected", [
+    (1920, 1080, 720 / 1080),
+    (1080, 1920, 720 / 1080), # Short side, whatever the orientation
+    (1280, 720, 0),
+    (0, 0, 0),
+])
+def test_proxy_scale(width, height, expected):
+    assert proxy_scale(width, height) == expected
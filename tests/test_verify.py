@@ -0,0 +1,76 @@
+import pytest
+
+import verify
+from verify import duration_matches, check_probe, check_tail, check_decode
+
+def probe_info(duration=60.0, video=1, audio=1):
+    return {"duration": duration, "video_streams": video, "audio_streams": audio}
+
+@pytest.fixture
+def probed(monkeypatch):
+    """ Make check_probe see the given output info instead of running ffmpeg """
+    def use(info):
+        monkeypatch.setattr(verify, "probe_media", lambda path: info)
+    return use
+
+@pytest.mark.parametrize("actual, expected, matches", [
+    (60.0, 60.0, True),
+    (61.0, 60.0, True), # Within 0.5 s + 1% of 60 s
+    (59.0, 60.0, True),
+    (61.2, 60.0, False),
+    (58.8, 60.0, False),
+    (0.2, 0, True), # Unknown source duration
+])
+def test_duration_matches(actual, expected, matches):
+    assert duration_matches(actual, expected) == matches
+
+def test_check_probe_ok(probed):
+    probed(probe_info())
+    assert check_probe("out.mp4", 60.0, probe_info(audio=1)) == ""
+
+@pytest.mark.parametrize("info", [None, probe_info(duration=0)])
+def test_check_probe_unreadable(probed, info):
+    probed(info)
+    assert check_probe("out.mp4", 60.0) == "无法读取输出文件（文件不完整或已损坏）"
+
+def test_check_probe_no_video(probed):
+    probed(probe_info(video=0))
+    assert check_probe("out.mp4", 60.0) == "输出文件缺少视频流"
+
+@pytest.mark.parametrize("source_audio, output_audio, error", [
+    (0, 0, ""),
+    (1, 1, ""),
+    (3, 1, ""), # The encode keeps one track
+    (1, 0, "音频流数量 0，预期 1"),
+    (0, 1, "音频流数量 1，预期 0"),
+])
+def test_check_probe_audio(probed, source_audio, output_audio, error):
+    probed(probe_info(audio=output_audio))
+    assert check_probe("out.mp4", 60.0, probe_info(audio=source_audio)) == error
+
+def test_check_probe_duration(probed):
+    probed(probe_info(duration=42.0))
+    assert check_probe("out.mp4", 60.0) == "输出时长 42.0 秒，预期 60.0 秒"
+
+def test_check_tail():
+    assert check_tail(["frame=   50 fps=0.0 q=-0.0 size=N/A time=00:00:02.00"]) == ""
+    assert check_tail(["frame=    0 fps=0.0 q=-0.0 size=N/A time=00:00:00.00"]) == "文件末尾没有可解码的画面（文件可能被截断）"
+    assert check_tail([]) == "文件末尾没有可解码的画面（文件可能被截断）"
+    assert check_tail(["frame=   50 fps=0.0"], success=False) == "文件末尾没有可解码的画面（文件可能被截断）"
+    assert check_tail(["[h264 @ 0x1] Invalid NAL unit size", "frame=   50 fps=0.0"]) == \
+        "文件末尾无法解码：[h264 @ 0x1] Invalid NAL unit size"
+
+def test_check_decode():
+    stats = "frame= 1500 fps=900 q=-0.0 size=N/A time=00:00:59.96 bitrate=N/A speed=36x"
+    assert check_decode([stats], 60.0) == ""
+    assert check_decode(["frame=  750 fps=900 q=-0.0 size=N/A time=00:00:30.00"], 60.0) == "只能解码到 30.0 秒，预期 60.0 秒"
+    assert check_decode([stats], 60.0, success=False) == "解码校验未完成"
+    assert check_decode(["[aac @ 0x1] Error decoding", stats], 60.0) == "解码错误：[aac @ 0x1] Error decoding"
+    assert check_decode(["frame= 25 time=00:00:01.00"], 0) == "" # Unknown duration
+
+def test_decode_commands(monkeypatch):
+    monkeypatch.setattr(verify, "get_ffmpeg_path", lambda: "ffmpeg")
+    assert verify.tail_cmd("out.mp4") == ["ffmpeg", "-hide_banner", "-v", "error", "-stats",
+                                          "-sseof", "-2", "-i", "out.mp4", "-map", "0:v:0", "-f", "null", "-"]
+    assert verify.decode_cmd("out.mp4") == ["ffmpeg", "-hide_banner", "-v", "error", "-stats",
+                                            "-i", "out.mp4", "-f", "null", "-"]
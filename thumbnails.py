@@ -0,0 +1,131 @@
+import os
+import hashlib
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QObject, Signal
+from utils import get_data_dir, get_ffmpeg_path, probe_media, norm_path
+
+# Thumbnails for the file list. One ffmpeg run per file decodes STRIP_FRAMES keyframes spread over the
+# video (-skip_frame nokey: only keyframes are decoded, so seeking ahead costs almost nothing) and tiles
+# them into one preview strip; the list thumbnail is the strip's first frame. Strips are cached on disk
+# by file fingerprint with LRU eviction, and only rows on screen are requested.
+
+CACHE_DIR = "thumbs"
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+STRIP_FRAMES = 5
+FRAME_HEIGHT = 90 # Pixels, each frame of the strip
+THUMB_WORKERS = 2
+PRUNE_EVERY = 100 # New strips between cache size checks
+
+def cache_dir():
+    path = os.path.join(get_data_dir(), CACHE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def fingerprint(path):
+    """ Cache key: the file's identity and version (path, size, mtime), without reading it """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return hashlib.md5(f"{norm_path(path)}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8')).hexdigest()
+
+def prune_cache(max_bytes=CACHE_MAX_BYTES):
+    """ Drop the least recently used strips until the cache fits max_bytes (hits touch the mtime) """
+    try:
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(cache_dir()) if e.name.endswith(".jpg")]
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def strip_cmd(path, duration, out_path, frames=STRIP_FRAMES):
+    """ One input per frame, each seeked to the middle of its slice of the video. -noaccurate_seek keeps the
+    keyframe the seek lands on; otherwise frames before the position are dropped and, keyframes only,
+    a position after the last keyframe would yield nothing. """
+    if duration <= 0:
+        frames = 1
+    cmd = [get_ffmpeg_path(), "-hide_banner", "-v", "error", "-y"]
+    for i in range(frames):
+        cmd += ["-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{duration * (i + 0.5) / frames:.3f}", "-i", path]
+    scales = "".join(f"[{i}:v:0]scale=-2:{FRAME_HEIGHT},setsar=1,setpts=0[f{i}];" for i in range(frames))
+    if frames > 1:
+        graph = scales + "".join(f"[f{i}]" for i in range(frames)) + f"hstack=inputs={frames}[out]"
+    else:
+        graph = scales.rstrip(";").replace("[f0]", "[out]")
+    return cmd + ["-filter_complex", graph, "-map", "[out]", "-frames:v", "1", "-q:v", "4", out_path]
+
+def make_strip(path):
+    """ Cached preview strip of a video, generated on a miss. Returns (jpg path, frames) or None. """
+    key = fingerprint(path)
+    if key is None:
+        return None
+    info = probe_media(path)
+    duration = info["duration"] if info else 0
+    frames = STRIP_FRAMES if duration > 0 else 1
+    out_path = os.path.join(cache_dir(), f"{key}.jpg")
+    if os.path.exists(out_path):
+        try:
+            os.utime(out_path) # Recently used
+        except OSError:
+            pass
+        return out_path, frames
+    tmp_path = out_path + ".tmp.jpg" # Complete files only, a crash mid-write doesn't leave a bad cache entry
+    result = subprocess.run(strip_cmd(path, duration, tmp_path, frames), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
+    if result.returncode != 0 or not os.path.exists(tmp_path):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return None
+    os.replace(tmp_path, out_path)
+    return out_path, frames
+
+class ThumbnailLoader(QObject):
+    """ Generates strips on a small pool. request() replaces the wanted set, so files scrolled out of
+    view before their turn are skipped instead of queuing up. """
+    ready = Signal(str, str, int) # source path, strip jpg ("" when it can't be made), number of frames in the strip
+
+    def __init__(self):
+        super().__init__()
+        self.pool = ThreadPoolExecutor(max_workers=THUMB_WORKERS)
+        self.lock = threading.Lock()
+        self.wanted = set()
+        self.queued = set()
+        self.made = 0
+        self.pool.submit(prune_cache)
+
+    def request(self, paths):
+        with self.lock:
+            self.wanted = set(paths)
+            new = [p for p in paths if p not in self.queued]
+            self.queued.update(new)
+        for path in new:
+            self.pool.submit(self.load, path)
+
+    def load(self, path):
+        with self.lock:
+            if path not in self.wanted:
+                self.queued.discard(path) # Requested again when it scrolls back into view
+                return
+        try:
+            result = make_strip(path)
+        except Exception as e:
+            print(f"Error making thumbnail for {path}: {e}")
+            result = None
+        with self.lock:
+            self.queued.discard(path)
+            self.made += 1
+            prune = self.made % PRUNE_EVERY == 0
+        if prune:
+            prune_cache()
+        self.ready.emit(path, *(result or ("", 0)))
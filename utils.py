@@ -1,5 +1,6 @@
 import sys
 import os
+import threading
 
 def get_base_path():
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -10,6 +11,22 @@ def get_base_path():
         base_path = os.path.abspath(".")
     return base_path
 
+def get_data_dir():
+    """ Per-user directory for persisted state (stats, caches) """
+    if os.name == 'nt':
+        root = os.environ.get("APPDATA") or os.path.expanduser("~")
+        path = os.path.join(root, "ShenmaConverter")
+    else:
+        path = os.path.join(os.path.expanduser("~"), ".shenma_converter")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".flv")
+
+def norm_path(path):
+    """ Key for comparing paths: absolute, normalized separators, case-folded where the OS ignores case """
+    return os.path.normcase(os.path.abspath(path))
+
 def get_ffmpeg_path():
     """ Get path to ffmpeg executable """
     base_path = get_base_path()
@@ -19,7 +36,146 @@ def get_ffmpeg_path():
     
     if os.path.exists(ffmpeg_path):
         return ffmpeg_path
+
+    # Next to the executable (onedir builds, or an ffmpeg.exe shipped beside a onefile exe)
+    if getattr(sys, 'frozen', False):
+        ffmpeg_path = os.path.join(os.path.dirname(sys.executable), "ffmpeg.exe")
+        if os.path.exists(ffmpeg_path):
+            return ffmpeg_path
     
     # Fallback to system PATH if not found in bundle
     # Just return "ffmpeg" and let subprocess find it in PATH
     return "ffmpeg"
+
+COPY_BUFFER_SIZE = 16 * 1024 * 1024 # Large sequential chunks, network shares hate small writes
+
+def is_same_device(path_a, path_b):
+    """ True when both paths live on the same volume (a rename is enough to move between them) """
+    try:
+        return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+    except OSError:
+        return False
+
+def get_device_id(path):
+    """ Device id of the volume holding path (st_dev), None if it can't be read """
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+def copy_file(src, dst, buffer_size=COPY_BUFFER_SIZE, should_stop=None):
+    """ Large-buffer sequential copy into dst.part, renamed into place once complete, so dst is never
+    left truncated. should_stop() is polled between chunks, returning True aborts the copy.
+    Returns True on success. """
+    part_file = dst + ".part"
+    cancelled = False
+    try:
+        with open(src, 'rb', buffering=0) as fin, open(part_file, 'wb', buffering=0) as fout:
+            buf = bytearray(buffer_size)
+            view = memoryview(buf)
+            while True:
+                if should_stop and should_stop():
+                    cancelled = True
+                    break
+                n = fin.readinto(buf)
+                if not n:
+                    break
+                fout.write(view[:n])
+        if not cancelled:
+            os.replace(part_file, dst)
+    finally:
+        if os.path.exists(part_file):
+            try:
+                os.remove(part_file)
+            except OSError:
+                pass
+    return not cancelled
+
+def move_file(src, dst, buffer_size=COPY_BUFFER_SIZE, should_stop=None):
+    """ Move src to dst. Same volume: plain rename. Otherwise a copy_file, then src is removed.
+    Returns True on success, False when should_stop aborted the copy. """
+    dst_dir = os.path.dirname(dst)
+    os.makedirs(dst_dir, exist_ok=True)
+
+    if is_same_device(src, dst_dir):
+        os.replace(src, dst)
+        return True
+
+    if not copy_file(src, dst, buffer_size, should_stop):
+        return False
+    os.remove(src)
+    return True
+
+_probe_cache = {} # (path, size, mtime) -> probe dict
+_probe_lock = threading.Lock()
+
+def probe_media(path):
+    """ Basic stream info parsed from `ffmpeg -i` (ffprobe may not be bundled).
+    Returns dict with duration (s), bitrate (kbps), width, height (as stored, before any rotation), fps,
+    rotation (clockwise degrees the player turns the video by, from its display matrix or rotate tag),
+    has_audio, the number of video/audio streams and the subtitle codecs; missing values are 0.
+    Results are cached per (path, size, mtime). """
+    import re
+    import subprocess
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_size, st.st_mtime)
+    with _probe_lock:
+        if key in _probe_cache:
+            return _probe_cache[key]
+
+    info = {"duration": 0, "bitrate": 0, "width": 0, "height": 0, "fps": 0, "rotation": 0,
+            "has_audio": False, "video_streams": 0, "audio_streams": 0, "subtitle_codecs": []}
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_path(), "-hide_banner", "-i", path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding='utf-8',
+            errors='replace',
+            creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+        )
+        text = result.stderr or ""
+        # Duration: 00:00:05.12, start: 0.000000, bitrate: 123 kb/s
+        match = re.search(r"Duration:\s+(\d{2}):(\d{2}):(\d{2}\.\d+)", text)
+        if match:
+            hours, minutes, seconds = match.groups()
+            info["duration"] = float(hours) * 3600 + float(minutes) * 60 + float(seconds)
+        match = re.search(r"bitrate:\s+(\d+)\s+kb/s", text)
+        if match:
+            info["bitrate"] = int(match.group(1))
+        for line in text.splitlines():
+            if "Video:" in line:
+                info["video_streams"] += 1
+            elif "Audio:" in line:
+                info["audio_streams"] += 1
+            match = re.search(r"Stream #.*Subtitle:\s+(\w+)", line)
+            if match:
+                info["subtitle_codecs"].append(match.group(1))
+            if "Video:" in line and not info["width"]:
+                match = re.search(r"\s(\d{2,5})x(\d{2,5})[\s,]", line)
+                if match:
+                    info["width"], info["height"] = int(match.group(1)), int(match.group(2))
+                match = re.search(r"([\d.]+)\s+fps", line)
+                if match:
+                    info["fps"] = float(match.group(1))
+            elif "Audio:" in line:
+                info["has_audio"] = True
+        # Side data "displaymatrix: rotation of -90.00 degrees" is counter-clockwise; the old
+        # "rotate : 90" metadata tag is clockwise
+        match = re.search(r"displaymatrix: rotation of (-?[\d.]+) degrees", text)
+        if match:
+            info["rotation"] = round(-float(match.group(1)) / 90) % 4 * 90
+        else:
+            match = re.search(r"^\s*rotate\s*:\s*(-?\d+)", text, re.MULTILINE)
+            if match:
+                info["rotation"] = round(int(match.group(1)) / 90) % 4 * 90
+    except Exception as e:
+        print(f"Error probing {path}: {e}")
+        return info
+
+    with _probe_lock:
+        _probe_cache[key] = info
+    return info
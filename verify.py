@@ -0,0 +1,78 @@
+# Post-encode checks on the finished output. ffmpeg exiting with 0 doesn't prove the file on disk
+# is whole: a disk or network share hiccup can leave it truncated and nobody notices until it's played.
+#   quick: probe the container, compare its duration and streams with what the task should produce,
+#          then decode the last seconds of video (a truncated file has nothing there, whatever its header says)
+#   full (optional): decode every frame to null, any demuxer/decoder error or a short decode fails it
+import re
+from utils import get_ffmpeg_path, probe_media
+
+DURATION_TOLERANCE = 0.5 # Seconds, plus a ratio of the expected duration (audio priming, frame rounding)
+DURATION_TOLERANCE_RATIO = 0.01
+TAIL_SECONDS = 2
+
+def duration_matches(actual, expected):
+    if expected <= 0:
+        return True # Unknown source duration, nothing to compare against
+    return abs(actual - expected) <= DURATION_TOLERANCE + expected * DURATION_TOLERANCE_RATIO
+
+def check_probe(path, expected_duration, source_info=None):
+    """ Quick check of the output container, returns an error message or "" when it looks whole """
+    info = probe_media(path)
+    if not info or not info["duration"]:
+        return "无法读取输出文件（文件不完整或已损坏）"
+    if not info["video_streams"]:
+        return "输出文件缺少视频流"
+    # Without -map ffmpeg keeps one audio stream when the source has any
+    expected_audio = min(source_info["audio_streams"], 1) if source_info else info["audio_streams"]
+    if info["audio_streams"] != expected_audio:
+        return f"音频流数量 {info['audio_streams']}，预期 {expected_audio}"
+    if not duration_matches(info["duration"], expected_duration):
+        return f"输出时长 {info['duration']:.1f} 秒，预期 {expected_duration:.1f} 秒"
+    return ""
+
+def null_decode_cmd(input_args):
+    """ Decode to null. With -v error only problems and the frame=... stats get printed. """
+    return [get_ffmpeg_path(), "-hide_banner", "-v", "error", "-stats"] + input_args + ["-f", "null", "-"]
+
+def tail_cmd(path):
+    return null_decode_cmd(["-sseof", f"-{TAIL_SECONDS}", "-i", path, "-map", "0:v:0"])
+
+def decode_cmd(path):
+    return null_decode_cmd(["-i", path])
+
+def error_lines(lines):
+    return [line for line in lines if line and not line.startswith(("frame=", "size="))]
+
+def last_stat(lines, pattern):
+    """ Last match of pattern in the frame=... stats lines, or None """
+    for line in reversed(lines):
+        match = re.search(pattern, line)
+        if match:
+            return match
+    return None
+
+def check_tail(lines, success=True):
+    """ Result of tail_cmd from its output lines, returns an error message or "" """
+    errors = error_lines(lines)
+    if errors:
+        return f"文件末尾无法解码：{errors[0]}"
+    frames = last_stat(lines, r"frame=\s*(\d+)")
+    if not success or not frames or not int(frames.group(1)):
+        return "文件末尾没有可解码的画面（文件可能被截断）"
+    return ""
+
+def check_decode(lines, expected_duration, success=True):
+    """ Result of decode_cmd from its output lines, returns an error message or "" """
+    errors = error_lines(lines)
+    if errors:
+        return f"解码错误：{errors[0]}"
+    if not success:
+        return "解码校验未完成"
+    match = last_stat(lines, r"time=(\d+):(\d{2}):(\d{2}\.\d+)")
+    decoded = 0
+    if match:
+        hours, minutes, seconds = match.groups()
+        decoded = float(hours) * 3600 + float(minutes) * 60 + float(seconds)
+    if expected_duration > 0 and decoded < expected_duration - DURATION_TOLERANCE - expected_duration * DURATION_TOLERANCE_RATIO:
+        return f"只能解码到 {decoded:.1f} 秒，预期 {expected_duration:.1f} 秒"
+    return ""
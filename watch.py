@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal, Slot
+from utils import get_data_dir, norm_path, VIDEO_EXTENSIONS
+
+# Watch folders: recordings dropped into monitored directories are converted with that folder's preset.
+# QFileSystemWatcher (inotify on Linux, ReadDirectoryChangesW on Windows) triggers a debounced rescan;
+# a polling timer rescans as well, since network shares don't deliver change notifications.
+# A file is picked up once its size and mtime stay unchanged for STABLE_SECONDS and it can be opened,
+# so recordings still being written are left alone.
+
+FOLDERS_FILE = "watch_folders.json"
+SEEN_FILE = "watch_seen.json"
+STABLE_SECONDS = 5
+DEBOUNCE_MS = 1000 # A burst of change notifications (one per written chunk) becomes one rescan
+POLL_INTERVAL_MS = 15000
+
+def load_settings():
+    """ Saved watch folders and whether watching is on:
+    ([{"path": ..., "config": {formats, qualities, rotation, trim_start, trim_end, stabilization}}], enabled) """
+    try:
+        with open(os.path.join(get_data_dir(), FOLDERS_FILE), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        folders = [entry for entry in data.get("folders", []) if entry.get("path") and entry.get("config")]
+        return folders, bool(data.get("enabled")) and bool(folders)
+    except (OSError, ValueError, AttributeError):
+        return [], False
+
+def save_settings(folders, enabled):
+    try:
+        with open(os.path.join(get_data_dir(), FOLDERS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"enabled": enabled, "folders": folders}, f, ensure_ascii=False, indent=1)
+    except OSError as e:
+        print(f"Error saving watch folders: {e}")
+
+def load_seen():
+    try:
+        with open(os.path.join(get_data_dir(), SEEN_FILE), 'r', encoding='utf-8') as f:
+            paths = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    # Forget files that are gone, so the list doesn't grow forever. Only where their folder can be
+    # reached: a share that is offline at startup would otherwise lose its history and be converted again.
+    reachable = {} # folder -> exists, one check per folder (an offline share can take seconds to time out)
+    seen = set()
+    for path in paths:
+        folder = os.path.dirname(path)
+        if folder not in reachable:
+            reachable[folder] = os.path.isdir(folder)
+        if not reachable[folder] or os.path.exists(path):
+            seen.add(path)
+    return seen
+
+def save_seen(seen):
+    try:
+        with open(os.path.join(get_data_dir(), SEEN_FILE), 'w', encoding='utf-8') as f:
+            json.dump(sorted(seen), f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Error saving watch state: {e}")
+
+def skip_existing(folder):
+    """ Mark the videos already in a newly added folder as handled, only later arrivals get converted """
+    save_seen(load_seen() | {norm_path(path) for path, _, _ in scan_folders([folder])})
+
+def can_open(path):
+    # Capture programs on Windows often hold the file exclusively until the recording ends
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+def scan_folders(paths):
+    """ [(path, size, mtime)] of the video files directly inside the given folders """
+    found = []
+    for folder in paths:
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if not entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((entry.path, st.st_size, st.st_mtime))
+        except OSError as e:
+            print(f"Error scanning watch folder {folder}: {e}")
+    return found
+
+class FolderWatcher(QObject):
+    """ Collects stable new files from the watch folders into self.ready as (path, config).
+    Handled files (sources and outputs written into watched folders) are remembered across sessions,
+    so restarting the app neither repeats a conversion nor converts its own outputs. """
+    filesReady = Signal() # New entries in self.ready
+    scanned = Signal(list) # Scan result, from the scan thread back to the GUI thread
+
+    def __init__(self, folders):
+        super().__init__()
+        self.configs = {norm_path(entry["path"]): entry["config"] for entry in folders}
+        self.paths = {norm_path(entry["path"]): entry["path"] for entry in folders}
+        self.candidates = {} # path -> (size, mtime, time it was first seen with that size/mtime)
+        self.ready = deque()
+        self.active = False
+        self.scanning = False
+        self.seen = load_seen()
+
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.schedule_scan)
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.scan)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(POLL_INTERVAL_MS)
+        self.poll_timer.timeout.connect(self.scan)
+        # Look again at files that are still settling once they could be stable
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(STABLE_SECONDS * 1000)
+        self.settle_timer.timeout.connect(self.scan)
+        self.scanned.connect(self.on_scanned)
+
+    def start(self):
+        self.active = True
+        existing = [p for p in self.paths.values() if os.path.isdir(p)]
+        if existing:
+            self.fs_watcher.addPaths(existing)
+        self.poll_timer.start()
+        self.scan()
+
+    def stop(self):
+        self.active = False
+        self.poll_timer.stop()
+        self.debounce_timer.stop()
+        self.settle_timer.stop()
+        dirs = self.fs_watcher.directories()
+        if dirs:
+            self.fs_watcher.removePaths(dirs)
+
+    def ignore(self, paths):
+        """ Never pick up these paths (outputs about to be written, possibly into a watched folder) """
+        self.seen.update(norm_path(path) for path in paths)
+        save_seen(self.seen)
+
+    @Slot()
+    def schedule_scan(self):
+        self.debounce_timer.start()
+
+    @Slot()
+    def scan(self):
+        # scandir on a network share can block for a while, keep it off the GUI thread
+        if not self.active:
+            return
+        if self.scanning:
+            self.schedule_scan()
+            return
+        self.scanning = True
+        folders = list(self.paths.values())
+        threading.Thread(target=lambda: self.scanned.emit(scan_folders(folders)), daemon=True).start()
+
+    @Slot(list)
+    def on_scanned(self, found):
+        self.scanning = False
+        if not self.active:
+            return
+        now = time.time()
+        added = False
+        present = set()
+        for path, size, mtime in sorted(found, key=lambda f: f[2]): # Oldest recordings first
+            key = norm_path(path)
+            if key in self.seen:
+                continue
+            present.add(key)
+            candidate = self.candidates.get(key)
+            if candidate is None or candidate[:2] != (size, mtime):
+                self.candidates[key] = (size, mtime, now) # New or still growing
+                continue
+            if size == 0 or now - candidate[2] < STABLE_SECONDS or not can_open(path):
+                continue
+            del self.candidates[key]
+            self.seen.add(key)
+            self.ready.append((path, self.configs[norm_path(os.path.dirname(path))]))
+            added = True
+
+        # Files removed before they settled
+        for key in list(self.candidates):
+            if key not in present:
+                del self.candidates[key]
+        if self.candidates and not self.settle_timer.isActive():
+            self.settle_timer.start()
+        if added:
+            save_seen(self.seen)
+        if self.ready:
+            # Also re-offered on every scan, in case the queue had no room when they arrived
+            self.filesReady.emit()
@@ -2,19 +2,39 @@ import os
 import subprocess
 import re
 import time
+import hashlib
+import glob
+import shutil
 import psutil
-from utils import get_ffmpeg_path
-from PySide6.QtCore import QObject, QThread, Signal, QRunnable, QThreadPool, QMutex, QMutexLocker
+from utils import get_ffmpeg_path, move_file, copy_file, get_device_id, probe_media, norm_path
+from forecast import volume_dir, format_size, kept_duration, SAFETY_MARGIN
+from encoders import get_profile, REFERENCE_PIXELS
+from progress import SpeedStats, TaskProgress, Phase
+from tasklog import TaskLog, prune_logs
+import filtergraph
+import cropdetect
+from fingerprint import content_fingerprint
+from ffmpeg_caps import get_capabilities, DISPLAY_ROTATION_OPTION
+import stabilize
+import verify
+from PySide6.QtCore import QObject, QThread, Signal, Slot, QMutex, QMutexLocker, QTimer
+from jobgraph import JobGraph, Stage, CPU, IO, SINGLE, LOW, DONE, FAILED, URGENT, NORMAL, BACKGROUND
 
 class TaskStatus:
     WAITING = "等待中"
     RUNNING = "转码中"
+    MOVING = "传输中"
+    VERIFYING = "校验中"
     COMPLETED = "已完成"
+    ANALYZING = "分析中"
     FAILED = "转码失败"
     CANCELLED = "已取消"
 
+# Priority lane names for the GUI
+PRIORITY_NAMES = {URGENT: "紧急", NORMAL: "普通", BACKGROUND: "后台"}
+
 class TranscodeTask:
-    def __init__(self, task_id, source_path, output_path, fmt, quality, rotation, trim_start, trim_end, stabilization, preset, crf):
+    def __init__(self, task_id, source_path, output_path, fmt, quality, rotation, trim_start, trim_end, stabilization, preset, crf, target_size_mb=0, scratch_dir="", video_encoder="libx264", audio_encoder="aac", encoder="x264", stab_proxy=False, verify_decode=False, auto_crop=False, max_height=0, priority=NORMAL):
         self.task_id = task_id
         self.source_path = source_path
         self.output_path = output_path
@@ -24,53 +44,313 @@ class TranscodeTask:
         self.trim_start = trim_start
         self.trim_end = trim_end
         self.stabilization = stabilization # 0-100
+        self.stab_proxy = stab_proxy # Run the motion analysis on a downscaled proxy
         self.preset = preset
         self.crf = crf
+        self.auto_crop = auto_crop # Detect black bars in the analyze stage and crop them before encoding
+        self.max_height = max_height # Output height cap of the tier, 0 = source resolution
+        self.target_size_mb = target_size_mb # > 0 means two-pass target size mode (crf ignored)
+        self.scratch_dir = scratch_dir # Encode on local disk first, then move to output_path
+        self.estimated_size = 0 # Forecast output size in bytes, filled in before scheduling
+        self.encoder = encoder # Key of the encoders.py profile that builds the rate-control arguments
+        self.video_encoder = video_encoder # ffmpeg encoder of that profile, checked against the capability registry
+        self.audio_encoder = audio_encoder
+        self.verify_decode = verify_decode # Also decode the whole output in the verify stage, not just probe it
+        self.verify_result = "" # Outcome of the verify stage, shown with the task status
+        self.priority = priority # Scheduler lane: URGENT / NORMAL / BACKGROUND (jobgraph.py)
         self.status = TaskStatus.WAITING
         self.progress = 0
         self.error_msg = ""
+        # Measurements for the batch report: media_seconds, cpu_seconds, peak_memory, frames, probe_seconds,
+        # stages {kind: wall seconds}, started/finished (time.time() of the first/last stage)
+        self.metrics = {"cpu_seconds": 0, "peak_memory": 0, "frames": 0}
+
+AUDIO_BITRATE_KBPS = 128
+MUXER_OVERHEAD = 0.02 # Reserve ~2% of the target size for container overhead
+MIN_VIDEO_BITRATE_KBPS = 50
+
+IO_HEAVY_SPEED = 3.0 # Expected x realtime at 1080p above which the encoder barely touches the CPU and the source disk is the bottleneck
+IO_HEAVY_READ_RATE = 30 * 1024 * 1024 # Measured bytes/s above which a running task counts as an I/O-heavy reader
+
+# Starting speeds at 1080p (x realtime) for the progress model, until measured
+STAB_DETECT_SPEED = 2.0 # vidstabdetect, single-threaded
+STAB_PROXY_SPEED = 6.0 # vidstabdetect on the downscaled proxy
+STAB_TRANSFORM_FACTOR = 0.8 # Encodes with vidstabtransform run at this fraction of the plain speed
+CROP_DETECT_SPEED = 4.0 # cropdetect over the sampled segments, seeks included
+REMUX_SPEED = 100.0
+
+SUBTITLE_FORMATS = ("mkv",) # Containers the output keeps a subtitle track in
+SUBTITLE_CONVERT = {"mov_text": "ass"} # Subtitle codecs Matroska can't store as they are, the others are copied
+
+def stream_args(info, fmt, av_input=0, subtitle_input=0):
+    """ -map/-c:s args for the streams an output keeps: the main video (no cover art), the first audio track
+    and, in containers that take one, the first subtitle track of the source. Shared by the encode and the
+    remux, so every container variant of a task has the same streams. """
+    args = ["-map", f"{av_input}:V:0", "-map", f"{av_input}:a:0?"]
+    codecs = info["subtitle_codecs"] if info else []
+    if fmt in SUBTITLE_FORMATS and codecs:
+        args += ["-map", f"{subtitle_input}:s:0", "-c:s", SUBTITLE_CONVERT.get(codecs[0], "copy")]
+    return args
+
+def compute_target_bitrate(target_size_mb, duration, audio_kbps=AUDIO_BITRATE_KBPS):
+    """ Video bitrate (kbps) that makes an encode of `duration` seconds land on `target_size_mb` """
+    if duration <= 0:
+        return 0
+    total_kbits = target_size_mb * 8 * 1024 * (1 - MUXER_OVERHEAD)
+    return int(total_kbits / duration - audio_kbps)
+
+class AnalysisEntry:
+    def __init__(self, path):
+        self.path = path
+        self.lock = QMutex() # Held while the analysis pass runs, so variants wait instead of repeating it
+        self.ready = False
+        self.users = 0
+
+class AnalysisCache:
+    """ First-pass artifacts (vidstab .trf, x264 pass logs) shared by every task of the same source.
+    The mp4/mkv variants of a source retain the same key, the first one to run does the analysis,
+    the others reuse it. Files are removed when the last user releases the key. """
+    def __init__(self):
+        self.mutex = QMutex()
+        self.entries = {} # key -> AnalysisEntry
+
+    def retain(self, key, path):
+        with QMutexLocker(self.mutex):
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = AnalysisEntry(path)
+                self.entries[key] = entry
+            entry.users += 1
+            return entry
+
+    def release(self, key):
+        with QMutexLocker(self.mutex):
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry.users -= 1
+            if entry.users > 0:
+                return
+            del self.entries[key]
+        self.remove_files(entry.path)
+
+    def clear(self):
+        with QMutexLocker(self.mutex):
+            entries = list(self.entries.values())
+            self.entries.clear()
+        for entry in entries:
+            self.remove_files(entry.path)
+
+    @staticmethod
+    def remove_files(path):
+        # x264 pass logs are written as <prefix>-0.log and <prefix>-0.log.mbtree
+        for f in glob.glob(glob.escape(path) + "*"):
+            try:
+                os.remove(f)
+            except:
+                pass
+
+def analysis_key(*parts):
+    return hashlib.md5("|".join(str(p) for p in parts).encode('utf-8')).hexdigest()[:16]
 
 class WorkerSignals(QObject):
     progress = Signal(str, int) # task_id, percentage
     status_changed = Signal(str, str) # task_id, new_status
     finished = Signal(str) # task_id
     error = Signal(str, str) # task_id, error_msg
-    log = Signal(str, str) # task_id, log_line
+    preempted = Signal(str, bool) # task_id, True while suspended to let an urgent task run
 
-class Worker(QRunnable):
-    def __init__(self, task, signals):
-        super().__init__()
+class Worker:
+    """ Does the work of one task's stages (analyze, encode, remux, move, verify); the scheduler's
+    JobGraph decides when each of them runs """
+    def __init__(self, task, signals, analysis_cache=None, speed_stats=None, load=None):
         self.task = task
         self.signals = signals
+        self.log = TaskLog(task.task_id) # ffmpeg output, kept in a file and read back on demand
         self.is_cancelled = False
+        self.is_paused = False
         self.process = None
+        self.analysis_cache = analysis_cache if analysis_cache is not None else AnalysisCache()
+        self.profile = get_profile(task.encoder)
+        self.stages = [] # Set by the scheduler
+        self.remux_source = "" # Set when the streams are copied from another task's output instead of encoded
+        self.link_source = "" # Set when an identical copy of the source already produces this exact output
+        self.output_key = None # Content-based key of the output, computed when another source has the same size
+        self.probed_keys = [] # (worker, output key) pairs from the probe stage, registered in the GUI thread
+
+        # Admission info for the scheduler
+        self.source_device = get_device_id(task.source_path)
+        self.predicted_io_heavy = self.profile.expected_speed(task.quality) >= IO_HEAVY_SPEED
+        self.read_rate = 0 # Measured bytes/s read by the current ffmpeg process
+        self.admitted = False
+
+        # With a scratch dir, ffmpeg output and temp files (.trf, pass logs) stay on local disk
+        out_dir = os.path.dirname(task.output_path)
+        work_dir = task.scratch_dir or out_dir
+        if task.scratch_dir:
+            self.encode_path = os.path.join(task.scratch_dir, f"{task.task_id}_{os.path.basename(task.output_path)}")
+        else:
+            self.encode_path = task.output_path
+
+        # Volumes this task writes to: the encode target, plus the destination when moving across volumes
+        encode_device = get_device_id(volume_dir(self.encode_path))
+        self.write_targets = [(encode_device, self.encode_path)]
+        output_device = get_device_id(volume_dir(task.output_path))
+        if task.scratch_dir and output_device != encode_device:
+            self.write_targets.append((output_device, task.output_path + ".part"))
+        self.pending_targets = list(self.write_targets) # Targets whose bytes are still to be written
+
+        self.work_dir = work_dir
+        self.stab_entry = None
+        self.pass_entry = None
+        self.retain_analysis()
+
+        # Everything that determines the encoded video and audio; tasks that only differ in container share it
+        # (the remux adds the subtitles its container keeps from the source)
+        self.stream_key = analysis_key("stream", task.source_path, task.quality, task.rotation, task.trim_start,
+                                       task.trim_end, task.stabilization, task.stab_proxy, task.preset, task.crf,
+                                       task.target_size_mb, task.encoder, task.video_encoder, task.audio_encoder,
+                                       task.auto_crop, task.max_height)
+
+        self.speed_stats = speed_stats if speed_stats is not None else SpeedStats()
+        self.load = load # Callable returning the number of running encodes
+        self.tracker = self.build_progress()
+
+    def remaining_writes(self):
+        """ {device_id: bytes this task is still expected to write there} """
+        remaining = {}
+        for device, path in self.pending_targets:
+            try:
+                written = os.path.getsize(path)
+            except OSError:
+                written = 0
+            remaining[device] = remaining.get(device, 0) + max(self.task.estimated_size - written, 0)
+        return remaining
+
+    def build_progress(self):
+        """ Progress model for the phases this task will run (rebuilt once it becomes a remux variant) """
+        task = self.task
+        probe_start = time.perf_counter()
+        info = probe_media(task.source_path) # A remux source doesn't exist yet, it has the same duration
+        task.metrics["probe_seconds"] = time.perf_counter() - probe_start
+        duration = kept_duration(task, info["duration"]) if info else 0
+        task.metrics["media_seconds"] = duration
+        width, height = self.frame_size(info) if info else (0, 0)
+        pixels = width * height
+        scale = REFERENCE_PIXELS / pixels if pixels else 1
+        stats = self.speed_stats
+        if self.link_source:
+            return TaskProgress(stats, [], pixels, self.load) # A link or file copy, no ffmpeg run to model
+        if self.remux_source:
+            phases = [Phase("remux", "remux", duration, stats.speed("remux", pixels, REMUX_SPEED), shared=False)]
+            return TaskProgress(stats, phases, pixels, self.load)
+
+        phases = []
+        if self.needs_crop():
+            sampled = cropdetect.sampled_seconds(duration) if duration else 0
+            phases.append(Phase("crop", "crop_detect", sampled, stats.speed("crop_detect", pixels, CROP_DETECT_SPEED * scale), shared=False))
+        if self.stab_entry:
+            key = "stab_detect_proxy" if task.stab_proxy else "stab_detect"
+            default = (STAB_PROXY_SPEED if task.stab_proxy else STAB_DETECT_SPEED) * scale
+            phases.append(Phase("analyze", key, duration, stats.speed(key, pixels, default), shared=False))
+        speed = self.profile.expected_speed(task.quality, width, height) if info else 1.0
+        if self.pass_entry:
+            speed *= 2 # expected_speed covers both passes, each pass is timed on its own
+            key = f"{task.encoder}:pass1"
+            phases.append(Phase("pass1", key, duration, stats.speed(key, pixels, speed)))
+        key = f"{task.encoder}:{task.quality}"
+        if task.stabilization > 0:
+            key += ":stab"
+            speed *= STAB_TRANSFORM_FACTOR
+        phases.append(Phase("encode", key, duration, stats.speed(key, pixels, speed)))
+        return TaskProgress(stats, phases, pixels, self.load)
+
+    def finish_writes(self, path=None):
+        """ Stop counting a write target (all of them when path is None): its bytes are on disk, or discarded """
+        self.pending_targets = [t for t in self.pending_targets if path is not None and t[1] != path]
+
+    def make_output_key(self):
+        """ Everything that determines the output file, with the source identified by its content
+        rather than its path; None when the source can't be read """
+        task = self.task
+        fingerprint = content_fingerprint(task.source_path)
+        if fingerprint is None:
+            return None
+        return analysis_key("output", fingerprint, task.fmt, task.quality, task.rotation, task.trim_start, task.trim_end,
+                            task.stabilization, task.stab_proxy, task.preset, task.crf, task.target_size_mb, task.encoder,
+                            task.video_encoder, task.audio_encoder, task.auto_crop, task.max_height)
+
+    def remaining_work(self):
+        """ Solo wall seconds this task still needs, {"shared": encodes, "single": analysis} """
+        if self.task.status not in (TaskStatus.WAITING, TaskStatus.ANALYZING, TaskStatus.RUNNING):
+            return {"shared": 0, "single": 0}
+        return self.tracker.remaining()
+
+    def retain_analysis(self):
+        """ Retain shared first-pass artifacts up front, so a variant that finishes early
+        doesn't delete them while another variant of the same source is still queued """
+        task = self.task
+        if task.stabilization > 0:
+            # Transforms are indexed by frame, so the analysis covers the same trim window as the encode,
+            # and sees the same crop and downscale
+            self.stab_key = analysis_key("stab", task.source_path, task.trim_start, task.trim_end, task.stab_proxy,
+                                         task.auto_crop, task.max_height, task.rotation)
+            self.stab_entry = self.analysis_cache.retain(self.stab_key, os.path.join(self.work_dir, f"{self.stab_key}_stab.trf").replace('\\', '/'))
+        if task.target_size_mb > 0 and self.profile.two_pass:
+            # Everything that changes the video stream, but not the container
+            self.pass_key = analysis_key("pass", task.source_path, task.target_size_mb, task.rotation,
+                                         task.trim_start, task.trim_end, task.stabilization, task.preset, task.encoder,
+                                         task.auto_crop, task.max_height)
+            self.pass_entry = self.analysis_cache.retain(self.pass_key, os.path.join(self.work_dir, f"{self.pass_key}_2pass"))
+
+    def release_analysis(self):
+        if self.stab_entry:
+            self.analysis_cache.release(self.stab_key)
+            self.stab_entry = None
+        if self.pass_entry:
+            self.analysis_cache.release(self.pass_key)
+            self.pass_entry = None
+
+    def run_shared_analysis(self, entry, cmd, phase, progress_phase=None, cwd=None, finish=None):
+        """ Run a first pass once per entry; later variants of the same source reuse its result.
+        finish: optional post-processing of the pass output, run once under the same lock """
+        with QMutexLocker(entry.lock):
+            if entry.ready:
+                return True
+            if not self.run_subprocess(cmd, progress_phase=progress_phase, phase=phase, cwd=cwd):
+                return False
+            if finish:
+                try:
+                    finish()
+                except Exception as e:
+                    print(f"Error finishing {phase}: {e}")
+                    return False
+            entry.ready = True
+            return True
+
+    def source_rotation(self):
+        """ Clockwise rotation in the source's metadata (the probe is cached) """
+        info = probe_media(self.task.source_path)
+        return info["rotation"] if info else 0
+
+    def has_display_rotation(self):
+        """ True when the ffmpeg binary takes -display_rotation (probed once per binary, assumed when unknown) """
+        caps = get_capabilities()
+        return caps is None or caps.has_option(DISPLAY_ROTATION_OPTION)
+
+    def source_crop(self):
+        """ Black bars to crop (w, h, x, y) as found by the analyze stage, None for the whole frame """
+        return cropdetect.cached_crop(self.task.source_path)[1] if self.task.auto_crop else None
+
+    def frame_size(self, info):
+        """ (width, height) the filters and the encoder work on, after the crop and the tier's height cap """
+        turn = filtergraph.output_turn(self.task.rotation, info["rotation"])
+        return filtergraph.filtered_size(info["width"], info["height"], self.source_crop(), self.task.max_height, turn)
 
     def get_duration(self, file_path):
-        """Get video duration in seconds using ffprobe or ffmpeg"""
-        try:
-            # We use ffmpeg -i because we might not have ffprobe, but checking is safer
-            # Actually prompt said "ffmpeg.exe process call", didn't explicitly say ffprobe is there.
-            # We can use ffmpeg -i input.mp4 and parse stderr.
-            cmd = [get_ffmpeg_path(), "-i", file_path]
-            # Fix UnicodeDecodeError by enforcing utf-8 and ignore errors
-            result = subprocess.run(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                encoding='utf-8', 
-                errors='replace',
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
-            )
-            
-            if result.stderr:
-                # Duration: 00:00:05.12, start: ...
-                match = re.search(r"Duration:\s+(\d{2}):(\d{2}):(\d{2}\.\d+)", result.stderr)
-                if match:
-                    hours, minutes, seconds = match.groups()
-                    return float(hours) * 3600 + float(minutes) * 60 + float(seconds)
-        except Exception as e:
-            print(f"Error getting duration: {e}")
-        return 0
+        """Get video duration in seconds (parsed from ffmpeg -i, cached per file)"""
+        info = probe_media(file_path)
+        return info["duration"] if info else 0
 
     def parse_time(self, time_str):
         # time=00:00:05.12
@@ -80,54 +360,10 @@ class Worker(QRunnable):
         except:
             return 0
 
-    def run(self):
-        if self.is_cancelled:
-            return
-
-        self.signals.status_changed.emit(self.task.task_id, TaskStatus.RUNNING)
-        
-        # 0. Prepare
+    def prepare_input(self, decode_video=True):
+        """ Input args for the task's trim window: (input_args, total_duration, output_duration).
+        decode_video=False leaves out the rotation options, for runs that only copy other streams. """
         input_file = self.task.source_path
-        output_file = self.task.output_path
-        
-        # Ensure output dir exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-        # 1. Stabilization (Two pass)
-        trf_file = os.path.join(os.path.dirname(output_file), f"{self.task.task_id}_stab.trf").replace('\\', '/')
-        
-        if self.task.stabilization > 0:
-            # Pass 1
-            # Escape : in path for filter syntax if needed, but usually simple quotes work if no special chars
-            # Windows paths with : (C:/...) might be an issue in filter chain if not escaped correctly
-            # ffmpeg syntax: result='C\:/path/to/file.trf'
-            trf_file_escaped = trf_file.replace(':', '\\:')
-            
-            cmd_pass1 = [
-                get_ffmpeg_path(), "-y", "-i", input_file,
-                "-vf", f"vidstabdetect=result='{trf_file_escaped}'",
-                "-f", "null", "-"
-            ]
-            
-            if not self.run_subprocess(cmd_pass1, parse_progress=True, duration_override=None, phase="Stabilization Analysis"):
-                return # Failed or Cancelled
-
-        # 2. Main Encoding Command Construction
-        # Filters
-        filters = []
-        
-        # Stabilization Transform (if enabled)
-        if self.task.stabilization > 0:
-            trf_file_escaped = trf_file.replace(':', '\\:')
-            filters.append(f"vidstabtransform=input='{trf_file_escaped}':smoothing={self.task.stabilization}")
-
-        # Rotation
-        if self.task.rotation == 1: # Left 90 (Transpose=2)
-            filters.append("transpose=2")
-        elif self.task.rotation == 2: # Right 90 (Transpose=1)
-            filters.append("transpose=1")
-        elif self.task.rotation == 3: # 180
-            filters.append("transpose=2,transpose=2") # Or rotate=PI, but transpose is often faster/simpler for 90/180
 
         # Trim (Use -ss and -to/t input options or filter? -ss before -i is faster)
         # Requirement: "Start X seconds, End Y seconds (from end)". 
@@ -143,58 +379,303 @@ class Worker(QRunnable):
         end_minus = float(self.task.trim_end) if self.task.trim_end else 0
         
         # Construct command
-        cmd = [get_ffmpeg_path(), "-y"] # -y overwrite
+        input_args = []
         
         # Seek (Input seeking is fast)
         if start_time > 0:
-            cmd.extend(["-ss", str(start_time)])
-            
-        cmd.extend(["-i", input_file])
+            input_args.extend(["-ss", str(start_time)])
+
+        # Frames as stored, the filters do any rotation
+        if decode_video:
+            input_args.extend(filtergraph.rotation_input_args(self.task.rotation, self.source_rotation(), self.has_display_rotation()))
+        input_args.extend(["-i", input_file])
         
         # Output duration limit (if trimming end)
+        output_duration = total_duration - start_time if total_duration > 0 else 0
         if end_minus > 0 and total_duration > 0:
             duration_to_keep = total_duration - start_time - end_minus
             if duration_to_keep > 0:
-                cmd.extend(["-t", str(duration_to_keep)])
+                input_args.extend(["-t", str(duration_to_keep)])
+                output_duration = duration_to_keep
+        return input_args, total_duration, output_duration
+
+    def needs_crop(self):
+        """ True while the black-bar detection for this task's source hasn't run (it is cached per file) """
+        return self.task.auto_crop and not cropdetect.cached_crop(self.task.source_path)[0]
+
+    def needs_analysis(self):
+        """ True while the stabilization pass 1 this task depends on hasn't produced its .trf yet """
+        return self.stab_entry is not None and not self.stab_entry.ready
+
+    def analyze(self):
+        """ Analyze stage: black-bar detection and stabilization pass 1 ahead of the encode, on the single-thread pool """
+        if self.is_cancelled:
+            return False
+        if not self.needs_crop() and not self.needs_analysis():
+            return True
+        self.signals.status_changed.emit(self.task.task_id, TaskStatus.ANALYZING)
+        success = self.run_crop_detection() and self.run_stab_analysis()
+        self.read_rate = 0
+        if success:
+            self.signals.status_changed.emit(self.task.task_id, TaskStatus.WAITING)
+        return success
+
+    def run_crop_detection(self):
+        """ cropdetect on sampled segments of the source. A failed detection only loses the saving,
+        the encode then keeps the whole frame. """
+        if not self.needs_crop():
+            return True
+        info = probe_media(self.task.source_path)
+        if not info:
+            return True
+        lines = []
+        success = self.run_subprocess(cropdetect.detect_cmd(self.task.source_path, info["duration"]),
+                                      progress_phase="crop", phase="Crop Detection", output=lines)
+        if self.is_cancelled:
+            return False
+        if success:
+            cropdetect.store_crop(self.task.source_path, cropdetect.parse_crop(lines, info["width"], info["height"]))
+        return True
+
+    def run_stab_analysis(self):
+        """ Stabilization pass 1 (shared per source and trim window), on the same trim window and
+        pre-filters as the encode """
+        if not self.needs_analysis():
+            return True
+        input_args, _, output_duration = self.prepare_input()
+        trf_file = self.stab_entry.path
+        os.makedirs(os.path.dirname(trf_file), exist_ok=True) # Runs before the encode creates the output dir
+
+        # Optional proxy: analyse downscaled frames, then scale the motions back up for the full-size transform
+        scale = 0
+        if self.task.stab_proxy:
+            info = probe_media(self.task.source_path)
+            scale = stabilize.proxy_scale(*self.frame_size(info)) if info else 0
+        detect_trf = trf_file + ".proxy" if scale else trf_file
+        finish = (lambda: stabilize.scale_trf(detect_trf, trf_file, 1 / scale)) if scale else None
+
+        cmd_pass1 = [get_ffmpeg_path(), "-y"] + input_args + \
+            filtergraph.to_vf(filtergraph.stabilize_detect_filters(detect_trf, self.task.max_height, self.task.rotation, scale,
+                                                                   self.source_rotation(), self.source_crop())) + \
+            ["-an", "-f", "null", "-"]
+        
+        if not self.run_shared_analysis(self.stab_entry, cmd_pass1, phase="Stabilization Analysis", progress_phase="analyze", finish=finish):
+            if not self.is_cancelled:
+                self.signals.error.emit(self.task.task_id, self.process_error())
+            return False # Failed or Cancelled
+        return True
+
+    def encode(self):
+        """ Encode stage, returns True on success """
+        if self.is_cancelled:
+            return False
+        try:
+            return self.process_task()
+        finally:
+            self.read_rate = 0
+
+    def process_task(self):
+        self.signals.status_changed.emit(self.task.task_id, TaskStatus.RUNNING)
+        
+        # 0. Prepare
+        output_file = self.encode_path
+        
+        # Ensure output dir exists
+        os.makedirs(os.path.dirname(self.task.output_path), exist_ok=True)
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+        # 1. Trim window
+        input_args, total_duration, output_duration = self.prepare_input()
+
+        # 2. Stabilization (Two pass), normally already done by the analyze stage
+        trf_file = self.stab_entry.path if self.task.stabilization > 0 else ""
+        if self.task.stabilization > 0 and not self.run_stab_analysis():
+            return False
+
+        # 3. Main Encoding Command Construction
+        filters = filtergraph.encode_filters(self.task.rotation, self.task.stabilization, trf_file, self.task.max_height,
+                                             self.source_rotation(), self.source_crop())
+
+        video_args = ["-c:v", self.task.video_encoder]
+        filter_args = filtergraph.to_vf(filters)
+
+        # Target size: derive the bitrate from the probed duration and run a two-pass encode
+        # (single-pass average bitrate for encoders without usable multi-pass)
+        run_cwd = None
+        if self.task.target_size_mb > 0:
+            bitrate = compute_target_bitrate(self.task.target_size_mb, output_duration)
+            if output_duration <= 0:
+                self.signals.error.emit(self.task.task_id, "无法获取视频时长，无法按目标大小计算码率")
+                return False
+            if bitrate < MIN_VIDEO_BITRATE_KBPS:
+                self.signals.error.emit(self.task.task_id, f"目标大小过小，视频码率仅 {bitrate} kbps")
+                return False
+
+            rate_args = self.profile.target_args(bitrate, self.task.preset)
+            if self.profile.two_pass:
+                passlog = self.pass_entry.path
+                run_cwd = os.path.dirname(passlog) or None
+                cmd_pass1 = [get_ffmpeg_path(), "-y"] + input_args + video_args + rate_args + self.profile.pass_args(1, passlog) + filter_args + ["-an", "-f", "null", "-"]
+
+                if not self.run_shared_analysis(self.pass_entry, cmd_pass1, phase="Two-pass Analysis", progress_phase="pass1", cwd=run_cwd):
+                    if not self.is_cancelled:
+                        self.signals.error.emit(self.task.task_id, self.process_error())
+                    return False
+
+                rate_args += self.profile.pass_args(2, passlog)
+        else:
+            rate_args = self.profile.rate_args(self.task.crf, self.task.preset)
+
+        cmd = [get_ffmpeg_path(), "-y"] + input_args # -y overwrite
 
         # Video Codec & Quality
         if self.task.fmt == "mp4":
-            cmd.extend(["-c:v", "libx264", "-c:a", "aac"])
+            cmd.extend(video_args + ["-c:a", self.task.audio_encoder])
         elif self.task.fmt == "mkv":
-            cmd.extend(["-c:v", "libx264", "-c:a", "aac"]) # Or copy if no re-encode needed? Requirement says "compress options", so re-encode.
+            cmd.extend(video_args + ["-c:a", self.task.audio_encoder]) # Or copy if no re-encode needed? Requirement says "compress options", so re-encode.
+
+        if self.task.target_size_mb > 0:
+            cmd.extend(["-b:a", f"{AUDIO_BITRATE_KBPS}k"])
         
-        cmd.extend(["-crf", str(self.task.crf), "-preset", self.task.preset])
+        cmd.extend(rate_args)
+        cmd.extend(stream_args(probe_media(self.task.source_path), self.task.fmt))
+        cmd.extend(self.profile.container_args(self.task.fmt))
 
         # Filters apply
-        if filters:
-            cmd.extend(["-vf", ",".join(filters)])
+        cmd.extend(filter_args)
+        cmd.extend(filtergraph.rotation_output_args(self.task.rotation, self.source_rotation(), self.has_display_rotation()))
         
         cmd.append(output_file)
 
-        # 3. Run Main Encoding
-        success = self.run_subprocess(cmd, parse_progress=True, total_duration=total_duration, phase="Encoding")
-        
-        # Cleanup
-        if self.task.stabilization > 0:
-            if os.path.exists(trf_file):
-                try:
-                    os.remove(trf_file)
-                except:
-                    pass
+        # 4. Run Main Encoding
+        success = self.run_subprocess(cmd, progress_phase="encode", phase="Encoding", cwd=run_cwd)
+        if not success:
+            self.discard_output()
+        return success
 
-        if success:
-            self.signals.finished.emit(self.task.task_id)
-        else:
-            if not self.is_cancelled:
-                self.signals.error.emit(self.task.task_id, "Process failed or returned error")
+    def process_error(self):
+        """ Error message for a failed ffmpeg run, with the last lines it printed """
+        lines = self.log.last_lines()
+        if not lines:
+            return "FFmpeg 处理失败"
+        return "FFmpeg 处理失败：\n" + "\n".join(lines)
+
+    def discard_output(self):
+        if self.task.scratch_dir and os.path.exists(self.encode_path):
+            try:
+                os.remove(self.encode_path)
+            except:
+                pass
+        if not self.is_cancelled:
+            self.signals.error.emit(self.task.task_id, self.process_error())
+
+    def remux(self):
+        """ Remux stage: copy the streams another task already encoded into this task's container """
+        if self.is_cancelled:
+            return False
+        self.signals.status_changed.emit(self.task.task_id, TaskStatus.RUNNING)
+        os.makedirs(os.path.dirname(self.task.output_path), exist_ok=True)
+        os.makedirs(os.path.dirname(self.encode_path), exist_ok=True)
+        cmd = [get_ffmpeg_path(), "-y", "-i", self.remux_source]
+        info = probe_media(self.task.source_path)
+        if self.task.fmt in SUBTITLE_FORMATS and info and info["subtitle_codecs"]:
+            # The other container may not have kept it (mp4 has no subtitle track): take it from the source,
+            # over the same trim window
+            input_args, _, _ = self.prepare_input(decode_video=False)
+            cmd += input_args
+        cmd += ["-c", "copy"] + stream_args(info, self.task.fmt, subtitle_input=1) + \
+            self.profile.container_args(self.task.fmt) + [self.encode_path]
+        success = self.run_subprocess(cmd, progress_phase="remux", phase="Remux")
+        if not success:
+            self.discard_output()
+        return success
+
+    def link_output(self):
+        """ Link stage: the output was already made from an identical copy of the source. Hard link it
+        (same volume, no data written), otherwise copy it into place. """
+        if self.is_cancelled:
+            return False
+        self.signals.status_changed.emit(self.task.task_id, TaskStatus.MOVING)
+        target = self.task.output_path
+        if norm_path(target) == norm_path(self.link_source):
+            return True # Both copies map to the same output name in a custom output dir
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.exists(target):
+                os.remove(target) # Like ffmpeg -y
+            try:
+                os.link(self.link_source, target)
+                return True
+            except OSError:
+                pass # Other volume, or a file system without hard links
+            return copy_file(self.link_source, target, should_stop=self.should_stop)
+        except OSError as e:
+            self.signals.error.emit(self.task.task_id, f"复制重复源的输出失败: {e}")
+            return False
+
+    def should_stop(self):
+        while self.is_paused and not self.is_cancelled:
+            time.sleep(0.2)
+        return self.is_cancelled
+
+    def move(self):
+        """ Move stage: scratch dir -> destination, on the I/O pool """
+        if self.is_cancelled:
+            self.discard_scratch()
+            return False
+        self.signals.status_changed.emit(self.task.task_id, TaskStatus.MOVING)
+        try:
+            if move_file(self.encode_path, self.task.output_path, should_stop=self.should_stop):
+                return True
+        except Exception as e:
+            # Keep the scratch copy, the encode itself succeeded
+            self.signals.error.emit(self.task.task_id, f"移动到输出目录失败: {e}\n暂存文件: {self.encode_path}")
+            return False
+        self.discard_scratch()
+        return False
+
+    def verify_output(self):
+        """ Verify stage: check the output at its destination (after any move) on the low-priority pool.
+        A failed check fails the task; the file is kept for inspection. """
+        if self.is_cancelled:
+            return False
+        self.signals.status_changed.emit(self.task.task_id, TaskStatus.VERIFYING)
+        _, _, expected_duration = self.prepare_input()
+        error = verify.check_probe(self.task.output_path, expected_duration, probe_media(self.task.source_path))
+        if not error:
+            # Full decode covers the tail as well
+            full = self.task.verify_decode
+            lines = []
+            cmd = verify.decode_cmd(self.task.output_path) if full else verify.tail_cmd(self.task.output_path)
+            success = self.run_subprocess(cmd, phase="Verify", low_priority=True, output=lines)
+            if self.is_cancelled:
+                return False
+            error = verify.check_decode(lines, expected_duration, success) if full else verify.check_tail(lines, success)
+
+        if error:
+            self.task.verify_result = f"校验失败：{error}"
+            self.signals.error.emit(self.task.task_id, self.task.verify_result)
+            return False
+        self.task.verify_result = "校验通过（完整解码）" if self.task.verify_decode else "校验通过"
+        return True
 
-    def run_subprocess(self, cmd, parse_progress=False, total_duration=0, duration_override=None, phase=""):
+    def discard_scratch(self):
+        try:
+            os.remove(self.encode_path)
+        except:
+            pass
+
+    def run_subprocess(self, cmd, progress_phase=None, phase="", cwd=None, low_priority=False, output=None):
+        """ progress_phase: phase of self.tracker this run advances (None: no progress reporting).
+        low_priority: run ffmpeg below normal priority so it only takes cores the encodes leave idle.
+        output: optional list collecting the stripped output lines. """
         if self.is_cancelled: return False
         
         # Fix for windows no window
         startupinfo = subprocess.STARTUPINFO()
         startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         
+        self.process = None
         try:
             self.process = subprocess.Popen(
                 cmd, 
@@ -204,31 +685,93 @@ class Worker(QRunnable):
                 encoding='utf-8',
                 errors='replace',
                 startupinfo=startupinfo,
-                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+                creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0,
+                cwd=cwd
             )
             
+            try:
+                ps_process = psutil.Process(self.process.pid)
+                if low_priority:
+                    ps_process.nice(psutil.BELOW_NORMAL_PRIORITY_CLASS if os.name == 'nt' else 10)
+                if self.is_paused:
+                    ps_process.suspend() # Paused or preempted while this run was starting
+            except Exception:
+                ps_process = None
+            last_io = None
+            usage = (0, 0, 0)
+            self.log.begin(phase or "ffmpeg", cmd)
+            if progress_phase:
+                self.tracker.start(progress_phase)
+
             # Parse output
             for line in self.process.stdout:
                 if self.is_cancelled:
                     self.process.kill()
                     return False
                 
-                self.signals.log.emit(self.task.task_id, line.strip())
+                self.log.write(line.strip())
+                if output is not None:
+                    output.append(line.strip())
+                last_io = self.sample_read_rate(ps_process, last_io)
+                usage = self.sample_usage(ps_process, usage)
                 
-                if parse_progress:
-                    # frame=  123 fps=... time=00:00:05.12 bitrate=...
+                if progress_phase:
+                    # frame=  123 fps=... time=00:00:05.12 bitrate=... speed=1.5x
                     time_match = re.search(r"time=(\d{2}:\d{2}:\d{2}\.\d+)", line)
-                    if time_match and total_duration > 0:
-                        current_time = self.parse_time(time_match.group(1))
-                        percent = int((current_time / total_duration) * 100)
-                        if percent > 100: percent = 100
-                        self.signals.progress.emit(self.task.task_id, percent)
+                    if time_match:
+                        frame_match = re.search(r"frame=\s*(\d+)", line)
+                        if frame_match and progress_phase in ("encode", "remux"):
+                            self.task.metrics["frames"] = int(frame_match.group(1))
+                        speed_match = re.search(r"speed=\s*([\d.]+)x", line)
+                        self.tracker.update(self.parse_time(time_match.group(1)), float(speed_match.group(1)) if speed_match else 0)
+                        percent = min(self.tracker.percent(), 100)
+                        if percent != self.task.progress:
+                            self.task.progress = percent
+                            self.signals.progress.emit(self.task.task_id, percent)
             
+            usage = self.sample_usage(ps_process, usage, force=True) # Exited but not reaped yet, times are final
+            self.task.metrics["cpu_seconds"] += usage[1]
+            self.task.metrics["peak_memory"] = max(self.task.metrics["peak_memory"], usage[2])
             self.process.wait()
-            return self.process.returncode == 0
+            success = self.process.returncode == 0
+            if progress_phase:
+                self.tracker.finish(success and not self.is_cancelled)
+            return success
         except Exception as e:
             self.signals.error.emit(self.task.task_id, str(e))
             return False
+        finally:
+            self.log.end(self.process.returncode if self.process else None)
+
+    def sample_read_rate(self, ps_process, last_io):
+        """ Update read_rate from the ffmpeg process' io_counters, at most once per second.
+        Returns the sample (time, read_bytes) to pass in next time. """
+        now = time.time()
+        if ps_process is None or (last_io and now - last_io[0] < 1.0):
+            return last_io
+        try:
+            read_bytes = ps_process.io_counters().read_bytes
+        except Exception:
+            # io_counters isn't available on every platform, or the process just exited
+            return last_io
+        if last_io:
+            self.read_rate = (read_bytes - last_io[1]) / (now - last_io[0])
+        return (now, read_bytes)
+
+    def sample_usage(self, ps_process, usage, force=False):
+        """ CPU seconds and peak RSS of the ffmpeg process, sampled at most once per second.
+        usage: previous sample (time, cpu seconds, peak rss), returns the new one. """
+        now = time.time()
+        if ps_process is None or (not force and now - usage[0] < 1.0):
+            return usage
+        _, cpu_seconds, peak = usage
+        try:
+            cpu = ps_process.cpu_times()
+            cpu_seconds = cpu.user + cpu.system
+            peak = max(peak, ps_process.memory_info().rss)
+        except Exception:
+            pass # Gone already, keep the last sample
+        return (now, cpu_seconds, peak)
 
     def cancel(self):
         self.is_cancelled = True
@@ -239,6 +782,8 @@ class Worker(QRunnable):
                 pass
 
     def pause(self):
+        self.is_paused = True
+        self.tracker.pause()
         if self.process:
             try:
                 p = psutil.Process(self.process.pid)
@@ -247,6 +792,8 @@ class Worker(QRunnable):
                 print(f"Error pausing process: {e}")
 
     def resume(self):
+        self.is_paused = False
+        self.tracker.resume()
         if self.process:
             try:
                 p = psutil.Process(self.process.pid)
@@ -255,55 +802,335 @@ class Worker(QRunnable):
                 print(f"Error resuming process: {e}")
 
 class Scheduler(QObject):
-    def __init__(self, max_threads=3):
+    """ Turns each task into stages on a JobGraph: analyze (single-thread pool) -> encode (CPU pool)
+    -> move (I/O pool, scratch dir only) -> verify (low-priority pool). A task whose streams match one already queued in another
+    container gets a remux stage depending on that task instead of a second encode. A source with the
+    size of another queued one first gets a probe stage (I/O pool) reading content fingerprints; a copy
+    of a source already being converted with the same options then links that task's output instead.
+    Tasks run in priority lanes (urgent / normal / background); an urgent task that finds every slot
+    taken suspends the lowest-priority running ffmpeg until it is done (JobGraph.preempt).
+    Encode admission: sources are grouped by device (st_dev) and the number of I/O-heavy readers per
+    device is capped, so lossless/ultrafast tasks on one disk don't turn into a seek storm while
+    CPU-heavy tasks fill the remaining slots. Tasks are also held while their projected output
+    doesn't fit the free space. Stabilization analysis of queued tasks runs while earlier ones encode. """
+    def __init__(self, max_threads=3, max_readers_per_device=2, max_analyses=2, max_verifies=2):
         super().__init__()
-        self.pool = QThreadPool()
-        self.set_max_threads(max_threads)
-        self.active_workers = {} # task_id -> worker
-        self.is_paused = False
+        self.max_readers_per_device = max_readers_per_device
+        self.active_workers = {} # task_id -> worker (queued, running or moving)
+        self.running = {} # task_id -> worker in its encode stage
+        self.stream_owners = {} # stream_key -> worker encoding those streams, for remux variants
+        self.output_owners = {} # output_key -> worker producing that output, for copies of the same source
+        self.size_workers = {} # source size -> workers; content fingerprints are only read on a size match
+        self.free_cache = {}
+        self.starved = []
+        self.analysis_cache = AnalysisCache() # Shared first-pass artifacts across variants of a source
+        self.speed_stats = SpeedStats() # Learned encode speeds, shared by all workers' progress models
+        prune_logs()
+        self.graph = JobGraph({CPU: max_threads, IO: 2, SINGLE: max_analyses, LOW: max_verifies})
+        self.graph.taskDone.connect(self.on_task_done)
+        self.graph.taskPreempted.connect(self.on_task_preempted)
+        self.graph.stageDone.connect(self.dispatch)
+        self.max_threads = max_threads
+
+        # Measured read rates change over time, re-check admission while tasks are waiting
+        self.admission_timer = QTimer(self)
+        self.admission_timer.setInterval(2000)
+        self.admission_timer.timeout.connect(self.dispatch)
+
+    @property
+    def is_paused(self):
+        return self.graph.is_paused
 
     def set_max_threads(self, n):
-        self.pool.setMaxThreadCount(n)
+        self.max_threads = n
+        self.graph.set_limit(CPU, n)
+        self.dispatch()
+
+    def set_max_transfers(self, n):
+        self.graph.set_limit(IO, n)
+        self.dispatch()
+
+    def set_max_analyses(self, n):
+        self.graph.set_limit(SINGLE, n)
+        self.dispatch()
+
+    def set_max_readers_per_device(self, n):
+        self.max_readers_per_device = max(1, n)
+        self.dispatch()
 
     def start_task(self, task, signals):
-        worker = Worker(task, signals)
+        worker = Worker(task, signals, self.analysis_cache, self.speed_stats, self.running_encodes)
         self.active_workers[task.task_id] = worker
-        
-        # Connect signals to cleanup
-        # We need to hook into finished/error to remove from active_workers
-        # But signals are connected in main.py. 
-        # We can wrap the signals or rely on main.py to call a cleanup method.
-        # Better: let main.py notify scheduler when task is done, 
-        # OR connect here if we pass a callback or proxy signal.
-        # Since WorkerSignals is passed in, we can connect to it.
-        signals.finished.connect(lambda tid=task.task_id: self.remove_worker(tid))
-        signals.error.connect(lambda tid, err: self.remove_worker(tid))
-        
-        self.pool.start(worker)
-        if self.is_paused:
-             # If tasks are added while paused? The requirement says "pause running tasks".
-             # Queue management is handled by QThreadPool. We can't easily pause "queued" tasks other than not starting them.
-             # But QThreadPool starts them automatically.
-             # For now, we implement pause/resume for active workers.
-             pass
+        worker.stages = self.build_stages(worker)
+        self.graph.add_task(task.task_id, worker.stages, task.priority)
+        self.dispatch()
+
+    def running_encodes(self):
+        """ Encodes sharing the cores right now (suspended ones don't) """
+        return sum(1 for w in self.running.values() if not w.is_paused)
+
+    def same_size_tasks(self, worker):
+        """ Queued tasks whose source has the size of worker's but another path, they may be copies of it.
+        Empty when no other file has that size, then there is nothing to fingerprint. """
+        try:
+            size = os.path.getsize(worker.task.source_path)
+        except OSError:
+            return []
+        group = self.size_workers.setdefault(size, [])
+        source = norm_path(worker.task.source_path)
+        others = list(group) if any(norm_path(w.task.source_path) != source for w in group) else []
+        group.append(worker)
+        return others
+
+    def probe_duplicates(self, worker, group):
+        """ Probe stage (I/O pool): content keys of worker's output and of the same-size tasks before it """
+        worker.probed_keys = [(w, w.output_key or w.make_output_key()) for w in group + [worker]]
+        return True
+
+    def on_probed(self, worker, success):
+        """ Register the probed keys; a task producing the same output from an identical copy of
+        the source turns this one into a link to its output """
+        if not success or worker.task.task_id not in self.active_workers:
+            return
+        for w, key in worker.probed_keys:
+            if w.output_key is None:
+                w.output_key = key
+            if key and w.task.task_id in self.active_workers:
+                self.output_owners.setdefault(key, w)
+        owner = self.output_owners.get(worker.output_key) if worker.output_key else None
+        if owner is not None and owner is not worker:
+            self.make_link(worker, owner)
+
+    @staticmethod
+    def stage_hooks(worker):
+        return dict(cancel=worker.cancel, pause=worker.pause, resume=worker.resume)
+
+    def make_link(self, worker, duplicate):
+        """ Same footage under another path, same options: reuse the finished (verified) output """
+        worker.link_source = duplicate.task.output_path
+        worker.remux_source = ""
+        # Its output carries these streams too, other containers of this copy remux from it
+        self.stream_owners.setdefault(worker.stream_key, worker)
+        worker.release_analysis()
+        worker.tracker = worker.build_progress()
+        link = Stage("link", IO, worker.link_output, deps=[self.graph.stages(duplicate.task.task_id)[-1]],
+                     fallback=lambda: self.encode_fallback(worker), **self.stage_hooks(worker))
+        # Everything between the probe and the verify stage
+        self.graph.replace_stages(worker.task.task_id, worker.stages[1:-1], [link])
+
+    def encode_fallback(self, worker):
+        """ The task this one was to link to failed: encode from this copy of the source after all """
+        worker.link_source = ""
+        worker.retain_analysis()
+        worker.tracker = worker.build_progress()
+        self.output_owners.setdefault(worker.output_key, worker) # Further copies link to this encode
+        return self.encode_stages(worker)
+
+    def build_stages(self, worker):
+        stages = []
+        deps = []
+        group = self.same_size_tasks(worker)
+        if group:
+            # Fingerprints read the source, off the GUI thread; nothing else starts before it's known
+            # whether this task is a copy
+            probe = Stage("probe", IO, lambda: self.probe_duplicates(worker, group), cancel=worker.cancel,
+                          on_finish=lambda success: self.on_probed(worker, success))
+            stages.append(probe)
+            deps.append(probe)
+        owner = self.stream_owners.get(worker.stream_key)
+        if owner is not None:
+            # Same streams already being encoded for another container: copy them once that task is done
+            worker.remux_source = owner.task.output_path
+            worker.release_analysis()
+            worker.tracker = worker.build_progress()
+            remux = Stage("remux", IO, worker.remux, deps=[self.graph.stages(owner.task.task_id)[-1]] + deps,
+                          **self.stage_hooks(worker))
+            stages += [remux] + self.move_stages(worker, remux)
+        else:
+            self.stream_owners[worker.stream_key] = worker
+            stages += self.encode_stages(worker, deps)
+        # Remux and link variants depend on this task's last stage, so they never copy from an unverified file
+        stages.append(Stage("verify", LOW, worker.verify_output, deps=[stages[-1]], **self.stage_hooks(worker)))
+        return stages
+
+    def encode_stages(self, worker, deps=()):
+        """ Analysis when the task needs one, the encode, and the move out of the scratch dir """
+        hooks = self.stage_hooks(worker)
+        stages = []
+        deps = list(deps)
+        if worker.stab_entry or worker.task.auto_crop:
+            # One analysis per shared .trf (or per source for the crop detection) at a time,
+            # the other variants then find it done
+            key = worker.stab_key if worker.stab_entry else analysis_key("crop", worker.task.source_path)
+            analyze = Stage("analyze", SINGLE, worker.analyze, deps=deps, key=key, **hooks)
+            stages.append(analyze)
+            deps = deps + [analyze]
+        encode = Stage("encode", CPU, worker.encode, deps=deps,
+                       can_start=lambda: self.can_admit(worker),
+                       on_start=lambda: self.on_encode_started(worker),
+                       on_finish=lambda success: self.on_encode_finished(worker, success), **hooks)
+        return stages + [encode] + self.move_stages(worker, encode)
+
+    def move_stages(self, worker, produce):
+        if not worker.task.scratch_dir:
+            return []
+        return [Stage("move", IO, worker.move, deps=[produce],
+                      on_finish=lambda success: worker.finish_writes(), **self.stage_hooks(worker))]
+
+    def is_io_heavy(self, worker):
+        return worker.predicted_io_heavy or worker.read_rate >= IO_HEAVY_READ_RATE
+
+    def device_readers(self, device):
+        # A worker suspended for an urgent task isn't reading
+        return sum(1 for w in self.running.values() if w.source_device == device and self.is_io_heavy(w) and not w.is_paused)
+
+    def free_space(self, device, path):
+        """ Free bytes on the volume minus what admitted tasks are still expected to write there """
+        if device not in self.free_cache:
+            try:
+                free = shutil.disk_usage(volume_dir(path)).free
+            except OSError:
+                free = None
+            if free is not None:
+                for w in self.active_workers.values():
+                    if w.admitted:
+                        free -= w.remaining_writes().get(device, 0)
+            self.free_cache[device] = free
+        return self.free_cache[device]
+
+    def has_space(self, worker):
+        if not worker.task.estimated_size:
+            return True
+        for device, path in worker.write_targets:
+            free = self.free_space(device, path)
+            if free is not None and free < worker.task.estimated_size * SAFETY_MARGIN:
+                return False
+        return True
+
+    def writes_pending_on(self, worker):
+        """ True if some admitted task writes to one of worker's volumes, so space may still change """
+        devices = {device for device, _ in worker.write_targets}
+        return any(w.admitted and devices & set(w.remaining_writes()) for w in self.active_workers.values())
+
+    def can_admit(self, worker):
+        """ Encode admission: CPU-heavy tasks always fit, I/O-heavy ones only while their source device
+        is below the reader cap. Tasks whose projected output doesn't fit the free space are held,
+        or collected in self.starved when nothing running can change that. """
+        if worker in self.starved:
+            return False
+        if self.is_io_heavy(worker) and worker.source_device is not None \
+                and self.device_readers(worker.source_device) >= self.max_readers_per_device:
+            return False
+        if not self.has_space(worker):
+            if not self.writes_pending_on(worker):
+                self.starved.append(worker)
+            return False
+        return True
 
-    def remove_worker(self, task_id):
-        if task_id in self.active_workers:
-            del self.active_workers[task_id]
+    def on_encode_started(self, worker):
+        self.running[worker.task.task_id] = worker
+        worker.admitted = True
+        self.free_cache.clear()
+
+    def on_encode_finished(self, worker, success):
+        # Encode slot is free (the file may still be moving on the I/O pool)
+        self.running.pop(worker.task.task_id, None)
+        worker.release_analysis()
+        # The encoded file no longer grows; only a move to another volume still has bytes to write
+        worker.finish_writes(worker.encode_path if success and worker.task.scratch_dir else None)
+
+    @Slot()
+    def dispatch(self):
+        self.free_cache = {} # device -> projected free bytes, valid for this pass
+        self.starved = []
+        self.graph.dispatch()
+
+        for worker in self.starved:
+            worker.signals.error.emit(worker.task.task_id, f"磁盘空间不足：预计输出 {format_size(worker.task.estimated_size)}，输出卷剩余空间不够")
+            self.graph.finish_task(worker.task.task_id, FAILED)
+
+        if self.graph.has_pending() and not self.is_paused:
+            self.admission_timer.start()
+        else:
+            self.admission_timer.stop()
+
+    def set_priority(self, task_id, priority):
+        """ Move a queued or running task to another lane; an urgent one preempts right away if needed """
+        worker = self.active_workers.get(task_id)
+        if worker is None:
+            return
+        worker.task.priority = priority
+        self.graph.set_priority(task_id, priority)
+        self.dispatch()
+
+    @Slot(str, bool)
+    def on_task_preempted(self, task_id, suspended):
+        worker = self.active_workers.get(task_id)
+        if worker is not None:
+            worker.signals.preempted.emit(task_id, suspended)
+
+    def estimate_remaining(self):
+        """ Wall time in seconds until queued and running tasks are done. Encodes share the cores, so
+        their solo times add up; single-threaded analyses run max_analyses at a time next to them. """
+        shared = single = 0
+        for w in self.active_workers.values():
+            left = w.remaining_work()
+            shared += left["shared"]
+            single += left["single"]
+        return max(shared, single / self.graph.limits[SINGLE])
+
+    def task_eta(self, task_id):
+        """ Wall seconds until a running task is done, 0 when unknown """
+        worker = self.active_workers.get(task_id)
+        return worker.tracker.eta() if worker else 0
+
+    @Slot(str, str, str)
+    def on_task_done(self, task_id, state, message):
+        worker = self.active_workers.pop(task_id, None)
+        if worker is None:
+            return
+        self.running.pop(task_id, None)
+        worker.release_analysis()
+        self.record_stage_times(worker)
+        if self.stream_owners.get(worker.stream_key) is worker:
+            del self.stream_owners[worker.stream_key]
+        if self.output_owners.get(worker.output_key) is worker:
+            del self.output_owners[worker.output_key]
+        for group in self.size_workers.values():
+            if worker in group:
+                group.remove(worker)
+                break
+        if state == DONE:
+            worker.signals.finished.emit(task_id)
+        elif message:
+            # Stages report their own errors; this covers exceptions and failed dependencies
+            worker.signals.error.emit(task_id, message)
+
+    def record_stage_times(self, worker):
+        ran = [s for s in worker.stages if s.started and s.finished]
+        metrics = worker.task.metrics
+        metrics["stages"] = {s.kind: s.finished - s.started for s in ran}
+        if ran:
+            metrics["started"] = min(s.started for s in ran)
+            metrics["finished"] = max(s.finished for s in ran)
 
     def cancel_all(self):
-        self.is_paused = False
         for worker in self.active_workers.values():
+            self.record_stage_times(worker)
             worker.cancel()
-        self.pool.clear() # Clear waiting tasks
+        self.graph.cancel_all()
         self.active_workers.clear()
+        self.running.clear()
+        self.stream_owners.clear()
+        self.output_owners.clear()
+        self.size_workers.clear()
+        self.analysis_cache.clear() # Queued workers that never run won't release their entries
+        self.admission_timer.stop()
 
     def pause_all(self):
-        self.is_paused = True
-        for worker in self.active_workers.values():
-            worker.pause()
+        self.graph.pause_all()
+        self.admission_timer.stop()
 
     def resume_all(self):
-        self.is_paused = False
-        for worker in self.active_workers.values():
-            worker.resume()
+        self.graph.resume_all()
+        self.dispatch()